@@ -0,0 +1,76 @@
+"""
+Import-time budget check for the backend services.
+
+Every cold start (Cloud Run instance, uvicorn worker, pytest collection) pays
+for importing a service's main module. This script measures that cost with
+`python -X importtime` in fresh interpreters and fails if a service goes over
+its budget.
+
+The budget covers what a service adds on top of FastAPI itself (FastAPI,
+Starlette and Pydantic are needed by every service and are measured
+separately), so the numbers are comparable between machines of similar speed.
+
+Usage (from the repository root):
+    python scripts/import_budget.py            # check all services
+    python scripts/import_budget.py --runs 7   # more runs for a steadier median
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Budget in milliseconds for each service's own import cost (excluding FastAPI).
+BUDGETS_MS = {
+    "services.core.main": 150,
+    # Matchmaking loads NumPy for compatibility scoring (~70 ms on its own).
+    "services.matchmaking.main": 150,
+    "services.messaging.main": 75,
+    "services.moderation.main": 75,
+}
+
+# Framework imported by every service; its cost is reported but not budgeted.
+FRAMEWORK_MODULE = "fastapi"
+
+
+def measure(module: str) -> tuple[float, float]:
+    """Import `module` in a fresh interpreter; return (total_ms, framework_ms)."""
+    env = dict(os.environ, SUPABASE_URL="http://dummy", SUPABASE_KEY="dummy")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    total_us = framework_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if name == module:
+            total_us = int(cumulative)
+        elif name == FRAMEWORK_MODULE and not framework_us:
+            framework_us = int(cumulative)
+    return total_us / 1000, framework_us / 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per service")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'service':<28}{'total ms':>10}{'fastapi ms':>12}{'own ms':>9}{'budget':>8}")
+    for module, budget in BUDGETS_MS.items():
+        samples = [measure(module) for _ in range(args.runs)]
+        total = statistics.median(s[0] for s in samples)
+        framework = statistics.median(s[1] for s in samples)
+        own = statistics.median(s[0] - s[1] for s in samples)
+        over = own > budget
+        failed |= over
+        print(f"{module:<28}{total:>10.1f}{framework:>12.1f}{own:>9.1f}{budget:>8}{'  OVER' if over else ''}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
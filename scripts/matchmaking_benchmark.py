@@ -0,0 +1,353 @@
+"""
+Matchmaking benchmark with synthetic populations.
+
+Generates `user_profiles` and `match_records` populations with realistic
+language, country, time zone and interest distributions, serves them from the
+matchmaking tests' in-memory Supabase fake, and drives the matchmaking service code
+(`find_penpal` and `preview_candidates`) against them. For each population
+size it reports the candidate index load time and memory, p50/p95/p99
+latency, throughput and the process's peak memory.
+
+Results can be saved as JSON and compared with a previous run, so a change
+that makes matching slower fails before it reaches production.
+
+Usage (from the repository root):
+    python scripts/matchmaking_benchmark.py                              # 10k and 100k profiles
+    python scripts/matchmaking_benchmark.py --sizes 10000,100000,1000000
+    python scripts/matchmaking_benchmark.py --json results.json          # save results
+    python scripts/matchmaking_benchmark.py --baseline results.json      # fail on a p95 regression
+    python scripts/matchmaking_benchmark.py --check                      # fail if over the budgets
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from tests.matchmaking.fake_supabase import FakeQuery, FakeSupabase, make_profile
+
+# p95 budget in milliseconds for find_penpal, per population size.
+# The data design targets matchmaking under 200 ms.
+BUDGETS_P95_MS = {10_000: 50, 100_000: 200, 1_000_000: 1000}
+# A p95 this much worse than the baseline counts as a regression.
+DEFAULT_TOLERANCE = 0.25
+
+# --- Synthetic population ---
+
+# (country, weight, [(primary language, weight)], time zones)
+COUNTRIES = [
+    ("US", 14, [("en", 85), ("es", 15)], ["America/New_York", "America/Chicago", "America/Denver", "America/Los_Angeles"]),
+    ("IN", 12, [("hi", 55), ("en", 25), ("bn", 10), ("ta", 10)], ["Asia/Kolkata"]),
+    ("BR", 7, [("pt", 100)], ["America/Sao_Paulo", "America/Manaus"]),
+    ("CN", 6, [("zh", 100)], ["Asia/Shanghai"]),
+    ("ID", 5, [("id", 100)], ["Asia/Jakarta", "Asia/Makassar"]),
+    ("NG", 5, [("en", 70), ("yo", 15), ("ha", 15)], ["Africa/Lagos"]),
+    ("GB", 5, [("en", 100)], ["Europe/London"]),
+    ("MX", 5, [("es", 100)], ["America/Mexico_City"]),
+    ("DE", 4, [("de", 100)], ["Europe/Berlin"]),
+    ("FR", 4, [("fr", 100)], ["Europe/Paris"]),
+    ("JP", 4, [("ja", 100)], ["Asia/Tokyo"]),
+    ("ZA", 4, [("en", 45), ("zu", 30), ("af", 25)], ["Africa/Johannesburg"]),
+    ("PH", 3, [("tl", 60), ("en", 40)], ["Asia/Manila"]),
+    ("EG", 3, [("ar", 100)], ["Africa/Cairo"]),
+    ("RU", 3, [("ru", 100)], ["Europe/Moscow", "Asia/Yekaterinburg", "Asia/Novosibirsk"]),
+    ("KE", 3, [("sw", 60), ("en", 40)], ["Africa/Nairobi"]),
+    ("ES", 3, [("es", 100)], ["Europe/Madrid"]),
+    ("KR", 2, [("ko", 100)], ["Asia/Seoul"]),
+    ("AU", 2, [("en", 100)], ["Australia/Sydney", "Australia/Perth", "Australia/Brisbane"]),
+    ("CA", 2, [("en", 75), ("fr", 25)], ["America/Toronto", "America/Vancouver"]),
+]
+# Second languages people list, most commonly English.
+SECONDARY_LANGUAGES = [("en", 50), ("es", 12), ("fr", 10), ("de", 6), ("zh", 5), ("ar", 4), ("pt", 4), ("ja", 3), ("ru", 3), ("hi", 3)]
+AGE_RANGES = [("18-25", 35), ("26-35", 35), ("36-45", 18), ("46+", 12)]
+TIME_ZONE_DISTANCES = [(6, 70), (3, 15), (12, 15)]
+INTEREST_NAMES = [
+    "music", "travel", "reading", "movies", "cooking", "photography", "football", "gaming", "hiking",
+    "art", "languages", "history", "technology", "fitness", "fashion", "anime", "writing", "poetry",
+    "chess", "basketball", "gardening", "yoga", "science", "podcasts", "dance", "cycling", "jazz",
+    "coffee", "astronomy", "volunteering", "cricket", "rugby", "surfing", "baking", "philosophy",
+]
+# The long tail of interests, Zipf-distributed: a few are very common.
+INTEREST_VOCABULARY = INTEREST_NAMES + [f"hobby_{i}" for i in range(400)]
+INTEREST_WEIGHTS = 1 / np.arange(1, len(INTEREST_VOCABULARY) + 1) ** 1.1
+INTEREST_WEIGHTS /= INTEREST_WEIGHTS.sum()
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def pick(rng: random.Random, weighted):
+    values, weights = zip(*weighted)
+    return rng.choices(values, weights)[0]
+
+
+def make_population(size: int, seed: int = 7):
+    """Synthetic (user_profiles, match_records) rows for `size` users."""
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    country_weights = [c[1] for c in COUNTRIES]
+    interest_counts = np_rng.integers(3, 11, size)
+    user_ids = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(size)]
+
+    profiles = []
+    for i, user_id in enumerate(user_ids):
+        country, _, languages, zones = rng.choices(COUNTRIES, country_weights)[0]
+        primary = pick(rng, languages)
+        secondary = sorted({pick(rng, SECONDARY_LANGUAGES) for _ in range(rng.choice((0, 1, 1, 2)))} - {primary})
+        interests = np_rng.choice(len(INTEREST_VOCABULARY), interest_counts[i], replace=False, p=INTEREST_WEIGHTS)
+        updated = START + timedelta(seconds=rng.randrange(200 * 24 * 3600))
+        profiles.append(make_profile(
+            user_id,
+            anonymous_handle=f"penpal_{i}",
+            account_status="active" if rng.random() < 0.95 else rng.choice(("suspended", "banned", "deleted")),
+            age_range=pick(rng, AGE_RANGES),
+            primary_language=primary,
+            secondary_languages=secondary,
+            time_zone=rng.choice(zones),
+            preferred_time_zone_distance=pick(rng, TIME_ZONE_DISTANCES),
+            max_active_conversations=3,
+            country_code=country,
+            interests=[INTEREST_VOCABULARY[j] for j in interests],
+            updated_at=updated.isoformat(),
+        ))
+    # A few users block one to three others.
+    for profile in rng.sample(profiles, size // 50):
+        profile["blocked_users"] = rng.sample(user_ids, rng.randint(1, 3))
+
+    # Previous matches: most users have a few, some have many; about one in
+    # five matches is still active.
+    matches, pairs = [], set()
+    active = Counter()
+    for user_id in user_ids:
+        for _ in range(min(int(np_rng.geometric(0.35)) - 1, 30)):
+            partner = user_ids[rng.randrange(size)]
+            pair = tuple(sorted((user_id, partner)))
+            if partner == user_id or pair in pairs:
+                continue
+            is_active = rng.random() < 0.2 and active[user_id] < 2 and active[partner] < 2
+            if is_active:
+                active[user_id] += 1
+                active[partner] += 1
+            pairs.add(pair)
+            matches.append({
+                "match_id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                "user_1_id": pair[0],
+                "user_2_id": pair[1],
+                "conversation_thread_id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                "match_type": rng.choice(("one-time", "long-term")),
+                "status": "active" if is_active else "completed",
+                "compatibility_score": round(rng.random(), 2),
+                "created_at": (START + timedelta(seconds=rng.randrange(200 * 24 * 3600))).isoformat(),
+            })
+    return profiles, matches
+
+
+# --- In-memory Supabase stand-in (the test fake, indexed) ---
+
+class Table(list):
+    """Rows with hash indexes on ID columns and lazily sorted copies for keyset reads."""
+
+    INDEXED = ("user_id", "match_id", "user_1_id", "user_2_id")
+
+    def __init__(self, rows=()):
+        super().__init__()
+        self.indexes = {column: defaultdict(list) for column in self.INDEXED}
+        self.sorted = {}
+        self.extend(rows)
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+            for column, index in self.indexes.items():
+                if column in row:
+                    index[row[column]].append(row)
+        self.sorted.clear()
+
+    def lookup(self, column, values):
+        index = self.indexes[column]
+        return [row for value in values for row in index.get(value, ())]
+
+    def sorted_by(self, column):
+        if column not in self.sorted:
+            rows = sorted((r for r in self if r.get(column) is not None), key=lambda r: r[column])
+            self.sorted[column] = ([r[column] for r in rows], rows)
+        return self.sorted[column]
+
+
+class IndexedQuery(FakeQuery):
+    """The test fake's query semantics, reading through the table's indexes where it can."""
+
+    def _candidates(self, rows):
+        for column, values in self.lookups:
+            if column == "or":
+                if all(c in Table.INDEXED for c, _ in values):
+                    found = {id(r): r for c, v in values for r in rows.lookup(c, v)}
+                    return list(found.values()), False
+            elif column in Table.INDEXED:
+                return rows.lookup(column, values), False
+        if self.after and self.order_by and self.order_by[0] == (self.after[0], False):
+            # Keyset read: start right after the last seen value.
+            keys, ordered = rows.sorted_by(self.after[0])
+            return ordered[bisect.bisect_right(keys, self.after[1]):], len(self.order_by) == 1
+        if len(self.order_by) == 1 and self.order_by[0][1] is False and self.limit_to:
+            return rows.sorted_by(self.order_by[0][0])[1], True
+        return rows, False
+
+
+class InMemorySupabase(FakeSupabase):
+    """The matchmaking test fake with indexed lookups, for large populations."""
+
+    def __init__(self, tables):
+        super().__init__()
+        self.tables = {name: Table(rows) for name, rows in tables.items()}
+
+    @property
+    def queries(self):
+        return len(self.calls)
+
+    def now(self):
+        return datetime.now(timezone.utc).isoformat()
+
+    def table(self, name):
+        self.tables.setdefault(name, Table())
+        return IndexedQuery(self, name)
+
+
+# --- Benchmark ---
+
+def percentile(samples, q):
+    return float(np.percentile(samples, q)) if samples else 0.0
+
+
+def run_size(size, requests, seed):
+    import services.matchmaking.main as mm
+    from fastapi import HTTPException
+
+    started = time.perf_counter()
+    profiles, matches = make_population(size, seed)
+    generate_s = time.perf_counter() - started
+    db = InMemorySupabase({"user_profiles": profiles, "match_records": matches})
+    mm.supabase = db
+    mm.candidate_index.clear()
+    mm.exclusion_cache.clear()
+    mm.match_leases.clear()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    mm.candidate_index.ensure_fresh(db)
+    load_s = time.perf_counter() - started
+    index_mb = tracemalloc.get_traced_memory()[0] / 2**20
+    tracemalloc.stop()
+
+    rng = random.Random(seed)
+    active = [p for p in profiles if p["account_status"] == "active"]
+    requesters = rng.sample(active, min(requests + 20, len(active)))
+
+    def match_request(profile):
+        roll = rng.random()
+        preferences = {"match_type": rng.choice(("one-time", "long-term"))}
+        if roll < 0.2:
+            preferences["languages"] = [pick(rng, SECONDARY_LANGUAGES)]
+        elif roll < 0.3:
+            preferences["age_ranges"] = [profile["age_range"]]
+        return mm.MatchRequest(user_id=profile["user_id"], preferences=preferences)
+
+    loop = asyncio.new_event_loop()
+
+    def timed(call):
+        started = time.perf_counter()
+        try:
+            loop.run_until_complete(call)
+            outcome = "ok"
+        except HTTPException as e:
+            outcome = str(e.status_code)
+        return (time.perf_counter() - started) * 1000, outcome
+
+    for profile in requesters[:20]:  # warm-up
+        timed(mm.preview_candidates(match_request(profile), k=10))
+
+    results = {"size": size, "generate_s": round(generate_s, 2), "load_s": round(load_s, 3), "index_mb": round(index_mb, 1)}
+    for name, call in (
+        ("find", lambda r: mm.find_penpal(r)),
+        ("candidates", lambda r: mm.preview_candidates(r, k=10)),
+    ):
+        latencies, outcomes = [], Counter()
+        queries = db.queries
+        started = time.perf_counter()
+        for profile in requesters[20:]:
+            latency, outcome = timed(call(match_request(profile)))
+            latencies.append(latency)
+            outcomes[outcome] += 1
+        elapsed = time.perf_counter() - started
+        results[name] = {
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            "queries_per_request": round((db.queries - queries) / max(len(latencies), 1), 2),
+            "outcomes": dict(outcomes),
+        }
+    loop.close()
+    results["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10000,100000", help="comma separated population sizes")
+    parser.add_argument("--requests", type=int, default=300, help="requests per endpoint and size")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed p95 slowdown vs baseline")
+    parser.add_argument("--check", action="store_true", help="fail if find p95 is over BUDGETS_P95_MS")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SUPABASE_URL", "http://dummy")
+    os.environ.setdefault("SUPABASE_KEY", "dummy")
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {r["size"]: r for r in json.load(f)}
+
+    failed = False
+    results = []
+    print(f"{'size':>9}{'endpoint':>12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'load s':>8}{'index MB':>10}{'rss MB':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        result = run_size(size, args.requests, args.seed)
+        results.append(result)
+        for endpoint in ("find", "candidates"):
+            stats = result[endpoint]
+            notes = []
+            if args.check and endpoint == "find" and size in BUDGETS_P95_MS and stats["p95_ms"] > BUDGETS_P95_MS[size]:
+                notes.append(f"OVER BUDGET ({BUDGETS_P95_MS[size]} ms)")
+            before = baseline.get(size, {}).get(endpoint)
+            if before and stats["p95_ms"] > before["p95_ms"] * (1 + args.tolerance):
+                notes.append(f"REGRESSION (was {before['p95_ms']} ms)")
+            failed |= bool(notes)
+            print(
+                f"{size:>9}{endpoint:>12}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+                f"{stats['throughput_rps']:>9.0f}{result['load_s']:>8.2f}{result['index_mb']:>10.1f}"
+                f"{result['max_rss_mb']:>9.0f}{'  ' + ', '.join(notes) if notes else ''}"
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
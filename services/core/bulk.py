@@ -0,0 +1,140 @@
+# bulk.py
+# This file contains the streaming NDJSON import and export of user profiles.
+# Both directions work chunk by chunk so memory use stays flat no matter how
+# many profiles are moved: imports are validated and written in batches while
+# the request body is still arriving, and exports page through the table with
+# a keyset cursor while the response is being sent.
+
+import json
+import os
+from typing import Any, AsyncIterator, Dict, List, Sequence
+
+from postgrest.types import CountMethod, ReturnMethod
+from pydantic import ValidationError
+
+from .cache import profile_cache
+from .models import ProfileCreate
+from .projections import select_columns
+
+PROFILE_IMPORT_BATCH_SIZE = int(os.environ.get("PROFILE_IMPORT_BATCH_SIZE", "500"))
+PROFILE_EXPORT_PAGE_SIZE = int(os.environ.get("PROFILE_EXPORT_PAGE_SIZE", "1000"))
+# A single NDJSON line larger than this is rejected instead of being buffered.
+MAX_NDJSON_LINE_BYTES = 64 * 1024
+# Only the first errors are reported back; the rest are just counted.
+MAX_REPORTED_ERRORS = 100
+
+
+class NDJSONLineTooLong(ValueError):
+    """Raised when an NDJSON line exceeds MAX_NDJSON_LINE_BYTES."""
+
+
+def _check_line_length(line: bytes) -> bytes:
+    if len(line) > MAX_NDJSON_LINE_BYTES:
+        raise NDJSONLineTooLong(f"NDJSON line longer than {MAX_NDJSON_LINE_BYTES} bytes.")
+    return line
+
+
+async def iter_ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Split a stream of byte chunks into lines without reading the whole body.
+    Complete lines and the unfinished tail are both held to MAX_NDJSON_LINE_BYTES.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield _check_line_length(line)
+        _check_line_length(buffer)
+    if buffer:
+        yield buffer
+
+
+async def _write_batch(db: Any, batch: List[Dict[str, Any]]) -> int:
+    """Insert a batch of profiles, skipping ones that already exist. Returns rows inserted."""
+    response = await db.table("user_profiles").upsert(
+        batch,
+        on_conflict="clerk_id",
+        ignore_duplicates=True,
+        returning=ReturnMethod.minimal,
+        count=CountMethod.exact,
+    ).execute()
+    profile_cache.invalidate_many(row["clerk_id"] for row in batch)
+    return response.count or 0
+
+
+async def import_profiles(
+    db: Any,
+    chunks: AsyncIterator[bytes],
+    batch_size: int = PROFILE_IMPORT_BATCH_SIZE,
+) -> Dict[str, Any]:
+    """
+    Validate NDJSON profile lines with ProfileCreate and insert them in batches.
+
+    The next part of the body is only read once the current batch has been
+    written, which gives natural backpressure against a fast uploader. Existing
+    profiles (same clerk_id) are left untouched, so an import can be re-run.
+    Invalid lines are skipped and reported with their line number.
+    """
+    result: Dict[str, Any] = {"received": 0, "inserted": 0, "skipped": 0, "invalid": 0, "errors": []}
+    batch: List[Dict[str, Any]] = []
+    # Clerk IDs already queued in this batch; duplicates would fail the upsert.
+    batch_ids = set()
+
+    async def flush() -> None:
+        inserted = await _write_batch(db, batch)
+        result["inserted"] += inserted
+        result["skipped"] += len(batch) - inserted
+        batch.clear()
+        batch_ids.clear()
+
+    line_no = 0
+    async for line in iter_ndjson_lines(chunks):
+        line_no += 1
+        if not line.strip():
+            continue
+        result["received"] += 1
+        try:
+            profile = ProfileCreate.model_validate_json(line)
+        except ValidationError as e:
+            result["invalid"] += 1
+            if len(result["errors"]) < MAX_REPORTED_ERRORS:
+                result["errors"].append({"line": line_no, "error": e.errors(include_url=False)[0]["msg"]})
+            continue
+
+        if profile.clerk_id in batch_ids:
+            result["skipped"] += 1
+            continue
+        batch.append(profile.model_dump())
+        batch_ids.add(profile.clerk_id)
+        if len(batch) >= batch_size:
+            await flush()
+
+    if batch:
+        await flush()
+    return result
+
+
+async def export_profiles(
+    db: Any,
+    columns: Sequence[str],
+    page_size: int = PROFILE_EXPORT_PAGE_SIZE,
+) -> AsyncIterator[bytes]:
+    """
+    Yield every profile as an NDJSON line, one page at a time.
+    Pages are keyed on clerk_id (gt last seen id), so each page is a single
+    indexed range scan regardless of how deep into the table the export is.
+    """
+    # clerk_id is always read because it drives the cursor.
+    select = select_columns(dict.fromkeys(("clerk_id", *columns)))
+    last_id = None
+    while True:
+        query = db.table("user_profiles").select(select).order("clerk_id").limit(page_size)
+        if last_id is not None:
+            query = query.gt("clerk_id", last_id)
+        rows = (await query.execute()).data or []
+        for row in rows:
+            yield (json.dumps({c: row.get(c) for c in columns}, default=str) + "\n").encode()
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["clerk_id"]
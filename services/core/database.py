@@ -1,9 +1,20 @@
 # database.py
 # This file is responsible for initializing and managing the Supabase client.
+#
+# Only the PostgREST (database) part of Supabase is used by this service, so the
+# client is built directly from `postgrest` instead of the full `supabase`
+# package, which would also import the auth, realtime, storage and functions
+# clients. The client itself is created lazily on first use, so importing this
+# module (cold starts, worker forks, test collection) stays cheap.
 
+import asyncio
 import os
+from typing import Optional
+
+import httpx
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from fastapi import HTTPException
+from postgrest import AsyncPostgrestClient
 
 # Use a relative path to ensure the .env file is found correctly.
 # This assumes the .env file is in the root directory of your project.
@@ -14,14 +25,77 @@ load_dotenv(dotenv_path)
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 
-# Initialize the Supabase client.
-# This client instance is a singleton and will be reused throughout the application.
-try:
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        raise ValueError("Supabase credentials not found in environment variables.")
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-except Exception as e:
-    # Handle the case where the client cannot be initialized due to missing
-    # environment variables or connection issues.
+# Connection pool settings for the shared HTTP client. Every PostgREST call made
+# by the API goes through this pool, so these bound how many requests a single
+# worker can have in flight against Supabase at once.
+SUPABASE_MAX_CONNECTIONS = int(os.environ.get("SUPABASE_MAX_CONNECTIONS", "100"))
+SUPABASE_MAX_KEEPALIVE = int(os.environ.get("SUPABASE_MAX_KEEPALIVE", "20"))
+SUPABASE_TIMEOUT_SECONDS = float(os.environ.get("SUPABASE_TIMEOUT_SECONDS", "10"))
+
+# The async client instance. It is created on first use and is then a
+# singleton reused throughout the application.
+supabase: Optional[AsyncPostgrestClient] = None
+_client_lock = asyncio.Lock()
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    """Create the pooled HTTP client shared by all PostgREST requests."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=SUPABASE_MAX_CONNECTIONS,
+            max_keepalive_connections=SUPABASE_MAX_KEEPALIVE,
+        ),
+        timeout=SUPABASE_TIMEOUT_SECONDS,
+        follow_redirects=True,
+        http2=True,
+    )
+
+
+def create_postgrest_client(url: str, key: str) -> AsyncPostgrestClient:
+    """
+    Build a PostgREST client for a Supabase project.
+    Uses the same REST endpoint and auth headers as `supabase.create_client`.
+    """
+    return AsyncPostgrestClient(
+        f"{url.rstrip('/')}/rest/v1",
+        headers={"apiKey": key, "Authorization": f"Bearer {key}"},
+        http_client=_build_http_client(),
+    )
+
+
+async def init_supabase() -> AsyncPostgrestClient:
+    """
+    Create the async client if it does not exist yet and return it.
+    Concurrent first requests share a lock so only one client (and pool) is built.
+    """
+    global supabase
+    if supabase is not None:
+        return supabase
+    async with _client_lock:
+        if supabase is None:
+            if not SUPABASE_URL or not SUPABASE_KEY:
+                raise ValueError("Supabase credentials not found in environment variables.")
+            supabase = create_postgrest_client(SUPABASE_URL, SUPABASE_KEY)
+    return supabase
+
+
+async def close_supabase() -> None:
+    """Close the connection pool. Called when the application shuts down."""
+    global supabase
+    if supabase is not None:
+        await supabase.aclose()
     supabase = None
-    print(f"ERROR: Supabase client failed to initialize. Details: {e}")
+
+
+async def get_supabase() -> AsyncPostgrestClient:
+    """
+    Dependency to provide the async Supabase client instance to API endpoints.
+    This ensures a single, reusable client (and connection pool) across all requests.
+    """
+    try:
+        return await init_supabase()
+    except Exception as e:
+        # Handle the case where the client cannot be initialized due to missing
+        # environment variables or connection issues.
+        print(f"ERROR: Supabase client failed to initialize. Details: {e}")
+        raise HTTPException(status_code=500, detail="Supabase client not initialized.")
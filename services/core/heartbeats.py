@@ -0,0 +1,133 @@
+# heartbeats.py
+# This file contains the write-behind buffer for `last_active` heartbeats.
+# Users send a heartbeat on every action; writing each one to the database
+# would cost one round trip per action. Instead, heartbeats are coalesced in
+# memory (only the latest timestamp per user is kept) and flushed in bulk.
+
+import asyncio
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+HEARTBEAT_FLUSH_INTERVAL_SECONDS = float(os.environ.get("HEARTBEAT_FLUSH_INTERVAL_SECONDS", "5"))
+HEARTBEAT_MAX_PENDING = int(os.environ.get("HEARTBEAT_MAX_PENDING", "5000"))
+# Maximum number of IDs sent in one `in_` filter, to keep request URLs short.
+HEARTBEAT_UPDATE_CHUNK_SIZE = 500
+
+
+class HeartbeatBuffer:
+    """
+    Coalescing buffer of last_active timestamps keyed by clerk_id.
+
+    `record` keeps only the most recent timestamp per user. `flush` writes the
+    pending timestamps with one `update ... in_(clerk_id)` per distinct second,
+    so thousands of heartbeats become a handful of bulk updates. A flush is
+    triggered every `flush_interval` seconds, or sooner once `max_pending`
+    users are waiting.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = HEARTBEAT_FLUSH_INTERVAL_SECONDS,
+        max_pending: int = HEARTBEAT_MAX_PENDING,
+    ):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[str, datetime] = {}
+        self._lock = Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self.recorded = 0
+        self.flushed = 0
+        self.updates = 0
+        self.failed_flushes = 0
+
+    def record(self, clerk_id: str, at: Optional[datetime] = None) -> None:
+        """Queue a heartbeat; older timestamps for the same user are discarded."""
+        at = (at or datetime.now(timezone.utc)).replace(microsecond=0)
+        with self._lock:
+            current = self._pending.get(clerk_id)
+            if current is None or at > current:
+                self._pending[clerk_id] = at
+            self.recorded += 1
+            full = len(self._pending) >= self.max_pending
+        if full and self._wakeup is not None:
+            self._wakeup.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _drain(self) -> Dict[str, datetime]:
+        with self._lock:
+            drained, self._pending = self._pending, {}
+            return drained
+
+    def _restore(self, drained: Dict[str, datetime]) -> None:
+        """Put back heartbeats from a failed flush without overwriting newer ones."""
+        with self._lock:
+            for clerk_id, at in drained.items():
+                current = self._pending.get(clerk_id)
+                if current is None or at > current:
+                    self._pending[clerk_id] = at
+
+    async def flush(self, db: Any) -> int:
+        """
+        Write all pending heartbeats and return the number of users updated.
+        If a write fails, the heartbeats are put back for the next flush.
+        """
+        drained = self._drain()
+        if not drained:
+            return 0
+
+        # Users with the same timestamp share a single bulk update.
+        by_timestamp: Dict[datetime, List[str]] = defaultdict(list)
+        for clerk_id, at in drained.items():
+            by_timestamp[at].append(clerk_id)
+
+        try:
+            for at, clerk_ids in by_timestamp.items():
+                for start in range(0, len(clerk_ids), HEARTBEAT_UPDATE_CHUNK_SIZE):
+                    chunk = clerk_ids[start:start + HEARTBEAT_UPDATE_CHUNK_SIZE]
+                    await db.table("user_profiles").update(
+                        {"last_active": at.isoformat()}
+                    ).in_("clerk_id", chunk).execute()
+                    self.updates += 1
+        except Exception:
+            self.failed_flushes += 1
+            self._restore(drained)
+            raise
+
+        self.flushed += len(drained)
+        return len(drained)
+
+    async def run(self, get_db) -> None:
+        """
+        Background loop: flush every `flush_interval` seconds, or as soon as
+        the buffer reaches `max_pending` users. Runs until cancelled.
+        """
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush(await get_db())
+            except Exception as e:
+                print(f"ERROR: Heartbeat flush failed, will retry. Details: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending(),
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "updates": self.updates,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+# Shared buffer instance used by the API endpoints.
+heartbeat_buffer = HeartbeatBuffer()
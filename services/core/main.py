@@ -4,21 +4,55 @@
 
 import sys
 import os
+import asyncio
+import hashlib
+import json
 
 # Add the 'services' directory to the Python path
 # This helps resolve absolute imports like `from core.models`
 # when running the script from the project root.
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from fastapi import FastAPI, HTTPException, status, Depends
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, status, Depends, Header, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import Optional, List
-from supabase import Client
-from .models import ProfileCreate, ProfileUpdate, Profile
-from .database import supabase
+from postgrest import AsyncPostgrestClient
+from .models import ProfileCreate, ProfileUpdate, Profile, ProfileBatchRequest, ProfileBatchResponse, ProfileImportResult
+from .database import get_supabase, init_supabase, close_supabase
+from .cache import profile_cache
+from .heartbeats import heartbeat_buffer
+from .bulk import NDJSONLineTooLong, export_profiles, import_profiles
+from .projections import PROFILE_COLUMNS, parse_fields, project, select_columns
+
+# Column list used for every profile read, instead of select("*").
+PROFILE_SELECT = select_columns(PROFILE_COLUMNS)
+
+# Documentation for the `fields` query parameter shared by the read endpoints.
+FIELDS_DESCRIPTION = (
+    "Optional projection: a field set name (full, summary, matching) "
+    "or a comma separated list of profile fields."
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The Supabase client is created lazily on the first request.
+    # Heartbeats are flushed in the background while the app runs; on shutdown
+    # the remaining heartbeats are written and the connection pool is released.
+    flusher = asyncio.create_task(heartbeat_buffer.run(init_supabase))
+    yield
+    flusher.cancel()
+    try:
+        if heartbeat_buffer.pending():
+            await heartbeat_buffer.flush(await init_supabase())
+    except Exception as e:
+        print(f"ERROR: Final heartbeat flush failed. Details: {e}")
+    await close_supabase()
+
 
 # Create the FastAPI application instance.
-app = FastAPI(title="GlobeTalk Core API")
+app = FastAPI(title="GlobeTalk Core API", lifespan=lifespan)
 
 def add(a, b):
     return a + b
@@ -30,17 +64,63 @@ app.add_middleware(
     allow_methods=["*"],      # includes OPTIONS/POST/PUT
     allow_headers=["*"],      # includes content-type, authorization, etc.
     allow_credentials=False,  # keep False with wildcards; use explicit list if True
+    expose_headers=["ETag"],  # lets the frontend read ETags for conditional GETs
 )
-# --- Supabase Client Dependency ---
+# --- Profile Lookup Helpers ---
+
+async def fetch_profile(db: AsyncPostgrestClient, clerk_id: str) -> Optional[dict]:
+    """
+    Read-through lookup of a single profile row.
+    Serves the row from the profile cache when possible and falls back to
+    Supabase on a miss, storing the result for subsequent reads.
+    """
+    cached = profile_cache.get(clerk_id)
+    if cached is not None:
+        return cached
+
+    response = await db.table("user_profiles").select(PROFILE_SELECT).eq("clerk_id", clerk_id).execute()
+    if not response.data:
+        return None
+
+    profile_cache.set(clerk_id, response.data[0])
+    return response.data[0]
+
+
+async def fetch_profiles(db: AsyncPostgrestClient, clerk_ids: List[str]) -> dict:
+    """
+    Read-through lookup of many profile rows, returned as {clerk_id: row}.
+    Cached rows are served from memory and all misses are fetched with a
+    single `in_` query. IDs without a stored profile are left out.
+    """
+    found = profile_cache.get_many(clerk_ids)
+    misses = [clerk_id for clerk_id in clerk_ids if clerk_id not in found]
+    if not misses:
+        return found
+
+    response = await db.table("user_profiles").select(PROFILE_SELECT).in_("clerk_id", misses).execute()
+    for row in response.data or []:
+        profile_cache.set(row["clerk_id"], row)
+        found[row["clerk_id"]] = row
+    return found
 
-def get_supabase() -> Client:
+
+def profile_etag(profile: dict) -> str:
     """
-    Dependency to provide the Supabase client instance to API endpoints.
-    This ensures a single, reusable client across all requests.
+    Build a weak ETag from a hash of the profile's content.
+    Any change to a stored field (including updated_at) produces a new tag.
     """
-    if supabase is None:
-        raise HTTPException(status_code=500, detail="Supabase client not initialized.")
-    return supabase
+    digest = hashlib.sha1(json.dumps(profile, sort_keys=True, default=str).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against the current ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == current for tag in if_none_match.split(","))
 
 
 # --- API Endpoints ---
@@ -48,7 +128,7 @@ def get_supabase() -> Client:
 @app.post("/profiles/", response_model=Profile, status_code=status.HTTP_201_CREATED)
 async def create_profile(
     profile_data: ProfileCreate, 
-    db: Client = Depends(get_supabase)
+    db: AsyncPostgrestClient = Depends(get_supabase)
 ):
     """
     Creates a new user profile in the database.
@@ -57,72 +137,182 @@ async def create_profile(
     
     Args:
         profile_data (ProfileCreate): The profile data to be created, validated by Pydantic.
-        db (Client): The Supabase client dependency.
+        db (AsyncPostgrestClient): The async Supabase client dependency.
     
     Returns:
-        The newly created user profile object.
+        The newly created user profile object (201), or the existing profile (200)
+        if one was already stored for this Clerk ID.
     
     Raises:
         HTTPException:
-            400 Bad Request: If a profile with the given user_id already exists.
             500 Internal Server Error: If the database operation fails.
     """
-    # First, check if a profile for this user ID already exists to prevent duplicates.
-    existing_profile = db.table("user_profiles").select("*").eq("clerk_id", profile_data.clerk_id).execute()
-    if existing_profile.data:
-        # Profile exists, return it with 200 OK status
+    # Insert the profile, or do nothing if one already exists for this Clerk ID.
+    # The unique constraint on clerk_id decides atomically in a single round trip,
+    # so concurrent sign-ups for the same user cannot create duplicates.
+    response = await db.table("user_profiles").upsert(
+        profile_data.model_dump(), on_conflict="clerk_id", ignore_duplicates=True
+    ).execute()
+
+    if response.data:
+        profile_cache.invalidate(profile_data.clerk_id)
         return JSONResponse(
-            status_code=status.HTTP_200_OK,
-            content=existing_profile.data[0]
+            status_code=status.HTTP_201_CREATED,
+            content=project(response.data[0], PROFILE_COLUMNS)
         )
 
-    # Insert the new profile data into the Supabase table.
-    response = db.table("user_profiles").insert(profile_data.dict()).execute()
-    
-    # Check if the database operation was successful.
-    if not response.data:
+    # Nothing was inserted, so the profile already exists: return it with 200 OK.
+    existing_profile = await fetch_profile(db, profile_data.clerk_id)
+    if existing_profile is None:
         raise HTTPException(status_code=500, detail="Failed to create profile.")
-        
+
     return JSONResponse(
-        status_code=status.HTTP_201_CREATED,
-        content=response.data[0]
+        status_code=status.HTTP_200_OK,
+        content=existing_profile
     )
 
 
+@app.post("/profiles/batch", response_model=ProfileBatchResponse)
+async def get_profiles_batch(
+    batch: ProfileBatchRequest,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: AsyncPostgrestClient = Depends(get_supabase)
+):
+    """
+    Retrieves many user profiles in a single request.
+    This endpoint lets other services (e.g., matchmaking candidate lists or
+    messaging inboxes) fetch every profile they need with one HTTP call.
+    
+    Args:
+        batch (ProfileBatchRequest): The Clerk IDs to look up (duplicates are ignored).
+        fields (str): Optional field set name or comma separated list of fields to return.
+        db (AsyncPostgrestClient): The async Supabase client dependency.
+        
+    Returns:
+        The found profiles keyed by Clerk ID, plus the IDs that have no profile.
+    """
+    columns = parse_fields(fields)
+    clerk_ids = list(dict.fromkeys(batch.clerk_ids))
+    profiles = await fetch_profiles(db, clerk_ids)
+    missing = [clerk_id for clerk_id in clerk_ids if clerk_id not in profiles]
+
+    if columns is not None:
+        # Partial profiles do not fit the response model, so return them directly.
+        return JSONResponse(content={
+            "profiles": {clerk_id: project(row, columns) for clerk_id, row in profiles.items()},
+            "missing": missing,
+        })
+
+    return {"profiles": profiles, "missing": missing}
+
+
+@app.post("/profiles/import", response_model=ProfileImportResult)
+async def import_profiles_ndjson(
+    request: Request,
+    db: AsyncPostgrestClient = Depends(get_supabase)
+):
+    """
+    Bulk-creates profiles from a newline-delimited JSON (NDJSON) request body.
+    Each line is validated as a ProfileCreate. Valid profiles are inserted in
+    batches while the body is streamed, so files of any size can be imported.
+    Profiles whose clerk_id already exists are skipped, which makes re-running
+    an import safe.
+    
+    Args:
+        request (Request): The incoming request; its body is read as a stream.
+        db (AsyncPostgrestClient): The async Supabase client dependency.
+        
+    Returns:
+        Counts of received, inserted, skipped and invalid lines, plus the first errors.
+        
+    Raises:
+        HTTPException:
+            413 Request Entity Too Large: If a single line exceeds the line size limit.
+    """
+    try:
+        return await import_profiles(db, request.stream())
+    except NDJSONLineTooLong as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+@app.get("/profiles/export")
+async def export_profiles_ndjson(
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: AsyncPostgrestClient = Depends(get_supabase)
+):
+    """
+    Streams every profile as newline-delimited JSON (NDJSON), ordered by clerk_id.
+    Profiles are read page by page while the response is sent, so memory use
+    does not grow with the size of the table. The output can be fed back into
+    POST /profiles/import.
+    
+    Args:
+        fields (str): Optional field set name or comma separated list of fields to export.
+        db (AsyncPostgrestClient): The async Supabase client dependency.
+        
+    Returns:
+        A streaming `application/x-ndjson` response.
+    """
+    columns = parse_fields(fields) or PROFILE_COLUMNS
+    return StreamingResponse(export_profiles(db, columns), media_type="application/x-ndjson")
+
+
 @app.get("/profiles/{clerk_id}", response_model=Profile)
 async def get_profile(
     clerk_id: str, 
-    db: Client = Depends(get_supabase)
+    response: Response,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncPostgrestClient = Depends(get_supabase)
 ):
     """
     Retrieves a user's profile information by their unique user_id.
     This endpoint is useful for other services (e.g., matchmaking) to get user details.
+    Responses carry an ETag; a request whose If-None-Match header still matches
+    gets an empty 304 Not Modified instead of the profile body.
     
     Args:
         user_id (str): The unique ID of the user from Clerk.
-        db (Client): The Supabase client dependency.
+        fields (str): Optional field set name or comma separated list of fields to return.
+        if_none_match (str): Optional ETag(s) the client already holds.
+        db (AsyncPostgrestClient): The async Supabase client dependency.
         
     Returns:
-        The user's profile object.
+        The user's profile object, or 304 Not Modified.
         
     Raises:
         HTTPException:
             404 Not Found: If no profile is found for the given user_id.
     """
-    # Select all columns from the 'user_profiles' table where the clerk_id matches.
-    response = db.table("user_profiles").select("*").eq("clerk_id", clerk_id).execute()
+    columns = parse_fields(fields)
 
-    if not response.data:
+    # Serve from the profile cache, falling back to the 'user_profiles' table.
+    profile = await fetch_profile(db, clerk_id)
+
+    if profile is None:
         raise HTTPException(status_code=404, detail="Profile not found.")
-        
-    return response.data[0]
+
+    # The ETag describes the representation being returned, so it depends on the projection.
+    body = project(profile, columns or PROFILE_COLUMNS)
+    etag = profile_etag(body)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if columns is not None:
+        # Partial profiles do not fit the response model, so return them directly.
+        return JSONResponse(content=body, headers=headers)
+
+    response.headers.update(headers)
+    return body
 
 
 @app.put("/profiles/{clerk_id}", response_model=Profile)
 async def update_profile(
     clerk_id: str, 
     profile_data: ProfileUpdate, 
-    db: Client = Depends(get_supabase)
+    response: Response,
+    db: AsyncPostgrestClient = Depends(get_supabase)
 ):
     """
     Updates an existing user's profile.
@@ -132,7 +322,7 @@ async def update_profile(
         user_id (str): The unique ID of the user.
         profile_data (ProfileUpdate): A Pydantic model containing the fields to update.
                                       Using `exclude_unset=True` ensures only provided fields are updated.
-        db (Client): The Supabase client dependency.
+        db (AsyncPostgrestClient): The async Supabase client dependency.
         
     Returns:
         The updated user's profile object.
@@ -144,10 +334,44 @@ async def update_profile(
     # Update the profile data in the Supabase table.
     # The `dict(exclude_unset=True)` method creates a dictionary containing only
     # the fields that were actually provided in the request body.
-    response = db.table("user_profiles").update(profile_data.dict(exclude_unset=True)).eq("clerk_id", clerk_id).execute()
+    # `updated_at` is stamped by the database (the `touch_updated_at` trigger), so
+    # services that refresh incrementally by it (e.g. the matchmaking candidate and
+    # interest indexes) pick up the change regardless of this instance's clock.
+    changes = profile_data.model_dump(exclude_unset=True)
+    result = await db.table("user_profiles").update(changes).eq("clerk_id", clerk_id).execute()
+    # Drop the cached copy so the next read sees the new values.
+    profile_cache.invalidate(clerk_id)
 
-    if not response.data:
+    if not result.data:
         raise HTTPException(status_code=404, detail="Profile not found or no changes were made.")
+
+    profile = project(result.data[0], PROFILE_COLUMNS)
+    response.headers["ETag"] = profile_etag(profile)
+    return profile
+
+
+@app.post("/profiles/{clerk_id}/heartbeat", status_code=status.HTTP_202_ACCEPTED)
+async def record_heartbeat(clerk_id: str):
+    """
+    Records that a user was just active.
+    The timestamp is buffered in memory and written to `last_active` in bulk by
+    a background flush, so this endpoint never waits on the database.
+    Profile reads may show a `last_active` that lags by up to the flush
+    interval plus the profile cache TTL.
+    
+    Args:
+        clerk_id (str): The unique ID of the user from Clerk.
         
-    return response.data[0]
+    Returns:
+        A confirmation that the heartbeat was queued.
+    """
+    heartbeat_buffer.record(clerk_id)
+    return {"status": "queued"}
+
+
+# --- Monitoring ---
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Returns the size and hit/miss counters of the profile cache and the heartbeat buffer."""
+    return {"profiles": profile_cache.stats(), "heartbeats": heartbeat_buffer.stats()}
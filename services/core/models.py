@@ -5,7 +5,7 @@
 
 
 from pydantic import BaseModel,Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from uuid import UUID
 from datetime import datetime
 
@@ -51,3 +51,41 @@ class Profile(ProfileCreate):
     created_at: datetime
     updated_at: datetime
     last_active: Optional[datetime]
+
+
+# --- Batch Lookup Models ---
+MAX_PROFILE_BATCH_SIZE = 200
+
+class ProfileBatchRequest(BaseModel):
+    """
+    Model for looking up many profiles in one request.
+    Used by other services (e.g., matchmaking, messaging) to avoid one call per profile.
+    """
+    clerk_ids: List[str] = Field(min_length=1, max_length=MAX_PROFILE_BATCH_SIZE)
+
+class ProfileBatchResponse(BaseModel):
+    """
+    Profiles found for a batch lookup, keyed by clerk_id.
+    IDs with no stored profile are listed in `missing`.
+    """
+    profiles: Dict[str, Profile]
+    missing: List[str] = Field(default_factory=list)
+
+
+# --- Bulk Import Models ---
+class ProfileImportError(BaseModel):
+    """A rejected line of an NDJSON profile import."""
+    line: int
+    error: str
+
+class ProfileImportResult(BaseModel):
+    """
+    Summary of an NDJSON profile import.
+    `skipped` counts profiles whose clerk_id already existed (or repeated within the file).
+    Only the first 100 errors are listed; `invalid` counts all of them.
+    """
+    received: int
+    inserted: int
+    skipped: int
+    invalid: int
+    errors: List[ProfileImportError] = Field(default_factory=list)
@@ -0,0 +1,60 @@
+# projections.py
+# This file defines the named column sets used when reading user profiles.
+# Selecting only the columns a caller needs keeps row payloads and JSON
+# decoding small compared to select("*").
+
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi import HTTPException
+
+from .models import Profile
+
+# Every column exposed through the Profile model. Core never returns the other
+# user_profiles columns (password hash, blocked users, moderation counters, ...).
+PROFILE_COLUMNS: Tuple[str, ...] = tuple(Profile.model_fields)
+
+# Named column sets that callers can request with `fields=<name>`.
+PROFILE_FIELD_SETS: Dict[str, Tuple[str, ...]] = {
+    "full": PROFILE_COLUMNS,
+    # Enough to list a user (e.g., inbox rows, candidate lists).
+    "summary": ("clerk_id", "anonymous_handle", "country_code", "age_range"),
+    # What matchmaking needs to compare two users.
+    "matching": (
+        "clerk_id", "age_range", "primary_language", "secondary_languages",
+        "time_zone", "country_code", "interests",
+    ),
+}
+
+
+def select_columns(columns: Iterable[str]) -> str:
+    """Render a column set as a PostgREST select list."""
+    return ",".join(columns)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Parse the `fields` query parameter.
+    Accepts either the name of a field set (e.g. "summary") or a comma separated
+    list of profile columns. Returns None when no projection was requested.
+
+    Raises:
+        HTTPException:
+            400 Bad Request: If the list is empty or names an unknown column.
+    """
+    if fields is None:
+        return None
+    if fields in PROFILE_FIELD_SETS:
+        return PROFILE_FIELD_SETS[fields]
+
+    requested = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    if not requested:
+        raise HTTPException(status_code=400, detail="No profile fields requested.")
+    unknown = [f for f in requested if f not in PROFILE_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown profile field(s): {', '.join(unknown)}.")
+    return requested
+
+
+def project(row: dict, columns: Iterable[str]) -> dict:
+    """Keep only the given columns of a profile row."""
+    return {column: row.get(column) for column in columns}
@@ -27,6 +27,8 @@ export interface SendLetterResponse {
 export interface PageLettersRequest {
   conversation_thread_id: UUID;
   page_size?: number;
+  cursor?: string | null; // from the previous page's `cursor`
+  /** @deprecated use `cursor` */
   last_message_id?: UUID;
 }
 
@@ -46,6 +48,7 @@ export interface PageLettersResponse {
   items: MessageRow[];
   count: number;
   next_cursor: UUID | null;
+  cursor: string | null; // opaque; null on the last page
   has_more: boolean;
 }
 
@@ -0,0 +1,161 @@
+# batching.py
+# Optional batched matchmaking rounds.
+#
+# In batch mode, POST /matches/find does not match the requester on its own.
+# Requests are collected for a short window (MATCH_BATCH_WINDOW_SECONDS) and
+# the whole round is solved at once, so concurrent requesters do not compete
+# greedily for the same best candidates. The round solver (see
+# `solve_match_round` in main.py) turns the round into scored pairs, and
+# `assign_pairs` picks the pairs that maximise total compatibility with each
+# user matched at most once.
+
+import asyncio
+import os
+import time
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# 0 disables batch mode (every request is matched immediately).
+MATCH_BATCH_WINDOW_SECONDS = float(os.environ.get("MATCH_BATCH_WINDOW_SECONDS", "0"))
+# A round starts early once this many requests are waiting.
+MATCH_BATCH_MAX_SIZE = int(os.environ.get("MATCH_BATCH_MAX_SIZE", "50000"))
+
+# (score, user_a, user_b)
+Edge = Tuple[float, str, str]
+
+
+def assign_pairs(edges: Iterable[Edge]) -> List[Edge]:
+    """
+    Choose pairs so that every user appears at most once, maximising total score.
+
+    Uses the greedy maximum-weight matching: edges are taken best first and
+    kept if neither user is already paired. It runs in O(E log E), which keeps
+    rounds of tens of thousands of users well under a second. The total is
+    guaranteed to be at least half the optimum; with top-k edges per user it
+    is usually much closer, because good pairs tend to be each other's best
+    options. Exact matching on a general graph (blossom) is O(V^3), which is
+    too slow at this scale.
+    """
+    paired = set()
+    chosen: List[Edge] = []
+    for edge in sorted(edges, key=lambda e: e[0], reverse=True):
+        _, a, b = edge
+        if a == b or a in paired or b in paired:
+            continue
+        paired.add(a)
+        paired.add(b)
+        chosen.append(edge)
+    return chosen
+
+
+class MatchBatcher:
+    """
+    Collects keyed requests and hands them to `solve` once per window.
+
+    `solve` receives the list of requests of a round and returns a dict from
+    key to outcome: either a result or an exception to raise for that key.
+    It runs in a worker thread, so the event loop stays responsive while a
+    round is solved.
+    """
+
+    def __init__(
+        self,
+        solve: Callable[[List[Any]], Dict[str, Any]],
+        window_seconds: float = MATCH_BATCH_WINDOW_SECONDS,
+        max_size: int = MATCH_BATCH_MAX_SIZE,
+    ):
+        self._solve = solve
+        self.window_seconds = window_seconds
+        self.max_size = max_size
+        self._pending: List[Tuple[str, Any, asyncio.Future]] = []
+        self._lock = Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self.rounds = 0
+        self.requests = 0
+        self.matched = 0
+        self.failed_rounds = 0
+        self.last_round: Dict[str, Any] = {}
+        self.max_solve_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0
+
+    async def submit(self, key: str, request: Any) -> Any:
+        """Queue a request for the next round and wait for its outcome."""
+        future = asyncio.get_running_loop().create_future()
+        with self._lock:
+            self._pending.append((key, request, future))
+            full = len(self._pending) >= self.max_size
+        if full and self._wakeup is not None:
+            self._wakeup.set()
+        return await future
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    async def run_round(self) -> int:
+        """Solve everything that is waiting. Returns the number of requests handled."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+
+        started = time.perf_counter()
+        try:
+            outcomes = await asyncio.to_thread(self._solve, [request for _, request, _ in batch])
+        except Exception as e:
+            self.failed_rounds += 1
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return len(batch)
+        solve_ms = (time.perf_counter() - started) * 1000
+
+        matched = 0
+        for key, _, future in batch:
+            if future.done():  # the client went away
+                continue
+            outcome = outcomes.get(key)
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            elif outcome is None:
+                future.set_exception(RuntimeError(f"Round produced no outcome for {key}"))
+            else:
+                matched += 1
+                future.set_result(outcome)
+
+        self.rounds += 1
+        self.requests += len(batch)
+        self.matched += matched
+        self.max_solve_ms = max(self.max_solve_ms, solve_ms)
+        self.last_round = {"size": len(batch), "matched": matched, "solve_ms": round(solve_ms, 2)}
+        return len(batch)
+
+    async def run(self) -> None:
+        """Background loop: solve a round every window, or early once the round is full."""
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.window_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.run_round()
+            except Exception as e:
+                print(f"ERROR: Match round failed. Details: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "window_seconds": self.window_seconds,
+            "pending": self.pending(),
+            "rounds": self.rounds,
+            "requests": self.requests,
+            "matched": self.matched,
+            "failed_rounds": self.failed_rounds,
+            "max_solve_ms": round(self.max_solve_ms, 2),
+            "last_round": self.last_round,
+        }
@@ -0,0 +1,460 @@
+# candidate_index.py
+# In-memory index of matchable profiles for the matchmaking service.
+#
+# find_penpal used to read every row of user_profiles on each request. The
+# index keeps the active profiles in memory, bucketed the same way as the
+# `idx_user_profiles_matching` database index (account_status, country_code,
+# primary_language, age_range), so a request only touches the buckets for the
+# languages and age ranges it asks for. Only active profiles are indexed.
+#
+# The index is loaded once (paged by user_id) and then kept fresh
+# incrementally: every `refresh_interval` seconds only rows whose `updated_at`
+# is at or after the last seen value are re-read (in pages, by updated_at and
+# user_id), and callers can push a profile they have just read with `upsert`.
+# `updated_at` is stamped by the database (see the data design doc), but rows
+# are not committed in stamp order, so each refresh reaches back
+# `CANDIDATE_INDEX_REFRESH_OVERLAP_SECONDS` before the last seen value and
+# skips the rows it already holds.
+#
+# Each profile gets a slot number. Its encoded matching attributes (see
+# scoring.py) are stored in NumPy columns at that slot and the buckets hold
+# slots, so gathering and scoring a request's candidates is done with array
+# operations rather than per-candidate Python code.
+#
+# The index also maintains a MinHash/LSH index of interests (see
+# interest_index.py), updated whenever a profile is applied.
+
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .interest_index import InterestIndex
+from .scoring import (
+    INTEREST_BITS,
+    LANGUAGE_BITS,
+    CandidatePool,
+    ScoredCandidate,
+    encode_profile,
+    rank_pool,
+    within_hours,
+)
+
+CANDIDATE_INDEX_REFRESH_SECONDS = float(os.environ.get("CANDIDATE_INDEX_REFRESH_SECONDS", "30"))
+CANDIDATE_INDEX_PAGE_SIZE = int(os.environ.get("CANDIDATE_INDEX_PAGE_SIZE", "1000"))
+CANDIDATE_INDEX_REFRESH_OVERLAP_SECONDS = float(os.environ.get("CANDIDATE_INDEX_REFRESH_OVERLAP_SECONDS", "5"))
+
+# Columns held for every indexed profile.
+INDEX_PROFILE_COLUMNS = (
+    "user_id,account_status,age_range,primary_language,secondary_languages,"
+    "time_zone,preferred_time_zone_distance,max_active_conversations,country_code,"
+    "interests,blocked_users,updated_at"
+)
+
+# Columns that decide how a profile matches; profile_version fingerprints them.
+MATCHING_COLUMNS = (
+    "account_status", "age_range", "primary_language", "secondary_languages",
+    "time_zone", "preferred_time_zone_distance", "max_active_conversations",
+    "country_code", "interests", "blocked_users",
+)
+
+# Initial number of slots; the feature columns double in size when full.
+_INITIAL_SLOTS = 1024
+
+
+def profile_languages(profile: Dict[str, Any]) -> Set[str]:
+    """Primary and secondary languages of a profile."""
+    languages = set(profile.get("secondary_languages") or [])
+    if profile.get("primary_language"):
+        languages.add(profile["primary_language"])
+    return languages
+
+
+def profile_version(profile: Dict[str, Any]) -> str:
+    """
+    Fingerprint of a profile's MATCHING_COLUMNS. It changes only when how the
+    profile matches changes, not on heartbeats or other bookkeeping updates.
+    """
+    raw = json.dumps([profile.get(column) for column in MATCHING_COLUMNS], default=str)
+    return hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+
+def is_current(row: Dict[str, Any], indexed_version: Optional[str]) -> bool:
+    """Whether an index already reflects `row`, given its version of that user (None if not indexed)."""
+    if row.get("account_status", "active") != "active":
+        return indexed_version is None
+    return indexed_version == profile_version(row)
+
+
+def _refresh_start(watermark: str, overlap_seconds: float) -> str:
+    """`watermark` moved back by `overlap_seconds` (unchanged if it is not a timestamp)."""
+    try:
+        start = datetime.fromisoformat(watermark.replace("Z", "+00:00"))
+    except ValueError:
+        return watermark
+    return (start - timedelta(seconds=overlap_seconds)).isoformat()
+
+
+def changed_profiles(
+    db: Any,
+    watermark: Optional[str],
+    page_size: int,
+    overlap_seconds: float = CANDIDATE_INDEX_REFRESH_OVERLAP_SECONDS,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Pages of profiles whose updated_at is at or after `watermark` (less
+    `overlap_seconds`), ordered by updated_at and user_id, so rows sharing a
+    timestamp are neither skipped nor read twice.
+    """
+    last: Optional[Tuple[str, str]] = None
+    while True:
+        query = db.table("user_profiles").select(INDEX_PROFILE_COLUMNS)
+        if watermark is not None:
+            query = query.gte("updated_at", _refresh_start(watermark, overlap_seconds))
+        if last is not None:
+            updated_at, user_id = last
+            query = query.or_(f'updated_at.gt."{updated_at}",and(updated_at.eq."{updated_at}",user_id.gt.{user_id})')
+        page = query.order("updated_at").order("user_id").limit(page_size).execute().data or []
+        if page:
+            yield page
+        # Rows without updated_at sort last and are only picked up by a full load.
+        if len(page) < page_size or not page[-1].get("updated_at"):
+            return
+        last = (page[-1]["updated_at"], page[-1]["user_id"])
+
+
+def rank_skipping(
+    rank: Callable[[int], List[ScoredCandidate]],
+    k: int,
+    skip: Optional[Callable[[str], bool]] = None,
+) -> List[ScoredCandidate]:
+    """
+    The best `k` of `rank(n)` (the top `n` candidates) that are not `skip`ped.
+    Only the returned candidates are checked; if skipped ones crowd the top,
+    twice as many are ranked until `k` are left or the candidates run out.
+    """
+    want = k
+    while True:
+        ranked = rank(want)
+        kept = [c for c in ranked if skip is None or not skip(c.profile["user_id"])]
+        if len(kept) >= k or len(ranked) < want:
+            return kept[:k]
+        want *= 2
+
+
+class CandidateIndex:
+    """
+    Active profiles bucketed by language, age range and country.
+
+    A profile is listed in the bucket of its primary language and of each of
+    its secondary languages, so a language bucket holds everyone who can hold
+    a conversation in that language. The index also tracks, for each user,
+    who has blocked them.
+    """
+
+    def __init__(
+        self,
+        refresh_interval: float = CANDIDATE_INDEX_REFRESH_SECONDS,
+        page_size: int = CANDIDATE_INDEX_PAGE_SIZE,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.refresh_interval = refresh_interval
+        self.page_size = page_size
+        self._clock = clock
+        self._lock = Lock()
+        # Held while loading or refreshing, so concurrent requests do it once.
+        self._refresh_lock = Lock()
+        self.interests = InterestIndex()
+        self._reset()
+        self._loaded = False
+        self._last_refresh: Optional[float] = None
+        self.full_loads = 0
+        self.refreshes = 0
+
+    def _reset(self) -> None:
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        self._slots: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._user_ids = np.empty(_INITIAL_SLOTS, dtype=object)
+        self._langs = np.zeros((_INITIAL_SLOTS, LANGUAGE_BITS.words), dtype=np.uint64)
+        self._interests = np.zeros((_INITIAL_SLOTS, INTEREST_BITS.words), dtype=np.uint64)
+        self._ages = np.zeros(_INITIAL_SLOTS, dtype=np.int8)
+        self._zones = np.zeros(_INITIAL_SLOTS, dtype=np.int16)
+        self._by_language: Dict[str, Set[int]] = defaultdict(set)
+        self._by_age_range: Dict[str, Set[int]] = defaultdict(set)
+        self._by_country: Dict[str, Set[int]] = defaultdict(set)
+        self._blocked_by: Dict[str, Set[str]] = defaultdict(set)
+        # Highest updated_at seen; the next refresh reads rows from it (less the overlap) on.
+        self._watermark: Optional[str] = None
+        self.interests.clear()
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._profiles
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return self._profiles.get(user_id)
+
+    def version(self, user_id: str) -> Optional[str]:
+        """profile_version of an indexed user, or None if they are not indexed."""
+        profile = self._profiles.get(user_id)
+        return None if profile is None else profile_version(profile)
+
+    def user_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._profiles)
+
+    def blocked_by(self, user_id: str) -> Set[str]:
+        """Indexed users who have `user_id` in their blocked_users."""
+        with self._lock:
+            return set(self._blocked_by.get(user_id, ()))
+
+    # --- Maintenance ---
+    def _new_slot(self) -> int:
+        if self._free:
+            return self._free.pop()
+        slot = len(self._slots)
+        if slot >= len(self._user_ids):
+            size = 2 * len(self._user_ids)
+            for name in ("_user_ids", "_langs", "_interests", "_ages", "_zones"):
+                column = getattr(self, name)
+                grown = np.zeros((size, *column.shape[1:]), dtype=column.dtype)
+                grown[:len(column)] = column
+                setattr(self, name, grown)
+        return slot
+
+    def _discard(self, user_id: str) -> None:
+        old = self._profiles.pop(user_id, None)
+        if old is None:
+            return
+        slot = self._slots.pop(user_id)
+        self._user_ids[slot] = None
+        self._free.append(slot)
+        for language in profile_languages(old):
+            self._drop(self._by_language, language, slot)
+        self._drop(self._by_age_range, old.get("age_range"), slot)
+        self._drop(self._by_country, old.get("country_code"), slot)
+        for blocked in old.get("blocked_users") or ():
+            self._drop(self._blocked_by, blocked, user_id)
+
+    @staticmethod
+    def _drop(buckets: Dict[str, Set[Any]], key: Optional[str], member: Any) -> None:
+        bucket = buckets.get(key)
+        if bucket is not None:
+            bucket.discard(member)
+            if not bucket:
+                del buckets[key]
+
+    def _apply(self, profile: Dict[str, Any]) -> None:
+        user_id = profile["user_id"]
+        self._discard(user_id)
+        updated_at = profile.get("updated_at")
+        if updated_at and (self._watermark is None or updated_at > self._watermark):
+            self._watermark = updated_at
+        if profile.get("account_status", "active") != "active":
+            self.interests.remove(user_id)
+            return
+        # Only moves the user between LSH buckets if their interests changed.
+        self.interests.upsert(user_id, profile.get("interests"))
+        slot = self._new_slot()
+        self._profiles[user_id] = profile
+        self._slots[user_id] = slot
+        self._user_ids[slot] = user_id
+        (self._langs[slot], self._interests[slot],
+         self._ages[slot], self._zones[slot]) = encode_profile(profile)
+        for language in profile_languages(profile):
+            self._by_language[language].add(slot)
+        if profile.get("age_range"):
+            self._by_age_range[profile["age_range"]].add(slot)
+        if profile.get("country_code"):
+            self._by_country[profile["country_code"]].add(slot)
+        for blocked in profile.get("blocked_users") or ():
+            self._blocked_by[blocked].add(user_id)
+
+    def upsert(self, profile: Dict[str, Any]) -> None:
+        """Add or replace a profile; profiles that are no longer active are removed."""
+        with self._lock:
+            self._apply(profile)
+
+    def remove(self, user_id: str) -> None:
+        with self._lock:
+            self._discard(user_id)
+            self.interests.remove(user_id)
+
+    def load(self, db: Any) -> int:
+        """Replace the index with every active profile, read in pages of `page_size`."""
+        rows: List[Dict[str, Any]] = []
+        last_id = None
+        while True:
+            query = (
+                db.table("user_profiles").select(INDEX_PROFILE_COLUMNS)
+                .eq("account_status", "active").order("user_id").limit(self.page_size)
+            )
+            if last_id is not None:
+                query = query.gt("user_id", last_id)
+            page = query.execute().data or []
+            rows.extend(page)
+            if len(page) < self.page_size:
+                break
+            last_id = page[-1]["user_id"]
+
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._apply(row)
+            self._loaded = True
+            self._last_refresh = self._clock()
+            self.full_loads += 1
+        return len(rows)
+
+    def refresh(self, db: Any) -> int:
+        """Apply profiles changed since the last load or refresh. Returns profiles applied."""
+        with self._lock:
+            watermark = self._watermark
+        applied = 0
+        for page in changed_profiles(db, watermark, self.page_size):
+            with self._lock:
+                for row in page:
+                    if not is_current(row, self.version(row["user_id"])):
+                        self._apply(row)
+                        applied += 1
+        with self._lock:
+            self._last_refresh = self._clock()
+            self.refreshes += 1
+        return applied
+
+    def ensure_fresh(self, db: Any) -> None:
+        """Load the index on first use, then refresh it once `refresh_interval` has passed."""
+        if self._loaded and self._clock() - self._last_refresh < self.refresh_interval:
+            return
+        with self._refresh_lock:
+            if not self._loaded:
+                self.load(db)
+            elif self._clock() - self._last_refresh >= self.refresh_interval:
+                self.refresh(db)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+            self._loaded = False
+            self._last_refresh = None
+            self.full_loads = 0
+            self.refreshes = 0
+
+    # --- Lookups ---
+    def pool(
+        self,
+        languages: Iterable[str],
+        age_ranges: Iterable[str] = (),
+        country_codes: Iterable[str] = (),
+        exclude: Iterable[str] = (),
+    ) -> CandidatePool:
+        """
+        Encoded profiles that speak any of `languages` and, when given, are in
+        one of `age_ranges` and `country_codes`. Users in `exclude` are left out.
+        """
+        with self._lock:
+            slots = self._union(self._by_language, languages)
+            for buckets, keys in ((self._by_age_range, age_ranges), (self._by_country, country_codes)):
+                keys = list(keys)
+                if keys and slots:
+                    slots &= self._union(buckets, keys)
+            slots.difference_update(self._slots[u] for u in exclude if u in self._slots)
+            picked = np.fromiter(slots, dtype=np.intp, count=len(slots))
+            return CandidatePool(
+                self._user_ids[picked],
+                self._langs[picked],
+                self._interests[picked],
+                self._ages[picked],
+                self._zones[picked],
+            )
+
+    def candidates(
+        self,
+        languages: Iterable[str],
+        age_ranges: Iterable[str] = (),
+        country_codes: Iterable[str] = (),
+        exclude: Iterable[str] = (),
+    ) -> List[Dict[str, Any]]:
+        """Same as `pool`, as profile dicts."""
+        user_ids = self.pool(languages, age_ranges, country_codes, exclude).user_ids
+        return [p for p in map(self._profiles.get, user_ids) if p is not None]
+
+    def rank(
+        self,
+        user: Dict[str, Any],
+        languages: Iterable[str],
+        age_ranges: Iterable[str],
+        preferred_languages: Iterable[str],
+        partners: Optional[Any],
+        blocked: Iterable[str],
+        k: int,
+        skip: Optional[Callable[[str], bool]] = None,
+    ) -> Tuple[List[ScoredCandidate], int]:
+        """
+        The best `k` candidates for `user`, and how many candidates there are
+        before previous partners and blocks are applied when none are left
+        (so callers can tell "nobody" from "nobody new").
+
+        Blocked users (in either direction) are always left out, previous
+        partners when `partners` (a PartnerSet) is given, and candidates
+        further away than the user's preferred_time_zone_distance.
+        Candidates for which `skip` is true (e.g. leased right now) are left
+        out of the result; `skip` is only called for the top-ranked ones.
+        """
+        user_id = user["user_id"]
+        age_ranges = list(age_ranges)
+        excluded = {user_id} | set(blocked) | self.blocked_by(user_id)
+        members = partners.members() if partners is not None else None
+        if members:
+            excluded |= members
+        pool = self.pool(languages, age_ranges, exclude=excluded)
+        if partners is not None and members is None:
+            # Heavy users' partners are only in a Bloom filter: test each candidate.
+            pool = pool.where(np.fromiter((u not in partners for u in pool.user_ids), dtype=bool, count=pool.size))
+        max_hours = user.get("preferred_time_zone_distance")
+        if max_hours is not None and pool.size:
+            pool = pool.where(within_hours(user.get("time_zone"), pool, max_hours))
+        if pool.size == 0:
+            return [], self.pool(languages, age_ranges, exclude={user_id}).size
+        preferred_languages = list(preferred_languages)
+        ranked = rank_skipping(
+            lambda n: [
+                ScoredCandidate(self.get(uid) or {"user_id": uid}, score, hours)
+                for uid, score, hours in rank_pool(user, pool, preferred_languages, k=n)
+            ],
+            k,
+            skip,
+        )
+        return ranked, pool.size
+
+    @staticmethod
+    def _union(buckets: Dict[str, Set[int]], keys: Iterable[str]) -> Set[int]:
+        slots: Set[int] = set()
+        for key in keys:
+            slots |= buckets.get(key, set())
+        return slots
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "profiles": len(self._profiles),
+                "languages": len(self._by_language),
+                "age_ranges": len(self._by_age_range),
+                "countries": len(self._by_country),
+                "interest_signatures": len(self.interests),
+                "full_loads": self.full_loads,
+                "refreshes": self.refreshes,
+            }
+
+
+# Shared index instance used by the API endpoints.
+candidate_index = CandidateIndex()
@@ -0,0 +1,215 @@
+# exclusions.py
+# Cached previous-partner sets for the matchmaking service.
+#
+# find_penpal used to query match_records for the requester's previous
+# partners on every call and then test each candidate against a list. The
+# partners of each user are now loaded once, kept in a TTL/LRU cache and
+# updated in place when this instance creates a match, so a request needs no
+# extra query and the partners are removed from the candidate pool as a set.
+#
+# Most users have a handful of partners and are stored as a plain set. Users
+# with more than `bloom_threshold` partners are stored as a Bloom filter
+# instead, which needs about 10 bits per partner instead of a Python string
+# per partner. A false positive only means a candidate is skipped; it can
+# never produce a repeat match.
+
+import hashlib
+import math
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, Optional
+
+EXCLUSION_CACHE_TTL_SECONDS = float(os.environ.get("EXCLUSION_CACHE_TTL_SECONDS", "300"))
+EXCLUSION_CACHE_MAX_ENTRIES = int(os.environ.get("EXCLUSION_CACHE_MAX_ENTRIES", "50000"))
+EXCLUSION_BLOOM_THRESHOLD = int(os.environ.get("EXCLUSION_BLOOM_THRESHOLD", "1000"))
+# Target false positive rate of the Bloom filters.
+EXCLUSION_BLOOM_ERROR_RATE = 0.01
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, using double hashing on one blake2b digest."""
+
+    def __init__(self, capacity: int, error_rate: float = EXCLUSION_BLOOM_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, value: str) -> None:
+        for pos in self._positions(value):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class PartnerSet:
+    """
+    The previous partners of one user: a set, converted to a Bloom filter once
+    it grows past `bloom_threshold` entries.
+    """
+
+    __slots__ = ("_members", "bloom_threshold")
+
+    def __init__(self, partners: Iterable[str] = (), bloom_threshold: int = EXCLUSION_BLOOM_THRESHOLD):
+        self.bloom_threshold = bloom_threshold
+        self._members: Any = set()
+        for partner in partners:
+            self.add(partner)
+
+    @property
+    def is_bloom(self) -> bool:
+        return isinstance(self._members, BloomFilter)
+
+    def add(self, partner: str) -> None:
+        if partner in self._members:
+            return
+        self._members.add(partner)
+        if not self.is_bloom and len(self._members) > self.bloom_threshold:
+            # Leave room to keep adding partners at the target error rate.
+            bloom = BloomFilter(capacity=2 * len(self._members))
+            for member in self._members:
+                bloom.add(member)
+            self._members = bloom
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._members
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def members(self) -> Optional[set]:
+        """The partners as a set, or None once they are only kept in a Bloom filter."""
+        return None if self.is_bloom else self._members
+
+
+class ExclusionCache:
+    """
+    TTL/LRU cache of PartnerSets keyed by user_id.
+
+    Entries expire after `ttl_seconds` so matches created by other instances
+    are picked up; matches created by this instance are applied immediately
+    with `record_match`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = EXCLUSION_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = EXCLUSION_CACHE_TTL_SECONDS,
+        bloom_threshold: int = EXCLUSION_BLOOM_THRESHOLD,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.bloom_threshold = bloom_threshold
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def partners(self, user_id: str, load: Callable[[], Iterable[str]]) -> PartnerSet:
+        """Return the cached partners of `user_id`, calling `load` on a miss or expiry."""
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        partners = PartnerSet(load(), self.bloom_threshold)
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl_seconds, partners)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return partners
+
+    def preload(self, user_ids: Iterable[str], load_many: Callable[[list], Dict[str, Iterable[str]]]) -> int:
+        """
+        Load the partners of every user in `user_ids` that is not cached yet
+        with a single `load_many` call. Returns the number of users loaded.
+        """
+        now = self._clock()
+        with self._lock:
+            missing = [u for u in user_ids if u not in self._entries or self._entries[u][0] <= now]
+        if not missing:
+            return 0
+        loaded = load_many(missing)
+        with self._lock:
+            for user_id in missing:
+                self._entries[user_id] = (now + self.ttl_seconds, PartnerSet(loaded.get(user_id, ()), self.bloom_threshold))
+                self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return len(missing)
+
+    def record_match(self, user_1_id: str, user_2_id: str) -> None:
+        """Add a new match to both users' cached partners (uncached users load it later)."""
+        with self._lock:
+            for user_id, partner in ((user_1_id, user_2_id), (user_2_id, user_1_id)):
+                entry = self._entries.get(user_id)
+                if entry is not None:
+                    entry[1].add(partner)
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "bloom_entries": sum(1 for _, p in self._entries.values() if p.is_bloom),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+def is_excluded(
+    candidate: Dict[str, Any],
+    requester_id: str,
+    partners: Optional[PartnerSet],
+    blocked: Iterable[str],
+) -> bool:
+    """
+    True if `candidate` must not be matched with the requester: a previous
+    partner (when `partners` is given), blocked by the requester, or the
+    candidate has blocked the requester.
+    """
+    candidate_id = candidate["user_id"]
+    return (
+        (partners is not None and candidate_id in partners)
+        or candidate_id in blocked
+        or requester_id in (candidate.get("blocked_users") or ())
+    )
+
+
+# Shared cache instance used by the API endpoints.
+exclusion_cache = ExclusionCache()
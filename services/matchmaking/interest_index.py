@@ -0,0 +1,174 @@
+# interest_index.py
+# MinHash / LSH index of profile interests for the matchmaking service.
+#
+# Finding the users whose interests are most like someone's would otherwise
+# mean comparing their interest list with everyone else's. Instead each
+# profile gets a MinHash signature of its interest set: `num_perm` minimum
+# hash values whose agreement rate estimates the Jaccard similarity of two
+# sets. Signatures are split into `bands`, and profiles that agree on every
+# value of at least one band share a bucket, so a lookup only reads the
+# buckets of the query's bands and then ranks those profiles by their
+# estimated similarity.
+#
+# With 64 values in 16 bands of 4, pairs with a Jaccard similarity of 0.5
+# land in a shared bucket about 65% of the time, pairs at 0.7 about 98% of
+# the time and pairs at 0.2 under 3% of the time.
+#
+# The index is kept up to date by the candidate index: whenever a profile is
+# loaded, refreshed or pushed with `upsert`, its signature is recomputed, and
+# only profiles whose interests actually changed move between buckets.
+
+import hashlib
+import os
+from collections import defaultdict
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+INTEREST_LSH_PERMUTATIONS = int(os.environ.get("INTEREST_LSH_PERMUTATIONS", "64"))
+INTEREST_LSH_BANDS = int(os.environ.get("INTEREST_LSH_BANDS", "16"))
+
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finaliser: a cheap, well-spread 64-bit hash (wraps on overflow)."""
+    values = values ^ (values >> np.uint64(30))
+    values = values * _MIX_1
+    values = values ^ (values >> np.uint64(27))
+    values = values * _MIX_2
+    return values ^ (values >> np.uint64(31))
+
+
+def _interest_hash(interest: str) -> int:
+    return int.from_bytes(hashlib.blake2b(interest.encode(), digest_size=8).digest(), "little")
+
+
+def normalize_interests(interests: Optional[Iterable[str]]) -> Set[str]:
+    """Interests compared case- and whitespace-insensitively, blanks dropped."""
+    return {i.strip().lower() for i in interests or () if i and i.strip()}
+
+
+class InterestIndex:
+    """MinHash signatures of interest sets, bucketed by LSH band."""
+
+    def __init__(self, num_perm: int = INTEREST_LSH_PERMUTATIONS, bands: int = INTEREST_LSH_BANDS, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        # One random salt per hash function; h_i(x) = mix(x ^ salt_i).
+        self._salts = np.random.default_rng(seed).integers(0, 2**63, num_perm, dtype=np.uint64)
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._buckets: List[Dict[bytes, Set[str]]] = [defaultdict(set) for _ in range(bands)]
+        self._lock = Lock()
+        self.updates = 0
+
+    def signature(self, interests: Iterable[str]) -> Optional[np.ndarray]:
+        """MinHash signature (uint32 per hash function), or None for no interests."""
+        values = normalize_interests(interests)
+        if not values:
+            return None
+        hashes = np.fromiter((_interest_hash(v) for v in values), dtype=np.uint64, count=len(values))
+        mixed = _mix(hashes[:, None] ^ self._salts[None, :])
+        return (mixed.min(axis=0) >> np.uint64(32)).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(self.bands)]
+
+    def _remove(self, user_id: str) -> None:
+        old = self._signatures.pop(user_id, None)
+        if old is None:
+            return
+        for band, key in enumerate(self._band_keys(old)):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(user_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def upsert(self, user_id: str, interests: Optional[Iterable[str]]) -> bool:
+        """Index a user's interests. Returns False if their signature did not change."""
+        signature = self.signature(interests or ())
+        with self._lock:
+            old = self._signatures.get(user_id)
+            if old is None and signature is None:
+                return False
+            if old is not None and signature is not None and np.array_equal(old, signature):
+                return False
+            self._remove(user_id)
+            if signature is not None:
+                self._signatures[user_id] = signature
+                for band, key in enumerate(self._band_keys(signature)):
+                    self._buckets[band][key].add(user_id)
+            self.updates += 1
+            return True
+
+    def remove(self, user_id: str) -> None:
+        with self._lock:
+            self._remove(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._signatures.clear()
+            for buckets in self._buckets:
+                buckets.clear()
+            self.updates = 0
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._signatures
+
+    def query(
+        self,
+        interests: Iterable[str],
+        k: int = 10,
+        exclude: Iterable[str] = (),
+    ) -> List[Tuple[str, float]]:
+        """
+        Users whose interests are most like `interests`, as (user_id, estimated
+        Jaccard similarity), best first. Only users sharing an LSH bucket with
+        the query are considered.
+        """
+        signature = self.signature(interests)
+        if signature is None or k <= 0:
+            return []
+        return self._query(signature, k, set(exclude))
+
+    def similar(self, user_id: str, k: int = 10, exclude: Iterable[str] = ()) -> List[Tuple[str, float]]:
+        """Users with interests most like those of an indexed user."""
+        signature = self._signatures.get(user_id)
+        if signature is None or k <= 0:
+            return []
+        return self._query(signature, k, {user_id, *exclude})
+
+    def _query(self, signature: np.ndarray, k: int, exclude: Set[str]) -> List[Tuple[str, float]]:
+        with self._lock:
+            found: Set[str] = set()
+            for band, key in enumerate(self._band_keys(signature)):
+                found |= self._buckets[band].get(key, set())
+            found -= exclude
+            if not found:
+                return []
+            user_ids = list(found)
+            signatures = np.stack([self._signatures[u] for u in user_ids])
+        similarity = (signatures == signature).mean(axis=1)
+        k = min(k, len(user_ids))
+        top = np.argpartition(-similarity, k - 1)[:k]
+        top = top[np.argsort(-similarity[top], kind="stable")]
+        return [(user_ids[i], round(float(similarity[i]), 2)) for i in top]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "profiles": len(self._signatures),
+                "permutations": self.num_perm,
+                "bands": self.bands,
+                "buckets": sum(len(b) for b in self._buckets),
+                "updates": self.updates,
+            }
@@ -0,0 +1,251 @@
+# leases.py
+# Candidate leases and cached active-match counts for the matchmaking service.
+#
+# Two requesters ranking at the same moment can both pick the same best
+# candidate, and nothing stopped a user from being matched past their
+# max_active_conversations. Before a match is created, every user in it is
+# now reserved with a short lease: a user can only be held by one match
+# creation at a time, and only while their active matches plus the new one
+# stay within their limit. The lease is committed (the count goes up) once
+# the match record is written, or released if creation fails. Leases expire
+# on their own after `ttl_seconds`, so a request that dies never blocks a
+# user for long.
+#
+# There is no global lock: users are spread over `stripes` locks by hash, and
+# a reservation only takes the locks of the users it involves, in a fixed
+# order so two reservations can never deadlock. Unrelated requests proceed
+# in parallel.
+#
+# Active-match counts are loaded from match_records on first use and cached
+# for `count_ttl_seconds`, so matches created or completed by other instances
+# are picked up; changes made by this instance are applied immediately.
+# Expired leases and counts are pruned once per `count_ttl_seconds`.
+#
+# Ranking checks `is_available` for the candidates it is about to return,
+# rather than excluding every leased or full user from the pool up front.
+#
+# Leases only protect a single instance. Two instances can still match the
+# same candidate at the same moment, and each sees the other's matches only
+# when its cached counts expire, so a user can briefly go past their limit.
+# The database does not enforce max_active_conversations, and its
+# unique_active_match constraint only rejects a second row for the same pair.
+
+import os
+import time
+import uuid
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+MATCH_LEASE_TTL_SECONDS = float(os.environ.get("MATCH_LEASE_TTL_SECONDS", "10"))
+ACTIVE_MATCH_COUNT_TTL_SECONDS = float(os.environ.get("ACTIVE_MATCH_COUNT_TTL_SECONDS", "60"))
+MATCH_LEASE_STRIPES = 64
+# user_profiles.max_active_conversations defaults to 3.
+DEFAULT_MAX_ACTIVE_CONVERSATIONS = 3
+
+
+def max_active(profile: Dict[str, Any]) -> int:
+    """A profile's max_active_conversations, or the column default."""
+    limit = profile.get("max_active_conversations")
+    return DEFAULT_MAX_ACTIVE_CONVERSATIONS if limit is None else limit
+
+
+class Lease(NamedTuple):
+    token: str
+    limits: Dict[str, int]  # user_id -> max active matches
+
+    @property
+    def user_ids(self) -> Tuple[str, ...]:
+        return tuple(self.limits)
+
+
+class CandidateLeases:
+    """Per-user leases and active-match counts, guarded by striped locks."""
+
+    def __init__(
+        self,
+        ttl_seconds: float = MATCH_LEASE_TTL_SECONDS,
+        count_ttl_seconds: float = ACTIVE_MATCH_COUNT_TTL_SECONDS,
+        stripes: int = MATCH_LEASE_STRIPES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.count_ttl_seconds = count_ttl_seconds
+        self._clock = clock
+        self._locks = [Lock() for _ in range(stripes)]
+        # user_id -> (token, expires at)
+        self._leases: Dict[str, Tuple[str, float]] = {}
+        # user_id -> (active matches, expires at)
+        self._counts: Dict[str, Tuple[int, float]] = {}
+        # Users whose count has reached their limit -> when that count expires.
+        self._full: Dict[str, float] = {}
+        self._next_prune = clock() + count_ttl_seconds
+        self.reserved = 0
+        self.rejected = 0
+
+    def _stripes(self, user_ids: Iterable[str]) -> List[Lock]:
+        return [self._locks[i] for i in sorted({hash(u) % len(self._locks) for u in user_ids})]
+
+    def _held(self, user_id: str, now: float) -> bool:
+        lease = self._leases.get(user_id)
+        return lease is not None and lease[1] > now
+
+    def _count(self, user_id: str, now: float) -> Optional[int]:
+        entry = self._counts.get(user_id)
+        return entry[0] if entry is not None and entry[1] > now else None
+
+    def preload(self, user_ids: Iterable[str], load_many: Callable[[List[str]], Dict[str, int]]) -> None:
+        """Load the active-match counts of users that are not cached, in one call."""
+        now = self._clock()
+        if now >= self._next_prune:
+            self.prune()
+        missing = [u for u in dict.fromkeys(user_ids) if self._count(u, now) is None]
+        if not missing:
+            return
+        loaded = load_many(missing)
+        expires = now + self.count_ttl_seconds
+        locks = self._stripes(missing)
+        for lock in locks:
+            lock.acquire()
+        try:
+            for user_id in missing:
+                if self._count(user_id, now) is None:
+                    self._counts[user_id] = (loaded.get(user_id, 0), expires)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def active_count(self, user_id: str) -> Optional[int]:
+        """Cached number of active matches, or None if unknown."""
+        return self._count(user_id, self._clock())
+
+    def reserve(self, limits: Dict[str, int], load_many: Callable[[List[str]], Dict[str, int]]) -> Optional[Lease]:
+        """
+        Lease every user in `limits` (user_id -> max active matches), or none
+        of them: returns None if any is already leased or has no room for
+        another match.
+        """
+        self.preload(limits, load_many)
+        locks = self._stripes(limits)
+        for lock in locks:
+            lock.acquire()
+        try:
+            now = self._clock()
+            for user_id, limit in limits.items():
+                if self._held(user_id, now):
+                    self.rejected += 1
+                    return None
+                if (self._count(user_id, now) or 0) >= limit:
+                    self._full[user_id] = now + self.count_ttl_seconds
+                    self.rejected += 1
+                    return None
+            lease = Lease(str(uuid.uuid4()), dict(limits))
+            for user_id in lease.user_ids:
+                self._leases[user_id] = (lease.token, now + self.ttl_seconds)
+            self.reserved += 1
+            return lease
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def _end(self, lease: Lease, matched: bool) -> None:
+        locks = self._stripes(lease.user_ids)
+        for lock in locks:
+            lock.acquire()
+        try:
+            now = self._clock()
+            for user_id in lease.user_ids:
+                held = self._leases.get(user_id)
+                if held is None or held[0] != lease.token:
+                    continue
+                del self._leases[user_id]
+                count = self._count(user_id, now)
+                if matched and count is not None:
+                    expires = self._counts[user_id][1]
+                    self._counts[user_id] = (count + 1, expires)
+                    if count + 1 >= lease.limits[user_id]:
+                        self._full[user_id] = expires
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def commit(self, lease: Lease) -> None:
+        """The match was created: count it for every leased user and release them."""
+        self._end(lease, matched=True)
+
+    def release(self, lease: Lease) -> None:
+        """Match creation failed or was abandoned: release the users unchanged."""
+        self._end(lease, matched=False)
+
+    def match_completed(self, user_ids: Iterable[str]) -> None:
+        """A match between `user_ids` stopped being active."""
+        user_ids = list(user_ids)
+        locks = self._stripes(user_ids)
+        for lock in locks:
+            lock.acquire()
+        try:
+            now = self._clock()
+            for user_id in user_ids:
+                count = self._count(user_id, now)
+                if count is not None:
+                    self._counts[user_id] = (max(count - 1, 0), self._counts[user_id][1])
+                self._full.pop(user_id, None)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def is_available(self, user_id: str) -> bool:
+        """Whether a user can be matched right now: not leased, and not known to be at their limit."""
+        now = self._clock()
+        full = self._full.get(user_id)
+        return not self._held(user_id, now) and (full is None or full <= now)
+
+    def prune(self) -> None:
+        """
+        Drop expired leases and counts. Entries are found without locking, then
+        each is re-checked and removed under its stripe lock, so a lease or
+        count written in the meantime is never dropped.
+        """
+        now = self._clock()
+        self._next_prune = now + self.count_ttl_seconds
+        expired: Dict[int, List[str]] = {}
+        for table in (self._leases, self._counts, self._full):
+            for user_id, entry in list(table.items()):
+                if (entry if table is self._full else entry[1]) <= now:
+                    expired.setdefault(hash(user_id) % len(self._locks), []).append(user_id)
+        for stripe, user_ids in expired.items():
+            with self._locks[stripe]:
+                for user_id in user_ids:
+                    for table in (self._leases, self._counts):
+                        entry = table.get(user_id)
+                        if entry is not None and entry[1] <= now:
+                            del table[user_id]
+                    expires = self._full.get(user_id)
+                    if expires is not None and expires <= now:
+                        del self._full[user_id]
+
+    def clear(self) -> None:
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            self._leases.clear()
+            self._counts.clear()
+            self._full.clear()
+            self.reserved = 0
+            self.rejected = 0
+        finally:
+            for lock in reversed(self._locks):
+                lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        now = self._clock()
+        return {
+            "leases": sum(1 for _, expires in list(self._leases.values()) if expires > now),
+            "cached_counts": len(self._counts),
+            "full_users": sum(1 for expires in list(self._full.values()) if expires > now),
+            "reserved": self.reserved,
+            "rejected": self.rejected,
+        }
+
+
+# Shared lease table used by the API endpoints.
+match_leases = CandidateLeases()
@@ -1,25 +1,127 @@
 from datetime import datetime, timezone, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Union, Callable
+from contextlib import asynccontextmanager
 from enum import Enum
 import uuid
 from fastapi import FastAPI, HTTPException, status, Query, Header
 from pydantic import BaseModel
-from supabase import create_client, Client
+from threading import Lock
 from dotenv import load_dotenv
-from supabase import create_client
+import asyncio
+import base64
+import binascii
 import os
+import numpy as np
+
+from .batching import MatchBatcher, assign_pairs
+from .candidate_index import INDEX_PROFILE_COLUMNS, CandidateIndex, candidate_index, profile_languages
+from .exclusions import PartnerSet, exclusion_cache, is_excluded
+from .leases import Lease, match_leases, max_active
+from .recommendations import recommendations
+from .scoring import CandidatePool, ScoredCandidate, score_block
+from .sharding import ShardedIndex, sharded_index
+from .timezones import TIME_ZONES, minutes_to_hours
 
 # Load environment variables
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '..', '.env')
 load_dotenv(dotenv_path)
 
-# Retrieve Supabase credentials from environment variables.
-SUPABASE_URL = os.environ.get("SUPABASE_URL")
-SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
+# Supabase credentials (SUPABASE_URL / SUPABASE_KEY) are read when the client is first used.
+
+class LazySupabase:
+    """
+    PostgREST client for Supabase that is only built on first use.
+
+    Importing this module does not construct a client or import the full
+    `supabase` package (auth, realtime, storage, functions): only the PostgREST
+    client is needed, and it is imported when the first query is made.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._lock = Lock()
+
+    def _connect(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    url = os.getenv("SUPABASE_URL")
+                    key = os.getenv("SUPABASE_KEY")
+                    if not url or not key:
+                        raise RuntimeError("Missing SUPABASE_URL or SUPABASE_KEY")
+                    from postgrest import SyncPostgrestClient
+                    self._client = SyncPostgrestClient(
+                        f"{url.rstrip('/')}/rest/v1",
+                        headers={"apiKey": key, "Authorization": f"Bearer {key}"},
+                    )
+        return self._client
+
+    def table(self, table_name: str):
+        return self._connect().from_(table_name)
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None):
+        return self._connect().rpc(fn, params or {})
+
+
+supabase = LazySupabase()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # UTC offset windows of every zone, worked out before serving and then
+    # extended in the background, so requests never scan for DST transitions.
+    await asyncio.to_thread(TIME_ZONES.prepare)
+    zones_task = asyncio.create_task(TIME_ZONES.run())
+    # Batch mode runs matching rounds in the background.
+    round_task = asyncio.create_task(match_batcher.run()) if match_batcher.enabled else None
+    # Sharded mode starts one worker process per shard.
+    if sharded_index.enabled:
+        await asyncio.to_thread(sharded_index.start)
+    # Precomputed candidate lists are refreshed in the background.
+    refresh_task = (
+        asyncio.create_task(recommendations.run(refresh_recommendations)) if recommendations.enabled else None
+    )
+    yield
+    for task in (refresh_task, round_task, zones_task):
+        if task is None:
+            continue
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    if sharded_index.enabled:
+        await asyncio.to_thread(sharded_index.stop)
+
+app = FastAPI(title="PenPal Matchmaking API", lifespan=lifespan)
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# --- Column Sets ---
+# Only the columns each query needs, instead of select("*") which would also
+# pull wide or sensitive columns (password_hash, blocked_users, ...).
+# Columns used to compare a requester with candidates are INDEX_PROFILE_COLUMNS
+# (see candidate_index.py).
+# Columns shown to the requester for their new penpal.
+PENPAL_PROFILE_COLUMNS = (
+    "user_id,anonymous_handle,age_range,primary_language,secondary_languages,"
+    "time_zone,country_code,bio,interests"
+)
 
-app = FastAPI(title="PenPal Matchmaking API")
+# Every match_records column a client may ask for with `fields`.
+MATCH_RECORD_COLUMNS = (
+    "match_id", "user_1_id", "user_2_id", "match_type", "match_source",
+    "compatibility_score", "time_zone_difference", "status", "conversation_thread_id",
+    "first_message_sent_at", "last_message_sent_at", "total_messages_exchanged",
+    "completion_reason", "completed_at", "user_1_rating", "user_2_rating",
+    "created_at", "updated_at",
+)
+# Columns returned by GET /matches/{user_id} by default.
+MATCH_LIST_COLUMNS = (
+    "match_id", "user_1_id", "user_2_id", "match_type", "status",
+    "compatibility_score", "conversation_thread_id", "created_at",
+)
+# The keyset columns are always read so the next cursor can be built.
+MATCH_CURSOR_COLUMNS = ("created_at", "match_id")
+DEFAULT_MATCH_PAGE_SIZE = 20
+MAX_MATCH_PAGE_SIZE = 100
 
 # --- Simplified Models ---
 class MatchType(str, Enum):
@@ -46,64 +148,538 @@ class MatchResponse(BaseModel):
     penpal_profile: Dict[str, Any]
     match_type: str
     created_at: str
+    compatibility_score: Optional[float] = None
 
-# --- Core Endpoints ---
-@app.post("/matches/find", response_model=MatchResponse)
-async def find_penpal(request: MatchRequest):
-    """Find a matching penpal based on preferences"""
-    # Get user profile
-    user_res = supabase.table("user_profiles").select("*").eq("user_id", request.user_id).execute()
+class RankedCandidate(BaseModel):
+    user_id: str
+    compatibility_score: float
+    time_zone_difference: int
+
+class SimilarUser(BaseModel):
+    user_id: str
+    interest_similarity: float  # estimated Jaccard similarity of the interests
+
+# Ranked candidates tried in turn when the best ones are leased by a
+# concurrent request or have reached their max_active_conversations.
+MATCH_ATTEMPTS = 5
+
+# Number of candidates returned by POST /matches/candidates by default.
+DEFAULT_CANDIDATE_COUNT = 10
+MAX_CANDIDATE_COUNT = 50
+
+# Batch rounds: scored candidates kept per requester, candidates sampled per
+# block of requesters, and the size of one block's score matrix (cells).
+ROUND_EDGES_PER_USER = 10
+ROUND_MAX_CANDIDATES = int(os.environ.get("MATCH_ROUND_MAX_CANDIDATES", "2000"))
+ROUND_BLOCK_CELLS = 2_000_000
+# Maximum number of IDs sent in one `in_` filter, to keep request URLs short.
+IN_FILTER_CHUNK_SIZE = 200
+
+def in_chunks(ids: List[str], size: int = IN_FILTER_CHUNK_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def load_user(user_id: str) -> Dict[str, Any]:
+    """Read the requester's matching profile, or raise 404."""
+    user_res = supabase.table("user_profiles").select(INDEX_PROFILE_COLUMNS).eq("user_id", user_id).execute()
     if not user_res.data:
         raise HTTPException(404, "User not found")
-    user = user_res.data[0]
-
-    # Find potential matches
-    matches = supabase.table("user_profiles").select("*").neq("user_id", request.user_id).execute().data
-    if not matches:
-        raise HTTPException(404, "No penpals available")
-    
-    # Filter and select best match
-    if request.preferences.exclude_previous:
-        prev_matches = get_previous_matches(request.user_id)
-        matches = [m for m in matches if m['user_id'] not in prev_matches]
-    
-    # Simplified matching logic - select first available
-    if not matches:
+    return user_res.data[0]
+
+def match_filters(user: Dict[str, Any], preferences: MatchingPreferences) -> Tuple[List[str], Optional[PartnerSet], set]:
+    """
+    Languages to look in (the requested ones, or by default the languages the
+    user speaks), cached previous partners (if they are excluded) and the
+    users the requester blocked.
+    """
+    languages = preferences.languages or sorted(profile_languages(user))
+    partners = None
+    if preferences.exclude_previous:
+        partners = exclusion_cache.partners(
+            user['user_id'], lambda: get_previous_matches(user['user_id'])
+        )
+    return languages, partners, set(user.get('blocked_users') or ())
+
+def rank_for_user(
+    user: Dict[str, Any],
+    preferences: MatchingPreferences,
+    k: int,
+    index: Union[CandidateIndex, ShardedIndex] = candidate_index,
+    skip: Optional[Callable[[str], bool]] = None,
+) -> List[ScoredCandidate]:
+    """
+    Score the candidates in `index` for a requester and return the best `k`
+    for which `skip` is not true. Raises 404 if nobody is left to match with.
+    """
+    # Only the buckets for the requested languages and age ranges are read.
+    # Previous partners come from the exclusion cache, not a query per request.
+    languages, partners, blocked = match_filters(user, preferences)
+    ranked, available = index.rank(
+        user, languages, preferences.age_ranges, preferences.languages, partners, blocked, k, skip
+    )
+    if not ranked:
+        if available == 0:
+            raise HTTPException(404, "No penpals available")
         raise HTTPException(404, "No new penpals available based on preferences")
-    selected = matches[0]
-    
-    # Create match record
-    match_id = str(uuid.uuid4())
-    thread_id = str(uuid.uuid4())
-    supabase.table("match_records").insert({
-        "match_id": match_id,
-        "user_1_id": request.user_id,
-        "user_2_id": selected['user_id'],
-        "conversation_thread_id": thread_id,  
-        "match_type": request.preferences.match_type.value,
+    return ranked
+
+def active_index() -> Union[CandidateIndex, ShardedIndex]:
+    """The shard workers in sharded mode, otherwise the in-process index."""
+    return sharded_index if sharded_index.enabled else candidate_index
+
+def recommended(
+    user: Dict[str, Any],
+    preferences: MatchingPreferences,
+    k: int,
+    index: Union[CandidateIndex, ShardedIndex],
+    skip: Optional[Callable[[str], bool]] = None,
+) -> Optional[List[ScoredCandidate]]:
+    """
+    The best `k` precomputed candidates for a request with the default
+    preferences, or None if it has to be scored live.
+    """
+    if not recommendations.enabled or preferences.languages or preferences.age_ranges:
+        return None
+    # Lists are computed without previous partners; they are filtered here.
+    _, partners, blocked = match_filters(user, preferences)
+    return recommendations.get(
+        user, k, index.version,
+        lambda uid: uid in blocked or (skip is not None and skip(uid)) or (partners is not None and uid in partners),
+    )
+
+def rank_for_request(
+    request: MatchRequest,
+    k: int,
+    user: Optional[Dict[str, Any]] = None,
+    skip: Optional[Callable[[str], bool]] = None,
+) -> List[ScoredCandidate]:
+    """
+    Load the requester (unless given) and return their best candidates: from
+    their precomputed list if it is up to date, otherwise scored from the
+    shared index (or the shard workers in sharded mode).
+    """
+    user = user or load_user(request.user_id)
+    index = active_index()
+    index.ensure_fresh(supabase)
+    index.upsert(user)
+    ranked = recommended(user, request.preferences, k, index, skip)
+    if ranked is not None:
+        return ranked
+    return rank_for_user(user, request.preferences, k, index=index, skip=skip)
+
+# Preferences the precomputed lists are ranked for. Previous partners are
+# left in and filtered when a list is served.
+RECOMMENDATION_PREFERENCES = MatchingPreferences(match_type=MatchType.ONE_TIME, exclude_previous=False)
+
+def refresh_recommendations() -> int:
+    """
+    One run of the background job: recompute the precomputed lists of users
+    whose profile or match state changed, or who have none yet. Returns the
+    number of users computed.
+    """
+    index = active_index()
+    index.ensure_fresh(supabase)
+    due = recommendations.due(index.user_ids(), index.version)
+    for chunk in in_chunks(due):
+        for user in supabase.table("user_profiles").select(INDEX_PROFILE_COLUMNS).in_("user_id", chunk).execute().data or []:
+            try:
+                ranked = rank_for_user(user, RECOMMENDATION_PREFERENCES, recommendations.top_n, index=index)
+            except HTTPException:
+                ranked = []
+            recommendations.store(user, ranked)
+    return len(due)
+
+def requester_conflict(user: Dict[str, Any]) -> str:
+    """Why a requester could not be leased (409 detail)."""
+    if (match_leases.active_count(user['user_id']) or 0) >= max_active(user):
+        return "Maximum active conversations reached"
+    return "A match is already being created for this user"
+
+def new_match_record(
+    user_1_id: str, user_2_id: str, match_type: MatchType, score: float, time_zone_difference: int
+) -> Dict[str, Any]:
+    return {
+        "match_id": str(uuid.uuid4()),
+        "user_1_id": user_1_id,
+        "user_2_id": user_2_id,
+        "conversation_thread_id": str(uuid.uuid4()),
+        "match_type": match_type.value,
+        "compatibility_score": score,
+        "time_zone_difference": time_zone_difference,
         "status": "active"
-    }).execute()
-    
+    }
+
+def match_response(record: Dict[str, Any], penpal: Dict[str, Any]) -> MatchResponse:
     return MatchResponse(
-        match_id=match_id,
-        thread_id=thread_id,
-        penpal_profile=clean_profile(selected),
-        match_type=request.preferences.match_type.value,
-        created_at=datetime.now().isoformat()
+        match_id=record["match_id"],
+        thread_id=record["conversation_thread_id"],
+        penpal_profile=clean_profile(penpal),
+        match_type=record["match_type"],
+        created_at=datetime.now().isoformat(),
+        compatibility_score=record["compatibility_score"]
+    )
+
+# Larger than any distance between two UTC offsets.
+NO_ZONE_LIMIT = 24 * 60
+
+def max_zone_minutes(user: Dict[str, Any]) -> int:
+    """The user's preferred_time_zone_distance in minutes (no limit if unset)."""
+    max_hours = user.get('preferred_time_zone_distance')
+    return NO_ZONE_LIMIT if max_hours is None else max_hours * 60
+
+def round_edges(
+    uids: List[str],
+    users: Dict[str, Dict[str, Any]],
+    by_user: Dict[str, MatchRequest],
+    filters: Dict[str, Tuple],
+    index: CandidateIndex,
+    skip: Optional[Callable[[str], bool]] = None,
+) -> List[Tuple[float, str, str]]:
+    """
+    Top scored (score, requester, candidate) edges from each requester in
+    `uids` to the candidates in `index`, leaving out users for which `skip` is true.
+
+    Requesters with the same filters share one candidate pool and are scored
+    against it as a matrix, a block of rows at a time. Each block samples its
+    own candidates when the pool is larger than ROUND_MAX_CANDIDATES, which
+    bounds the work per requester. Candidates outside a requester's
+    preferred_time_zone_distance are left out.
+    """
+    groups: Dict[Tuple, List[str]] = {}
+    for uid in uids:
+        preferences = by_user[uid].preferences
+        key = (tuple(sorted(filters[uid][0])), tuple(sorted(preferences.age_ranges)), tuple(preferences.languages))
+        groups.setdefault(key, []).append(uid)
+
+    rng = np.random.default_rng()
+    edges = []
+    for (languages, age_ranges, preferred), group in groups.items():
+        pool = index.pool(languages, age_ranges)
+        if pool.size == 0:
+            continue
+        rows = CandidatePool.from_profiles([users[uid] for uid in group])
+        max_minutes = np.array([max_zone_minutes(users[uid]) for uid in group], dtype=np.int32)
+        width = min(pool.size, ROUND_MAX_CANDIDATES)
+        step = max(1, ROUND_BLOCK_CELLS // width)
+        k = min(ROUND_EDGES_PER_USER, width)
+        for start in range(0, len(group), step):
+            block = rows.where(slice(start, start + step))
+            columns = pool if width == pool.size else pool.where(rng.choice(pool.size, width, replace=False))
+            scores, minutes_apart = score_block(block, columns, preferred)
+            scores[minutes_apart > max_minutes[start:start + step, None]] = -1
+            if skip is not None:
+                scores[:, np.fromiter((skip(u) for u in columns.user_ids), dtype=bool, count=width)] = -1
+            position = {u: j for j, u in enumerate(columns.user_ids)}
+            for i, uid in enumerate(block.user_ids):
+                # Never pair a requester with themselves or anyone they exclude.
+                _, partners, blocked = filters[uid]
+                excluded = {uid} | blocked | index.blocked_by(uid)
+                members = partners.members() if partners is not None else None
+                if members:
+                    excluded |= members
+                for other in excluded:
+                    j = position.get(other)
+                    if j is not None:
+                        scores[i, j] = -1
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for i, uid in enumerate(block.user_ids):
+                for j in top[i]:
+                    if scores[i, j] >= 0:
+                        edges.append((round(float(scores[i, j]), 2), uid, columns.user_ids[j]))
+    return edges
+
+def solve_match_round(requests: List[MatchRequest]) -> Dict[str, Any]:
+    """
+    Match a round of waiting requesters (batch mode).
+
+    First the requesters are paired with each other: every requester is
+    scored against the other requesters of the round, a pair is kept only if
+    both sides accept each other, and `assign_pairs` picks the pairs with the
+    highest total score. Requesters left over are then scored against the
+    rest of the candidate index and assigned the same way, so no candidate
+    gets more than one new match per round. Every matched user is leased
+    first (see leases.py), so rounds and single requests never double-book a
+    user or go past max_active_conversations. Returns a MatchResponse or an
+    HTTPException per user_id.
+    """
+    by_user = {r.user_id: r for r in requests}
+    users: Dict[str, Dict[str, Any]] = {}
+    for chunk in in_chunks(list(by_user)):
+        for row in supabase.table("user_profiles").select(INDEX_PROFILE_COLUMNS).in_("user_id", chunk).execute().data or []:
+            users[row['user_id']] = row
+    outcomes: Dict[str, Any] = {
+        uid: HTTPException(404, "User not found") for uid in by_user if uid not in users
+    }
+    # Requesters that are at their limit, or already being matched, sit out.
+    leases: Dict[str, Lease] = {}
+    match_leases.preload(users, get_active_match_counts)
+    for uid in list(users):
+        lease = match_leases.reserve({uid: max_active(users[uid])}, get_active_match_counts)
+        if lease is None:
+            outcomes[uid] = HTTPException(409, requester_conflict(users.pop(uid)))
+        else:
+            leases[uid] = lease
+    if not users:
+        return outcomes
+
+    committed = set()
+    try:
+        _solve_round(users, by_user, outcomes, leases)
+        committed = {uid for uid, outcome in outcomes.items() if isinstance(outcome, MatchResponse)}
+        committed |= {uid for uid in leases if uid not in users}  # idle candidates that were matched
+    finally:
+        for uid, lease in leases.items():
+            (match_leases.commit if uid in committed else match_leases.release)(lease)
+    return outcomes
+
+def _solve_round(
+    users: Dict[str, Dict[str, Any]],
+    by_user: Dict[str, MatchRequest],
+    outcomes: Dict[str, Any],
+    leases: Dict[str, Lease],
+) -> None:
+    """Body of solve_match_round for requesters that hold a lease; fills `outcomes` and `leases`."""
+    candidate_index.ensure_fresh(supabase)
+    waiting = CandidateIndex()
+    for user in users.values():
+        candidate_index.upsert(user)
+        waiting.upsert(user)
+    exclusion_cache.preload(
+        [uid for uid in users if by_user[uid].preferences.exclude_previous], get_previous_matches_many
     )
+    filters = {uid: match_filters(user, by_user[uid].preferences) for uid, user in users.items()}
+
+    def accepts(uid: str, other: Dict[str, Any]) -> bool:
+        """Whether requester `uid` accepts `other` (catches Bloom filter partners too)."""
+        languages, partners, blocked = filters[uid]
+        preferences = by_user[uid].preferences
+        other_request = by_user.get(other['user_id'])
+        return (
+            (other_request is None or preferences.match_type == other_request.preferences.match_type)
+            and bool(profile_languages(other) & set(languages))
+            and (not preferences.age_ranges or other.get('age_range') in preferences.age_ranges)
+            and TIME_ZONES.minutes_apart(users[uid].get('time_zone'), other.get('time_zone')) <= max_zone_minutes(users[uid])
+            and not is_excluded(other, uid, partners, blocked)
+        )
+
+    # Stage 1: requesters with each other; both sides must accept.
+    edges = round_edges(list(users), users, by_user, filters, waiting)
+    pairs = assign_pairs(e for e in edges if accepts(e[1], users[e[2]]) and accepts(e[2], users[e[1]]))
+
+    # Stage 2: the rest with candidates who are not waiting.
+    paired = {uid for _, a, b in pairs for uid in (a, b)}
+    left = [uid for uid in users if uid not in paired]
+    if left:
+        # Leased and full users are skipped; the rest are leased once chosen.
+        edges = round_edges(
+            left, users, by_user, filters, candidate_index,
+            skip=lambda uid: uid in users or not match_leases.is_available(uid),
+        )
+        chosen = assign_pairs(
+            e for e in edges if (c := candidate_index.get(e[2])) is not None and accepts(e[1], c)
+        )
+        match_leases.preload([b for _, _, b in chosen], get_active_match_counts)
+        for edge in chosen:
+            candidate = candidate_index.get(edge[2]) or {}
+            lease = match_leases.reserve({edge[2]: max_active(candidate)}, get_active_match_counts)
+            if lease is not None:
+                leases[edge[2]] = lease
+                pairs.append(edge)
+
+    def hours_apart(a: str, b: str) -> int:
+        other = users.get(b) or candidate_index.get(b) or {}
+        return minutes_to_hours(TIME_ZONES.minutes_apart(users[a].get('time_zone'), other.get('time_zone')))
+
+    records = [
+        new_match_record(a, b, by_user[a].preferences.match_type, score, hours_apart(a, b))
+        for score, a, b in pairs
+    ]
+    matched = {a for _, a, _ in pairs} | paired
+    for uid in users:
+        if uid not in matched:
+            outcomes[uid] = HTTPException(404, "No new penpals available based on preferences")
+    if not records:
+        return
+
+    supabase.table("match_records").insert(records).execute()
+    penpal_ids = list({r[k] for r in records for k in ("user_1_id", "user_2_id")})
+    penpals = {
+        p['user_id']: p for chunk in in_chunks(penpal_ids) for p in
+        supabase.table("user_profiles").select(PENPAL_PROFILE_COLUMNS).in_("user_id", chunk).execute().data or []
+    }
+    for record in records:
+        a, b = record["user_1_id"], record["user_2_id"]
+        exclusion_cache.record_match(a, b)
+        recommendations.mark_changed((a, b))
+        for requester, penpal_id in ((a, b), (b, a)):
+            if requester in users:
+                penpal = penpals.get(penpal_id) or candidate_index.get(penpal_id) or {"user_id": penpal_id}
+                outcomes[requester] = match_response(record, penpal)
+
+match_batcher = MatchBatcher(solve_match_round)
+
+def create_match(request: MatchRequest) -> Dict[str, Any]:
+    """
+    Match a single requester with their best available candidate. Blocking
+    (database reads and, in sharded mode, the shard fan-out), so endpoints
+    run it in a worker thread.
+    """
+    # Lease the requester so concurrent requests can't push them past their limit.
+    user = load_user(request.user_id)
+    leases = [match_leases.reserve({user['user_id']: max_active(user)}, get_active_match_counts)]
+    if leases[0] is None:
+        raise HTTPException(409, requester_conflict(user))
+    created = False
+    try:
+        # Select the most compatible candidate that can be leased; users that
+        # are leased or at their limit are skipped while ranking.
+        ranked = rank_for_request(
+            request, k=MATCH_ATTEMPTS, user=user, skip=lambda uid: not match_leases.is_available(uid)
+        )
+        for best in ranked:
+            lease = match_leases.reserve({best.profile['user_id']: max_active(best.profile)}, get_active_match_counts)
+            if lease is not None:
+                leases.append(lease)
+                break
+        else:
+            raise HTTPException(404, "No new penpals available based on preferences")
+        selected = best.profile
+
+        # Load the display columns for the chosen penpal only.
+        penpal_res = supabase.table("user_profiles").select(PENPAL_PROFILE_COLUMNS).eq("user_id", selected['user_id']).execute()
+        penpal = penpal_res.data[0] if penpal_res.data else selected
+
+        # Create match record
+        record = new_match_record(
+            request.user_id, selected['user_id'], request.preferences.match_type, best.score, best.time_zone_difference
+        )
+        supabase.table("match_records").insert(record).execute()
+        created = True
+    finally:
+        for lease in leases:
+            (match_leases.commit if created else match_leases.release)(lease)
+    exclusion_cache.record_match(request.user_id, selected['user_id'])
+    recommendations.mark_changed((request.user_id, selected['user_id']))
+
+    return match_response(record, penpal)
+
+# --- Core Endpoints ---
+@app.post("/matches/find", response_model=MatchResponse)
+async def find_penpal(request: MatchRequest):
+    """Find a matching penpal based on preferences"""
+    # In batch mode the request waits for the next matching round.
+    if match_batcher.enabled:
+        return await match_batcher.submit(request.user_id, request)
+    # Ranking blocks, so it runs off the event loop and requests overlap.
+    return await asyncio.to_thread(create_match, request)
+
+@app.post("/matches/candidates", response_model=List[RankedCandidate])
+async def preview_candidates(
+    request: MatchRequest,
+    k: int = Query(DEFAULT_CANDIDATE_COUNT, ge=1, le=MAX_CANDIDATE_COUNT),
+):
+    """Top-k candidates for a match request with their scores, without creating a match"""
+    ranked = await asyncio.to_thread(rank_for_request, request, k)
+    return [
+        RankedCandidate(
+            user_id=c.profile['user_id'],
+            compatibility_score=c.score,
+            time_zone_difference=c.time_zone_difference,
+        )
+        for c in ranked
+    ]
+
+@app.get("/matches/similar/{user_id}", response_model=List[SimilarUser])
+async def similar_interests(
+    user_id: str,
+    k: int = Query(DEFAULT_CANDIDATE_COUNT, ge=1, le=MAX_CANDIDATE_COUNT),
+):
+    """Active users with the most similar interests (MinHash/LSH lookup), without creating a match"""
+    user = load_user(user_id)
+    candidate_index.ensure_fresh(supabase)
+    candidate_index.upsert(user)
+    # Blocked users (in either direction) are never suggested.
+    excluded = set(user.get('blocked_users') or ()) | candidate_index.blocked_by(user_id)
+    return [
+        SimilarUser(user_id=uid, interest_similarity=similarity)
+        for uid, similarity in candidate_index.interests.similar(user_id, k, exclude=excluded)
+    ]
+
+def encode_match_cursor(row: Dict[str, Any]) -> str:
+    """Opaque cursor for the position after `row` (newest first)."""
+    raw = f"{row['created_at']}|{row['match_id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_match_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    (created_at, match_id) of a cursor from encode_match_cursor, or raise 400.
+
+    The cursor is not signed, so both parts are checked to be a timestamp and a
+    UUID before they are put into the PostgREST filter.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, match_id = raw.split("|")
+        datetime.fromisoformat(created_at)
+        uuid.UUID(match_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(400, "Invalid cursor")
+    return created_at, match_id
+
+def match_columns(fields: Optional[str]) -> List[str]:
+    """Columns to select for a `fields` list (default MATCH_LIST_COLUMNS), or raise 400."""
+    if not fields:
+        columns = list(MATCH_LIST_COLUMNS)
+    else:
+        columns = [c.strip() for c in fields.split(",") if c.strip()]
+        unknown = [c for c in columns if c not in MATCH_RECORD_COLUMNS]
+        if unknown or not columns:
+            raise HTTPException(400, f"Unknown match fields: {', '.join(unknown)}" if unknown else "No match fields requested")
+    return columns + [c for c in MATCH_CURSOR_COLUMNS if c not in columns]
 
 @app.get("/matches/{user_id}")
-async def get_matches(user_id: str):
-    """Get user's matches"""
-    matches = supabase.table("match_records").select("*").or_(
+async def get_matches(
+    user_id: str,
+    limit: int = Query(DEFAULT_MATCH_PAGE_SIZE, ge=1, le=MAX_MATCH_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[MatchStatus] = None,
+    match_type: Optional[MatchType] = None,
+    fields: Optional[str] = Query(None, description="Comma separated match_records columns (default: a lean summary)"),
+):
+    """Get user's matches, newest first, a page at a time"""
+    columns = match_columns(fields)
+    query = supabase.table("match_records").select(",".join(columns)).or_(
         f"user_1_id.eq.{user_id},user_2_id.eq.{user_id}"
-    ).execute().data
-    return {"matches": matches}
+    )
+    if status is not None:
+        query = query.eq("status", status.value)
+    if match_type is not None:
+        query = query.eq("match_type", match_type.value)
+    if cursor:
+        # Keyset on (created_at, match_id): rows strictly after the cursor in
+        # newest-first order, so pages cost the same however deep they are.
+        created_at, match_id = decode_match_cursor(cursor)
+        query = query.or_(
+            f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",match_id.lt.{match_id})'
+        )
+    # One extra row tells whether there is another page.
+    rows = query.order("created_at", desc=True).order("match_id", desc=True).limit(limit + 1).execute().data or []
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "matches": rows,
+        "next_cursor": encode_match_cursor(rows[-1]) if has_more else None,
+        "has_more": has_more,
+    }
 
 @app.put("/matches/{match_id}/complete")
 async def complete_match(match_id: str):
     """Mark match as completed"""
-    supabase.table("match_records").update({"status": "completed"}).eq("match_id", match_id).execute()
+    # Only an active match frees up a slot for both users.
+    res = supabase.table("match_records").update({"status": "completed"}).eq("match_id", match_id).eq("status", "active").execute()
+    for record in res.data or []:
+        match_leases.match_completed((record["user_1_id"], record["user_2_id"]))
+        recommendations.mark_changed((record["user_1_id"], record["user_2_id"]))
     return {"message": "Match completed"}
 
 # --- Helper Functions ---
@@ -117,10 +693,56 @@ def get_previous_matches(user_id: str) -> List[str]:
         for m in res.data
     ]
 
+def get_previous_matches_many(user_ids: List[str]) -> Dict[str, List[str]]:
+    """Previous match partners of several users, a chunk of users per query"""
+    partners: Dict[str, List[str]] = {uid: [] for uid in user_ids}
+    for chunk in in_chunks(user_ids, IN_FILTER_CHUNK_SIZE // 2):
+        ids = ",".join(chunk)
+        res = supabase.table("match_records").select("user_1_id,user_2_id").or_(
+            f"user_1_id.in.({ids}),user_2_id.in.({ids})"
+        ).execute()
+        for m in res.data or []:
+            if m['user_1_id'] in partners:
+                partners[m['user_1_id']].append(m['user_2_id'])
+            if m['user_2_id'] in partners:
+                partners[m['user_2_id']].append(m['user_1_id'])
+    return partners
+
+def get_active_match_counts(user_ids: List[str]) -> Dict[str, int]:
+    """Number of active matches of several users, a chunk of users per query"""
+    counts: Dict[str, int] = {uid: 0 for uid in user_ids}
+    for chunk in in_chunks(user_ids, IN_FILTER_CHUNK_SIZE // 2):
+        ids = ",".join(chunk)
+        res = supabase.table("match_records").select("user_1_id,user_2_id").eq("status", "active").or_(
+            f"user_1_id.in.({ids}),user_2_id.in.({ids})"
+        ).execute()
+        for m in res.data or []:
+            for uid in (m['user_1_id'], m['user_2_id']):
+                if uid in counts:
+                    counts[uid] += 1
+    return counts
+
 def clean_profile(profile: Dict) -> Dict:
     """Remove sensitive profile fields"""
     return {k: v for k, v in profile.items() if k not in ['email', 'password']}
 
+@app.get("/index/stats")
+def index_stats():
+    """Size and refresh counters of the in-memory candidate index and the caches around it."""
+    return {
+        **candidate_index.stats(),
+        "exclusions": exclusion_cache.stats(),
+        "time_zones": TIME_ZONES.stats(),
+        "leases": match_leases.stats(),
+        "recommendations": recommendations.stats(),
+        **({"sharded": sharded_index.stats()} if sharded_index.started else {}),
+    }
+
+@app.get("/batch/stats")
+def batch_stats():
+    """Batch mode settings and per-round size and solve time metrics."""
+    return match_batcher.stats()
+
 # Health check
 @app.get("/health")
 def health_check():
@@ -0,0 +1,209 @@
+# recommendations.py
+# Precomputed candidate lists for the matchmaking service.
+#
+# Most profiles do not change between two requests, so scoring a requester
+# against their whole pool on every POST /matches/find repeats the same work.
+# With MATCH_RECOMMENDATION_REFRESH_SECONDS set, a background job keeps the
+# ranked top-N candidates of every active user (for the default preferences:
+# the user's own languages, any age range), and requests with those
+# preferences are served from that list.
+#
+# Each list records the requester's profile version (a fingerprint of the
+# columns matching reads, see candidate_index.profile_version) and the
+# version of every candidate in it, so heartbeats and other bookkeeping
+# updates do not make lists stale. A list is only used while the requester's
+# profile is unchanged, and candidates whose profile changed since (or who
+# left the index) are skipped, so a stale score is never served. If fewer
+# than the requested number of candidates are left, the request is scored
+# live instead.
+#
+# Each run of the job only recomputes users whose list is missing, whose
+# profile changed, whose match state changed (`mark_changed`), or whose list
+# is older than `max_age_seconds` (so new users eventually show up in other
+# users' lists), at most `max_users_per_run` of them.
+#
+# Previous partners and users that are leased or full are not excluded when
+# a list is computed; they are filtered out when it is served, because they
+# change with every match.
+
+import asyncio
+import os
+import time
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from .candidate_index import profile_version
+from .scoring import ScoredCandidate
+
+# 0 disables precomputed lists (every request is scored live).
+MATCH_RECOMMENDATION_REFRESH_SECONDS = float(os.environ.get("MATCH_RECOMMENDATION_REFRESH_SECONDS", "0"))
+MATCH_RECOMMENDATION_TOP_N = int(os.environ.get("MATCH_RECOMMENDATION_TOP_N", "20"))
+MATCH_RECOMMENDATION_MAX_AGE_SECONDS = float(os.environ.get("MATCH_RECOMMENDATION_MAX_AGE_SECONDS", "3600"))
+MATCH_RECOMMENDATION_MAX_USERS_PER_RUN = int(os.environ.get("MATCH_RECOMMENDATION_MAX_USERS_PER_RUN", "10000"))
+
+
+class Recommendation(NamedTuple):
+    user_id: str
+    score: float
+    time_zone_difference: int
+    version: str  # the candidate's profile_version when scored
+    max_active_conversations: Optional[int]
+
+
+class Recommendations(NamedTuple):
+    version: str  # the requester's profile_version when computed
+    computed_at: float
+    candidates: Tuple[Recommendation, ...]
+
+
+class RecommendationCache:
+    """Ranked top-N candidates per user, refreshed incrementally by a background job."""
+
+    def __init__(
+        self,
+        refresh_interval: float = MATCH_RECOMMENDATION_REFRESH_SECONDS,
+        top_n: int = MATCH_RECOMMENDATION_TOP_N,
+        max_age_seconds: float = MATCH_RECOMMENDATION_MAX_AGE_SECONDS,
+        max_users_per_run: int = MATCH_RECOMMENDATION_MAX_USERS_PER_RUN,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.refresh_interval = refresh_interval
+        self.top_n = top_n
+        self.max_age_seconds = max_age_seconds
+        self.max_users_per_run = max_users_per_run
+        self._clock = clock
+        self._entries: Dict[str, Recommendations] = {}
+        self._changed: Set[str] = set()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.runs = 0
+        self.computed = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.refresh_interval > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def mark_changed(self, user_ids: Iterable[str]) -> None:
+        """Recompute these users' lists on the next run (e.g. their match state changed)."""
+        with self._lock:
+            self._changed.update(user_ids)
+
+    def store(self, user: Dict[str, Any], ranked: List[ScoredCandidate]) -> None:
+        entry = Recommendations(
+            profile_version(user),
+            self._clock(),
+            tuple(
+                Recommendation(
+                    c.profile["user_id"], c.score, c.time_zone_difference,
+                    profile_version(c.profile), c.profile.get("max_active_conversations"),
+                )
+                for c in ranked[:self.top_n]
+            ),
+        )
+        with self._lock:
+            self._entries[user["user_id"]] = entry
+            self._changed.discard(user["user_id"])
+
+    def get(
+        self,
+        user: Dict[str, Any],
+        k: int,
+        version: Callable[[str], Optional[str]],
+        excluded: Callable[[str], bool],
+    ) -> Optional[List[ScoredCandidate]]:
+        """
+        The best `k` precomputed candidates for `user` that are unchanged
+        (`version` gives their current profile version) and not `excluded`,
+        or None if there is no up-to-date list with `k` of them.
+        """
+        entry = self._entries.get(user["user_id"])
+        ranked: List[ScoredCandidate] = []
+        if entry is not None and entry.version == profile_version(user):
+            for c in entry.candidates:
+                if version(c.user_id) != c.version or excluded(c.user_id):
+                    continue
+                profile = {"user_id": c.user_id, "max_active_conversations": c.max_active_conversations}
+                ranked.append(ScoredCandidate(profile, c.score, c.time_zone_difference))
+                if len(ranked) == k:
+                    self.hits += 1
+                    return ranked
+        self.misses += 1
+        return None
+
+    def due(self, user_ids: Iterable[str], version: Callable[[str], Optional[str]]) -> List[str]:
+        """
+        Users whose list should be recomputed, most urgent first: changed
+        profile or match state, then no list yet, then lists past their
+        maximum age. Lists of users who are no longer indexed are dropped.
+        """
+        now = self._clock()
+        changed: List[str] = []
+        missing: List[str] = []
+        expired: List[Tuple[float, str]] = []
+        with self._lock:
+            marked = set(self._changed)
+        indexed = set()
+        for user_id in user_ids:
+            indexed.add(user_id)
+            entry = self._entries.get(user_id)
+            if entry is None:
+                missing.append(user_id)
+            elif user_id in marked or entry.version != version(user_id):
+                changed.append(user_id)
+            elif now - entry.computed_at >= self.max_age_seconds:
+                expired.append((entry.computed_at, user_id))
+        with self._lock:
+            for user_id in [u for u in self._entries if u not in indexed]:
+                del self._entries[user_id]
+            self._changed &= indexed
+        expired.sort()
+        return (changed + missing + [u for _, u in expired])[:self.max_users_per_run]
+
+    def refresh(self, refresh_once: Callable[[], int]) -> int:
+        """Run one refresh (`refresh_once` computes and stores the due lists). Returns users computed."""
+        started = time.perf_counter()
+        computed = refresh_once()
+        self.runs += 1
+        self.computed += computed
+        self.last_run = {"users": computed, "seconds": round(time.perf_counter() - started, 3)}
+        return computed
+
+    async def run(self, refresh_once: Callable[[], int]) -> None:
+        """Background loop: refresh the due lists every `refresh_interval` seconds."""
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh, refresh_once)
+            except Exception as e:
+                print(f"ERROR: Recommendation refresh failed. Details: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._changed.clear()
+            self.hits = 0
+            self.misses = 0
+            self.runs = 0
+            self.computed = 0
+            self.last_run = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "users": len(self._entries),
+            "pending_changes": len(self._changed),
+            "hits": self.hits,
+            "misses": self.misses,
+            "runs": self.runs,
+            "computed": self.computed,
+            "last_run": self.last_run,
+        }
+
+
+# Shared precomputed lists used by the API endpoints.
+recommendations = RecommendationCache()
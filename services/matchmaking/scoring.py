@@ -0,0 +1,224 @@
+# scoring.py
+# Vectorized compatibility scoring for the matchmaking service.
+#
+# Each profile is encoded once (when it enters the candidate index) into a
+# language bitset, an interest bitset (each a few uint64 words), an age range
+# code and a time zone code. The candidate index stores these as NumPy columns, so a
+# request gathers its candidates' features with one fancy-index per column,
+# scores them against the requester in one pass, and only sorts the top-k.
+#
+# Score (0.00 - 1.00, stored in match_records.compatibility_score):
+#   languages  35%  shared languages with the requester (2 shared, or all of
+#                   the requester's languages if they speak only one, = full marks)
+#   interests  35%  Jaccard similarity of the interest sets
+#   age range  15%  1 for the same range, minus 1/3 per range apart
+#   time zone  15%  1 for the same UTC offset, 0 at 12 or more hours apart
+#                   (offsets come from the precomputed table in timezones.py)
+
+import hashlib
+import os
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .timezones import TIME_ZONES, minutes_to_hours
+
+LANGUAGE_WEIGHT = 0.35
+INTEREST_WEIGHT = 0.35
+AGE_WEIGHT = 0.15
+TIME_ZONE_WEIGHT = 0.15
+
+# Codes for the age_range_enum values, in order, so that distance is meaningful.
+AGE_RANGE_CODES = {"18-25": 0, "26-35": 1, "36-45": 2, "46+": 3}
+UNKNOWN_AGE = -1
+MAX_AGE_DISTANCE = 3
+# Offsets further apart than this score zero on the time zone component.
+MAX_OFFSET_HOURS = 12
+MAX_OFFSET_MINUTES = MAX_OFFSET_HOURS * 60
+
+# Width of the bitsets in uint64 words: 256 language bits and 1024 interest bits.
+MATCH_LANGUAGE_WORDS = int(os.environ.get("MATCH_LANGUAGE_WORDS", "4"))
+MATCH_INTEREST_WORDS = int(os.environ.get("MATCH_INTEREST_WORDS", "16"))
+
+# (language words, interest words, age code, time zone code)
+Features = Tuple[np.ndarray, np.ndarray, int, int]
+
+
+class BitVocabulary:
+    """
+    Assigns each distinct value (language code, interest) a bit in a mask of
+    `words` uint64 words. The first `words * 64` distinct values each get a
+    bit of their own, in order of first appearance, so they never collide.
+    Values seen after that are not remembered; they get a bit from a stable
+    hash and may share it with another value, which over-counts the overlap
+    of the two. Size `words` so the live vocabulary fits.
+    """
+
+    def __init__(self, words: int = 1):
+        self.words = words
+        self.bits = words * 64
+        self._bits: Dict[str, int] = {}
+        self._lock = Lock()
+
+    def bit(self, value: str) -> int:
+        value = value.strip().lower()
+        bit = self._bits.get(value)
+        if bit is None:
+            with self._lock:
+                bit = self._bits.get(value)
+                if bit is None and len(self._bits) < self.bits:
+                    bit = self._bits[value] = len(self._bits)
+            if bit is None:
+                digest = hashlib.blake2b(value.encode(), digest_size=8).digest()
+                bit = int.from_bytes(digest, "little") % self.bits
+        return bit
+
+    def mask(self, values: Iterable[str]) -> np.ndarray:
+        mask = np.zeros(self.words, dtype=np.uint64)
+        for value in values:
+            if value:
+                bit = self.bit(value)
+                mask[bit // 64] |= np.uint64(1 << (bit % 64))
+        return mask
+
+    def __len__(self) -> int:
+        return len(self._bits)
+
+
+LANGUAGE_BITS = BitVocabulary(MATCH_LANGUAGE_WORDS)
+INTEREST_BITS = BitVocabulary(MATCH_INTEREST_WORDS)
+
+
+def encode_profile(profile: Dict[str, Any]) -> Features:
+    """Encode the matching attributes of a profile as bitsets and integer codes."""
+    languages = [profile.get("primary_language"), *(profile.get("secondary_languages") or [])]
+    return (
+        LANGUAGE_BITS.mask(languages),
+        INTEREST_BITS.mask(profile.get("interests") or []),
+        AGE_RANGE_CODES.get(profile.get("age_range"), UNKNOWN_AGE),
+        TIME_ZONES.code(profile.get("time_zone")),
+    )
+
+
+class CandidatePool(NamedTuple):
+    """Encoded candidates as parallel arrays (see CandidateIndex.pool)."""
+    user_ids: np.ndarray   # object
+    langs: np.ndarray      # uint64 bitsets, one row of LANGUAGE_BITS.words per candidate
+    interests: np.ndarray  # uint64 bitsets, one row of INTEREST_BITS.words per candidate
+    ages: np.ndarray       # int8 age range codes
+    zones: np.ndarray      # int16 time zone codes
+
+    @property
+    def size(self) -> int:
+        return len(self.user_ids)
+
+    def where(self, keep: np.ndarray) -> "CandidatePool":
+        """The candidates for which `keep` (boolean array) is true."""
+        return CandidatePool(*(column[keep] for column in self))
+
+    @classmethod
+    def from_profiles(cls, profiles: Sequence[Dict[str, Any]]) -> "CandidatePool":
+        features = [encode_profile(p) for p in profiles]
+        return cls(
+            np.array([p["user_id"] for p in profiles], dtype=object),
+            np.array([f[0] for f in features], dtype=np.uint64).reshape(len(features), LANGUAGE_BITS.words),
+            np.array([f[1] for f in features], dtype=np.uint64).reshape(len(features), INTEREST_BITS.words),
+            np.array([f[2] for f in features], dtype=np.int8),
+            np.array([f[3] for f in features], dtype=np.int16),
+        )
+
+
+def within_hours(zone: Optional[str], pool: CandidatePool, max_hours: int, at: Optional[datetime] = None) -> np.ndarray:
+    """Boolean mask of the candidates at most `max_hours` from `zone`."""
+    offsets = TIME_ZONES.offsets(at)
+    return np.abs(offsets[pool.zones] - offsets[TIME_ZONES.code(zone)]) <= max_hours * 60
+
+
+class ScoredCandidate(NamedTuple):
+    profile: Dict[str, Any]
+    score: float
+    time_zone_difference: int  # whole hours apart
+
+
+def _popcount(bitsets: np.ndarray) -> np.ndarray:
+    """Set bits per bitset (summed over the last, word, axis) as float32."""
+    return np.bitwise_count(bitsets).sum(axis=-1, dtype=np.float32)
+
+
+def score_block(
+    rows: CandidatePool,
+    pool: CandidatePool,
+    preferred_languages: Iterable[str] = (),
+    at: Optional[datetime] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score every requester in `rows` against every candidate in `pool` with
+    broadcasting. Returns (scores, minutes apart), both of shape (rows, pool).
+    `preferred_languages` count as languages every requester shares.
+    """
+    row_langs = (rows.langs | LANGUAGE_BITS.mask(preferred_languages))[:, None]
+    row_interests = rows.interests[:, None]
+
+    shared_langs = _popcount(pool.langs & row_langs)
+    full_marks = np.clip(_popcount(row_langs), 1, 2)
+    language_score = np.minimum(shared_langs, full_marks) / full_marks
+
+    shared = _popcount(pool.interests & row_interests)
+    union = _popcount(pool.interests | row_interests)
+    interest_score = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+
+    row_ages = rows.ages.astype(np.float32)[:, None]
+    age_score = 1 - np.abs(pool.ages.astype(np.float32) - row_ages) / MAX_AGE_DISTANCE
+    unknown_age = (rows.ages == UNKNOWN_AGE)[:, None] | (pool.ages == UNKNOWN_AGE)
+    age_score = np.where(unknown_age, np.float32(0.5), age_score)
+
+    offsets = TIME_ZONES.offsets(at)
+    minutes_apart = np.abs(offsets[pool.zones] - offsets[rows.zones][:, None])
+    tz_score = 1 - np.minimum(minutes_apart, MAX_OFFSET_MINUTES).astype(np.float32) / MAX_OFFSET_MINUTES
+
+    scores = (
+        LANGUAGE_WEIGHT * language_score
+        + INTEREST_WEIGHT * interest_score
+        + AGE_WEIGHT * age_score
+        + TIME_ZONE_WEIGHT * tz_score
+    )
+    return scores, minutes_apart
+
+
+def score_pool(
+    user: Dict[str, Any],
+    pool: CandidatePool,
+    preferred_languages: Iterable[str] = (),
+    at: Optional[datetime] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score every candidate of `pool` against `user` in one vectorized pass.
+    Returns (scores, minutes apart).
+    """
+    scores, minutes_apart = score_block(CandidatePool.from_profiles([user]), pool, preferred_languages, at)
+    return scores[0], minutes_apart[0]
+
+
+def rank_pool(
+    user: Dict[str, Any],
+    pool: CandidatePool,
+    preferred_languages: Iterable[str] = (),
+    k: int = 10,
+    at: Optional[datetime] = None,
+) -> List[Tuple[str, float, int]]:
+    """
+    The best `k` candidates of `pool` for `user`, highest score first, as
+    (user_id, score rounded to 2 decimals, whole hours apart).
+    """
+    if pool.size == 0 or k <= 0:
+        return []
+    scores, minutes_apart = score_pool(user, pool, preferred_languages, at)
+    k = min(k, pool.size)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return [
+        (pool.user_ids[i], round(float(scores[i]), 2), minutes_to_hours(minutes_apart[i]))
+        for i in top
+    ]
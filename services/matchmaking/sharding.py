@@ -0,0 +1,312 @@
+# sharding.py
+# Optional multi-process candidate pool for the matchmaking service.
+#
+# With MATCH_SHARDS set, the candidate pool is split by language over that
+# many worker processes, each holding its own CandidateIndex. A profile is
+# placed in the shard of its primary language and also in the shards of its
+# secondary languages, so every shard can answer "who speaks X" for the
+# languages it owns. A request is only sent to the shards of the languages
+# it asks for; they score their candidates in parallel (each in its own
+# process, so on its own core) and the API process merges their top-k lists.
+#
+# The API process keeps reading user_profiles itself (initial load, the
+# incremental refresh by updated_at, and the requester's own profile) and
+# forwards each row to the shards it belongs in. It only remembers which
+# shards hold each user, not the profiles, so index memory is spread over
+# the workers.
+
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from .candidate_index import (
+    CANDIDATE_INDEX_PAGE_SIZE,
+    CANDIDATE_INDEX_REFRESH_SECONDS,
+    INDEX_PROFILE_COLUMNS,
+    CandidateIndex,
+    changed_profiles,
+    is_current,
+    profile_languages,
+    profile_version,
+    rank_skipping,
+)
+from .scoring import ScoredCandidate
+from .timezones import TIME_ZONES
+
+# 0 disables sharding (the candidate pool lives in the API process).
+MATCH_SHARDS = int(os.environ.get("MATCH_SHARDS", "0"))
+
+
+def shard_for(language: str, shards: int) -> int:
+    """Stable shard number of a language (the same in every process and run)."""
+    digest = hashlib.blake2b(language.strip().lower().encode(), digest_size=4).digest()
+    return int.from_bytes(digest, "little") % shards
+
+
+def _shard_main(conn) -> None:
+    """Worker loop: apply profile rows and answer rank requests for one shard."""
+    index = CandidateIndex(refresh_interval=float("inf"))
+    # Rank requests only look up the prepared time zone offsets.
+    TIME_ZONES.prepare()
+    Thread(target=TIME_ZONES.run_in_thread, daemon=True).start()
+    while True:
+        op, payload = conn.recv()
+        try:
+            if op == "stop":
+                conn.send(("ok", None))
+                return
+            if op == "reset":
+                index.clear()
+                result = None
+            elif op == "apply":
+                for row in payload:
+                    index.upsert(row)
+                result = None
+            elif op == "remove":
+                for user_id in payload:
+                    index.remove(user_id)
+                result = None
+            elif op == "rank":
+                result = index.rank(*payload)
+            elif op == "stats":
+                result = index.stats()
+            else:
+                raise ValueError(f"Unknown shard operation: {op}")
+            conn.send(("ok", result))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+
+
+class _Shard:
+    """One worker process and the pipe to it (one request in flight at a time)."""
+
+    def __init__(self, context):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_shard_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self._lock = Lock()
+
+    def call(self, op: str, payload: Any = None) -> Any:
+        with self._lock:
+            self.conn.send((op, payload))
+            status, result = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Shard {op} failed: {result}")
+        return result
+
+    def stop(self) -> None:
+        try:
+            self.call("stop")
+        except (EOFError, OSError, RuntimeError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class ShardedIndex:
+    """
+    The candidate pool split by language over worker processes.
+
+    Offers the parts of the CandidateIndex interface the request path uses
+    (`ensure_fresh`, `upsert`, `rank`, `stats`), so it can stand in for it.
+    """
+
+    def __init__(
+        self,
+        shards: int = MATCH_SHARDS,
+        refresh_interval: float = CANDIDATE_INDEX_REFRESH_SECONDS,
+        page_size: int = CANDIDATE_INDEX_PAGE_SIZE,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.shards = shards
+        self.refresh_interval = refresh_interval
+        self.page_size = page_size
+        self._clock = clock
+        self._workers: List[_Shard] = []
+        self._placement: Dict[str, FrozenSet[int]] = {}
+        self._versions: Dict[str, str] = {}
+        self._lock = Lock()
+        # Held while loading or refreshing: a load resets the shards, so two must not interleave.
+        self._refresh_lock = Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._watermark: Optional[str] = None
+        self._loaded = False
+        self._last_refresh: Optional[float] = None
+        self.full_loads = 0
+        self.refreshes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.shards > 0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers)
+
+    def start(self) -> None:
+        """Start the worker processes (spawned, so they share no state with this one)."""
+        if self._workers:
+            return
+        context = multiprocessing.get_context("spawn")
+        self._workers = [_Shard(context) for _ in range(self.shards)]
+        self._pool = ThreadPoolExecutor(max_workers=self.shards, thread_name_prefix="match-shard")
+
+    def stop(self) -> None:
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        self._placement.clear()
+        self._versions.clear()
+        self._loaded = False
+
+    # --- Placement ---
+    def shards_for(self, languages: Iterable[str]) -> FrozenSet[int]:
+        return frozenset(shard_for(language, self.shards) for language in languages if language)
+
+    def _route(self, rows: Iterable[Dict[str, Any]]) -> Dict[int, Tuple[List[Dict[str, Any]], List[str]]]:
+        """Per shard: rows to apply there and users to remove from there."""
+        batches: Dict[int, Tuple[List[Dict[str, Any]], List[str]]] = {}
+        with self._lock:
+            for row in rows:
+                user_id = row["user_id"]
+                updated_at = row.get("updated_at")
+                if updated_at and (self._watermark is None or updated_at > self._watermark):
+                    self._watermark = updated_at
+                old = self._placement.get(user_id, frozenset())
+                if row.get("account_status", "active") == "active":
+                    new = self.shards_for(profile_languages(row)) or frozenset({0})
+                    self._placement[user_id] = new
+                    self._versions[user_id] = profile_version(row)
+                else:
+                    new = frozenset()
+                    self._placement.pop(user_id, None)
+                    self._versions.pop(user_id, None)
+                for shard in new:
+                    batches.setdefault(shard, ([], []))[0].append(row)
+                for shard in old - new:
+                    batches.setdefault(shard, ([], []))[1].append(user_id)
+        return batches
+
+    def _send(self, batches: Dict[int, Tuple[List[Dict[str, Any]], List[str]]]) -> None:
+        for shard, (rows, removed) in batches.items():
+            if removed:
+                self._workers[shard].call("remove", removed)
+            if rows:
+                self._workers[shard].call("apply", rows)
+
+    def upsert(self, profile: Dict[str, Any]) -> None:
+        self._send(self._route([profile]))
+
+    # --- Loading ---
+    def load(self, db: Any) -> int:
+        """Reset every shard and stream all active profiles to them, a page at a time."""
+        self.start()
+        for worker in self._workers:
+            worker.call("reset")
+        with self._lock:
+            self._placement.clear()
+            self._versions.clear()
+            self._watermark = None
+        loaded, last_id = 0, None
+        while True:
+            query = (
+                db.table("user_profiles").select(INDEX_PROFILE_COLUMNS)
+                .eq("account_status", "active").order("user_id").limit(self.page_size)
+            )
+            if last_id is not None:
+                query = query.gt("user_id", last_id)
+            page = query.execute().data or []
+            self._send(self._route(page))
+            loaded += len(page)
+            if len(page) < self.page_size:
+                break
+            last_id = page[-1]["user_id"]
+        self._loaded = True
+        self._last_refresh = self._clock()
+        self.full_loads += 1
+        return loaded
+
+    def refresh(self, db: Any) -> int:
+        """Forward profiles changed since the last load or refresh. Returns profiles forwarded."""
+        forwarded = 0
+        for page in changed_profiles(db, self._watermark, self.page_size):
+            rows = [row for row in page if not is_current(row, self.version(row["user_id"]))]
+            self._send(self._route(rows))
+            forwarded += len(rows)
+        self._last_refresh = self._clock()
+        self.refreshes += 1
+        return forwarded
+
+    def ensure_fresh(self, db: Any) -> None:
+        if self._loaded and self._clock() - self._last_refresh < self.refresh_interval:
+            return
+        with self._refresh_lock:
+            if not self._loaded:
+                self.load(db)
+            elif self._clock() - self._last_refresh >= self.refresh_interval:
+                self.refresh(db)
+
+    # --- Lookups ---
+    def version(self, user_id: str) -> Optional[str]:
+        return self._versions.get(user_id)
+
+    def user_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._placement)
+
+    def rank(
+        self,
+        user: Dict[str, Any],
+        languages: Iterable[str],
+        age_ranges: Iterable[str],
+        preferred_languages: Iterable[str],
+        partners: Optional[Any],
+        blocked: Iterable[str],
+        k: int,
+        skip: Optional[Callable[[str], bool]] = None,
+    ) -> Tuple[List[ScoredCandidate], int]:
+        """
+        Same as CandidateIndex.rank, asking only the shards of `languages` and
+        merging their top-k. `skip` is applied here, to the merged candidates.
+        """
+        languages = list(languages)
+        shards = sorted(self.shards_for(languages))
+        request = (user, languages, list(age_ranges), list(preferred_languages), partners, list(blocked))
+        available = 0
+
+        def top(n: int) -> List[ScoredCandidate]:
+            nonlocal available
+            futures = [self._pool.submit(self._workers[shard].call, "rank", (*request, n)) for shard in shards]
+            best: Dict[str, ScoredCandidate] = {}
+            available = 0
+            for future in futures:
+                ranked, count = future.result()
+                available += count
+                for candidate in ranked:
+                    # A multilingual candidate can come back from several shards.
+                    best.setdefault(candidate.profile["user_id"], candidate)
+            return sorted(best.values(), key=lambda c: c.score, reverse=True)[:n]
+
+        return rank_skipping(top, k, skip), available
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "shards": self.shards,
+            "users": len(self._placement),
+            "full_loads": self.full_loads,
+            "refreshes": self.refreshes,
+            "per_shard": [worker.call("stats") for worker in self._workers],
+        }
+
+
+# Shared sharded pool used by the API endpoints when MATCH_SHARDS > 0.
+sharded_index = ShardedIndex()
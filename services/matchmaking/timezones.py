@@ -0,0 +1,221 @@
+# timezones.py
+# Precomputed UTC offsets of every IANA time zone for the matchmaking service.
+#
+# user_profiles.time_zone holds an IANA name, and matching needs how many
+# hours apart two users are, both for the time zone part of the compatibility
+# score and for the requester's preferred_time_zone_distance. Converting with
+# zoneinfo per candidate per request is slow, so every zone gets a small
+# integer code and the table keeps the current UTC offset of every zone, in
+# minutes, as one int16 array indexed by code. Distances over a whole
+# candidate pool are then a gather and an integer subtraction.
+#
+# Offsets only change at DST (or other rule) transitions. `prepare` works out
+# every transition of any zone over the next TRANSITION_HORIZON_DAYS and
+# stores the offsets of each window between transitions. Requests only look
+# up the window containing "now"; the service prepares the schedule at
+# startup and extends it from a background task, so the transition scan
+# never runs on the request path.
+
+import asyncio
+import bisect
+import math
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+
+import numpy as np
+
+# How far ahead to look for the next transition. Zones without DST never
+# change, so the table is simply rebuilt once this horizon is reached.
+TRANSITION_HORIZON_DAYS = 400
+# How often the background task extends the schedule.
+TIME_ZONE_PREPARE_INTERVAL_SECONDS = float(os.getenv("TIME_ZONE_PREPARE_INTERVAL_SECONDS", "86400"))
+_DAY = timedelta(days=1)
+
+# (valid_from, valid_until, offsets): the offsets of every zone in that window.
+Window = Tuple[datetime, datetime, np.ndarray]
+
+
+def utc_offset_minutes(zone: Optional[str], at: Optional[datetime] = None) -> int:
+    """UTC offset of an IANA zone in minutes at `at` (now); unknown zones count as UTC."""
+    if not zone:
+        return 0
+    try:
+        offset = (at or datetime.now(timezone.utc)).astimezone(ZoneInfo(zone)).utcoffset()
+    except (ZoneInfoNotFoundError, ValueError):
+        return 0
+    return int(offset.total_seconds() // 60)
+
+
+def minutes_to_hours(minutes: int) -> int:
+    """Whole hours for a distance in minutes, rounding half hours up."""
+    return (int(minutes) + 30) // 60
+
+
+class TimeZoneTable:
+    """
+    Codes for IANA zone names and the UTC offset of every zone in minutes.
+
+    Code 0 is "unknown" and is treated as UTC, as are names that are not IANA
+    zones. The zone list and the offsets are built on first use, so importing
+    the module stays cheap.
+
+    The schedule of offset windows is an immutable tuple that `prepare` swaps
+    in with one assignment, so readers never see the offsets of one window
+    with the validity of another. A lookup outside the schedule prepares it
+    on the spot, which only happens if `prepare` has not run for that time.
+    """
+
+    def __init__(self, zones: Optional[Iterable[str]] = None):
+        self._names: Optional[List[str]] = sorted(zones) if zones is not None else None
+        self._codes: Optional[Dict[str, int]] = None
+        self._zones: List[Optional[ZoneInfo]] = []
+        self._lock = Lock()
+        # (window start times, windows), replaced as a whole.
+        self._schedule: Tuple[Tuple[datetime, ...], Tuple[Window, ...]] = ((), ())
+        self.rebuilds = 0
+
+    def _ensure_codes(self) -> Dict[str, int]:
+        if self._codes is None:
+            with self._lock:
+                if self._codes is None:
+                    if self._names is None:
+                        self._names = sorted(available_timezones())
+                    self._codes = {name: code for code, name in enumerate(self._names, start=1)}
+        return self._codes
+
+    def code(self, zone: Optional[str]) -> int:
+        if not zone:
+            return 0
+        return self._ensure_codes().get(zone, 0)
+
+    def window(self, at: Optional[datetime] = None) -> Window:
+        """The (valid_from, valid_until, offsets) window containing `at` (now)."""
+        at = at or datetime.now(timezone.utc)
+        found = self._find(at)
+        if found is None:
+            self._ensure_codes()
+            with self._lock:
+                found = self._find(at) or self._prepare(at)
+        return found
+
+    def offsets(self, at: Optional[datetime] = None) -> np.ndarray:
+        """UTC offset in minutes of every zone at `at` (now), indexed by zone code."""
+        return self.window(at)[2]
+
+    def minutes_apart(self, zone_a: Optional[str], zone_b: Optional[str], at: Optional[datetime] = None) -> int:
+        offsets = self.offsets(at)
+        return abs(int(offsets[self.code(zone_a)]) - int(offsets[self.code(zone_b)]))
+
+    def _find(self, at: datetime) -> Optional[Window]:
+        starts, windows = self._schedule
+        i = bisect.bisect_right(starts, at) - 1
+        if i >= 0 and at < windows[i][1]:
+            return windows[i]
+        return None
+
+    def _offsets_at(self, at: datetime, codes: Optional[Iterable[int]] = None) -> np.ndarray:
+        """Offsets of every zone at `at`, or only of `codes` (in that order)."""
+        if codes is not None:
+            return np.array([at.astimezone(self._zones[c]).utcoffset().total_seconds() // 60 for c in codes], dtype=np.int16)
+        offsets = np.zeros(len(self._zones), dtype=np.int16)
+        for code, zone in enumerate(self._zones[1:], start=1):
+            offsets[code] = at.astimezone(zone).utcoffset().total_seconds() // 60
+        return offsets
+
+    def _next_transition(self, at: datetime, current: np.ndarray, until: datetime) -> datetime:
+        """First instant after `at` at which any zone's offset differs from `current` (at most `until`)."""
+        low = at
+        while low < until:
+            high = min(low + _DAY, until)
+            changed = np.flatnonzero(self._offsets_at(high) != current)
+            if len(changed):
+                break
+            low = high
+        else:
+            return until
+        # The change is within (low, high]: bisect it down to the second,
+        # looking only at the zones that changed.
+        before = current[changed]
+        low_s, high_s = int(low.timestamp()), math.ceil(high.timestamp())
+        while high_s - low_s > 1:
+            middle = (low_s + high_s) // 2
+            if np.array_equal(self._offsets_at(datetime.fromtimestamp(middle, timezone.utc), changed), before):
+                low_s = middle
+            else:
+                high_s = middle
+        return datetime.fromtimestamp(high_s, timezone.utc)
+
+    def prepare(self, at: Optional[datetime] = None) -> Window:
+        """
+        Work out the offset windows from `at` (now) to TRANSITION_HORIZON_DAYS
+        ahead and swap them in. Returns the window containing `at`.
+        """
+        at = at or datetime.now(timezone.utc)
+        self._ensure_codes()
+        with self._lock:
+            return self._prepare(at)
+
+    def _prepare(self, at: datetime) -> Window:
+        if len(self._zones) != len(self._names) + 1:
+            self._zones = [None]
+            for name in self._names:
+                try:
+                    self._zones.append(ZoneInfo(name))
+                except (ZoneInfoNotFoundError, ValueError):
+                    self._zones.append(ZoneInfo("UTC"))
+        until = at + timedelta(days=TRANSITION_HORIZON_DAYS)
+        windows: List[Window] = []
+        start, offsets = at, self._offsets_at(at)
+        while start < until:
+            end = self._next_transition(start, offsets, until)
+            windows.append((start, end, offsets))
+            start = end
+            if start < until:
+                offsets = self._offsets_at(start)
+        self._schedule = (tuple(w[0] for w in windows), tuple(windows))
+        self.rebuilds += 1
+        return windows[0]
+
+    def run_in_thread(self) -> None:
+        """Like `run`, for processes without an event loop (shard workers)."""
+        while True:
+            time.sleep(TIME_ZONE_PREPARE_INTERVAL_SECONDS)
+            try:
+                self.prepare()
+            except Exception as e:
+                print(f"ERROR: Time zone schedule refresh failed. Details: {e}")
+
+    async def run(self) -> None:
+        """Background loop: extend the schedule every TIME_ZONE_PREPARE_INTERVAL_SECONDS."""
+        while True:
+            await asyncio.sleep(TIME_ZONE_PREPARE_INTERVAL_SECONDS)
+            try:
+                await asyncio.to_thread(self.prepare)
+            except Exception as e:
+                print(f"ERROR: Time zone schedule refresh failed. Details: {e}")
+
+    @property
+    def valid_until(self) -> Optional[datetime]:
+        """End of the prepared schedule."""
+        _, windows = self._schedule
+        return windows[-1][1] if windows else None
+
+    def __len__(self) -> int:
+        return len(self._ensure_codes())
+
+    def stats(self) -> Dict[str, Any]:
+        starts, _ = self._schedule
+        return {
+            "zones": len(self._codes or ()),
+            "rebuilds": self.rebuilds,
+            "windows": len(starts),
+            "valid_until": self.valid_until.isoformat() if self.valid_until else None,
+        }
+
+
+# Shared table used by the scoring and matching code.
+TIME_ZONES = TimeZoneTable()
@@ -1,30 +1,89 @@
 # main.py
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, List, Iterable, Tuple
+from typing import Optional, Dict, Any, List, Iterable, Tuple, Callable
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo  # Python 3.9+
-from supabase import create_client, Client
+from threading import Lock
 from dotenv import load_dotenv
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
 import os
+import time
 
 from fastapi.middleware.cors import CORSMiddleware
 
 # -----------------------------
 # Environment / Supabase client
 # -----------------------------
+# SUPABASE_URL / SUPABASE_KEY are read when the client is first used.
+# Use the service role key server-side.
 load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # Use service role key server-side
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("Missing SUPABASE_URL or SUPABASE_KEY")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+class LazySupabase:
+    """
+    PostgREST client for Supabase that is only built on first use.
+
+    Importing this module does not construct a client or import the full
+    `supabase` package (auth, realtime, storage, functions): only the PostgREST
+    client is needed, and it is imported when the first query is made.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._lock = Lock()
+
+    def _connect(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    url = os.getenv("SUPABASE_URL")
+                    key = os.getenv("SUPABASE_KEY")
+                    if not url or not key:
+                        raise RuntimeError("Missing SUPABASE_URL or SUPABASE_KEY")
+                    from postgrest import SyncPostgrestClient
+                    self._client = SyncPostgrestClient(
+                        f"{url.rstrip('/')}/rest/v1",
+                        headers={"apiKey": key, "Authorization": f"Bearer {key}"},
+                    )
+        return self._client
+
+    def table(self, table_name: str):
+        return self._connect().from_(table_name)
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None):
+        return self._connect().rpc(fn, params or {})
+
+
+supabase = LazySupabase()
 
 # -------------
 # FastAPI app
 # -------------
-app = FastAPI(title="Simple Messages API (SA time, ID cursor)")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Optionally promote newly deliverable messages into thread summaries
+    # ahead of inbox reads (reads promote the threads they show anyway).
+    tasks = []
+    if SUMMARY_PROMOTION_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(_promote_summaries_forever()))
+    # Drop cached matches that matchmaking created or completed.
+    if MATCH_CHANGES_POLL_SECONDS > 0:
+        tasks.append(asyncio.create_task(_invalidate_changed_matches_forever()))
+    yield
+    for task in tasks:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+app = FastAPI(title="Simple Messages API (SA time, ID cursor)", lifespan=lifespan)
 
 ALLOWED_ORIGINS = [
     "http://localhost:3000", 
@@ -40,6 +99,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profile columns returned with inbox/search results (what the inbox renders),
+# instead of select("*").
+INBOX_PROFILE_COLUMNS = "user_id,anonymous_handle,country_code,age_range,interests"
+
 # -------------
 # Models
 # -------------
@@ -56,6 +119,9 @@ class MessageCreate(BaseModel):
 class MessagesPage(BaseModel):
     conversation_thread_id: str
     page_size: int = Field(5, ge=1, le=100)
+    # Opaque cursor from the previous page's `cursor`.
+    cursor: Optional[str] = None
+    # Deprecated: costs an extra lookup per page; use `cursor`.
     last_message_id: Optional[str] = None
 
 class SearchUsers(BaseModel):
@@ -89,12 +155,70 @@ def _normalize_pair(a: str, b: str) -> Tuple[str, str]:
     """Deterministically order a user pair so (a,b) == (b,a)."""
     return (a, b) if a <= b else (b, a)
 
-def _get_active_match_and_thread(user_x: str, user_y: str) -> Dict[str, str]:
+class TTLCache:
     """
-    Return {'match_id': ..., 'conversation_thread_id': ...} for the ACTIVE match between two users,
-    regardless of ordering. Requires conversation_thread_id to be non-null.
+    Thread-safe cache whose entries expire after a TTL; the least recently
+    used entries are dropped once `max_entries` is reached. `None` is a valid
+    value (used for negative caching), so `get` returns (hit, value).
     """
-    a, b = _normalize_pair(user_x, user_y)
+
+    def __init__(self, ttl_seconds: float, max_entries: int, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[Any, Tuple[Any, float]]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Any) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= self._clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def set(self, key: Any, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, self._clock() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Any) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+# Active match per user pair, cached so a burst of sends in a conversation
+# reads match_records once. "No active match" is cached for a shorter time.
+# Entries of a pair are dropped when its match is created or changed (see
+# invalidate_changed_matches); the TTLs only bound staleness if that poll is
+# disabled or failing.
+ACTIVE_MATCH_CACHE_TTL_SECONDS = float(os.getenv("ACTIVE_MATCH_CACHE_TTL_SECONDS", "60"))
+NO_ACTIVE_MATCH_CACHE_TTL_SECONDS = float(os.getenv("NO_ACTIVE_MATCH_CACHE_TTL_SECONDS", "30"))
+ACTIVE_MATCH_CACHE_SIZE = int(os.getenv("ACTIVE_MATCH_CACHE_SIZE", "100000"))
+
+active_match_cache = TTLCache(ACTIVE_MATCH_CACHE_TTL_SECONDS, ACTIVE_MATCH_CACHE_SIZE)
+
+def _load_active_match_and_thread(a: str, b: str) -> Optional[Dict[str, str]]:
+    """Read the ACTIVE match of a normalized pair from match_records (None if there is none)."""
     res = _safe_execute(
         supabase.table("match_records")
         .select("match_id,conversation_thread_id,status")
@@ -104,7 +228,7 @@ def _get_active_match_and_thread(user_x: str, user_y: str) -> Dict[str, str]:
     )
     row = (res.data or [None])[0]
     if not row:
-        raise HTTPException(status_code=404, detail="No active match between users.")
+        return None
     thread_id = row.get("conversation_thread_id")
     if not thread_id:
         # Enforce that you populate conversation_thread_id at match creation time
@@ -114,47 +238,135 @@ def _get_active_match_and_thread(user_x: str, user_y: str) -> Dict[str, str]:
         )
     return {"match_id": row["match_id"], "conversation_thread_id": thread_id}
 
-def _next_sequence(conversation_thread_id: str) -> int:
-    """Compute next message_sequence within the thread."""
-    res = _safe_execute(
-        supabase.table("messages")
-        .select("message_sequence")
-        .eq("conversation_thread_id", conversation_thread_id)
-        .order("message_sequence", desc=True)
-        .limit(1)
-    )
-    return (int(res.data[0]["message_sequence"]) + 1) if res.data else 1
+def _get_active_match_and_thread(user_x: str, user_y: str) -> Dict[str, str]:
+    """
+    Return {'match_id': ..., 'conversation_thread_id': ...} for the ACTIVE match between two users,
+    regardless of ordering. Requires conversation_thread_id to be non-null.
+    Served from active_match_cache when possible.
+    """
+    pair = _normalize_pair(user_x, user_y)
+    hit, ids = active_match_cache.get(pair)
+    if not hit:
+        ids = _load_active_match_and_thread(*pair)
+        active_match_cache.set(pair, ids, None if ids else NO_ACTIVE_MATCH_CACHE_TTL_SECONDS)
+    if ids is None:
+        raise HTTPException(status_code=404, detail="No active match between users.")
+    return dict(ids)
+
+def invalidate_active_match(user_x: str, user_y: str) -> None:
+    """Forget the cached active match of a pair (e.g. its match is gone)."""
+    active_match_cache.pop(_normalize_pair(user_x, user_y))
+
+# Conversation map per user, cached so repeated inbox loads and searches read
+# match_records once. Both users' maps are dropped when a match between them is
+# created or changed (see invalidate_changed_matches); the TTL only bounds
+# staleness if that poll is disabled or failing.
+CONVERSATION_MAP_CACHE_TTL_SECONDS = float(os.getenv("CONVERSATION_MAP_CACHE_TTL_SECONDS", "60"))
+CONVERSATION_MAP_CACHE_SIZE = int(os.getenv("CONVERSATION_MAP_CACHE_SIZE", "100000"))
+
+conversation_map_cache = TTLCache(CONVERSATION_MAP_CACHE_TTL_SECONDS, CONVERSATION_MAP_CACHE_SIZE)
 
 def _get_conv_map_for_user(my_user_id: str) -> Dict[str, str]:
     """
     Return {other_user_id: conversation_thread_id} for active matches where a conversation exists.
-    Combines both roles (user_1 and user_2).
+    Combines both roles (user_1 and user_2) in one query; served from
+    conversation_map_cache when possible.
     """
-    conv_map: Dict[str, str] = {}
-
-    # I'm user_1
-    r1 = _safe_execute(
-        supabase.table("match_records")
-        .select("user_1_id,user_2_id,conversation_thread_id,status")
-        .eq("user_1_id", my_user_id)
-        .eq("status", "active")
-        .not_.is_("conversation_thread_id", "null")
-    )
-    for r in (r1.data or []):
-        conv_map[r["user_2_id"]] = r["conversation_thread_id"]
+    hit, conv_map = conversation_map_cache.get(my_user_id)
+    if hit:
+        return dict(conv_map)
 
-    # I'm user_2
-    r2 = _safe_execute(
+    res = _safe_execute(
         supabase.table("match_records")
         .select("user_1_id,user_2_id,conversation_thread_id,status")
-        .eq("user_2_id", my_user_id)
+        .or_(f"user_1_id.eq.{my_user_id},user_2_id.eq.{my_user_id}")
         .eq("status", "active")
         .not_.is_("conversation_thread_id", "null")
     )
-    for r in (r2.data or []):
-        conv_map[r["user_1_id"]] = r["conversation_thread_id"]
-
-    return conv_map
+    conv_map = {}
+    for r in (res.data or []):
+        other = r["user_2_id"] if r["user_1_id"] == my_user_id else r["user_1_id"]
+        conv_map[other] = r["conversation_thread_id"]
+
+    conversation_map_cache.set(my_user_id, conv_map)
+    return dict(conv_map)
+
+
+# Matchmaking creates and completes matches without telling this service, and
+# there may be several instances of it, so each instance polls match_records
+# for rows whose updated_at moved (set on insert, and by the
+# match_records_touch_updated_at trigger when status or conversation_thread_id
+# change) and drops their cached entries. 0 disables the poll.
+MATCH_CHANGES_POLL_SECONDS = float(os.getenv("MATCH_CHANGES_POLL_SECONDS", "2"))
+# Each pass re-reads this far behind the newest updated_at it has seen: a row
+# is stamped when its transaction starts but only visible once it commits, and
+# a lookup that read the old row may store it just after the pass dropped it.
+MATCH_CHANGES_OVERLAP_SECONDS = float(os.getenv("MATCH_CHANGES_OVERLAP_SECONDS", "10"))
+MATCH_CHANGES_PAGE_SIZE = 1000
+
+_match_changes_watermark: Optional[datetime] = None
+
+def _drop_cached_match(row: Dict[str, Any]) -> None:
+    """Forget everything cached about the pair of a created or changed match."""
+    invalidate_active_match(row["user_1_id"], row["user_2_id"])
+    conversation_map_cache.pop(row["user_1_id"])
+    conversation_map_cache.pop(row["user_2_id"])
+
+def reset_match_changes() -> None:
+    """Clear the match caches; the next pass starts over from the newest match."""
+    global _match_changes_watermark
+    _match_changes_watermark = None
+    active_match_cache.clear()
+    conversation_map_cache.clear()
+
+def invalidate_changed_matches() -> int:
+    """
+    Drop cached entries of pairs whose match was created or changed since the
+    last pass. The first pass only clears the caches and records the newest
+    updated_at. Returns the number of changed matches read.
+    """
+    global _match_changes_watermark
+    if _match_changes_watermark is None:
+        res = _safe_execute(
+            supabase.table("match_records").select("updated_at")
+            .not_.is_("updated_at", "null")
+            .order("updated_at", desc=True)
+            .limit(1)
+        )
+        rows = res.data or []
+        active_match_cache.clear()
+        conversation_map_cache.clear()
+        _match_changes_watermark = _parse_ts(rows[0]["updated_at"]) if rows else now_in_sa()
+        return 0
+
+    start = (_match_changes_watermark - timedelta(seconds=MATCH_CHANGES_OVERLAP_SECONDS)).isoformat()
+    changed, last = 0, None
+    while True:
+        query = (
+            supabase.table("match_records").select("match_id,user_1_id,user_2_id,updated_at")
+            .gte("updated_at", start)
+        )
+        if last is not None:
+            updated_at, match_id = last
+            query = query.or_(f'updated_at.gt."{updated_at}",and(updated_at.eq."{updated_at}",match_id.gt.{match_id})')
+        page = _safe_execute(query.order("updated_at").order("match_id").limit(MATCH_CHANGES_PAGE_SIZE)).data or []
+        for row in page:
+            _drop_cached_match(row)
+            _match_changes_watermark = max(_match_changes_watermark, _parse_ts(row["updated_at"]))
+        changed += len(page)
+        if len(page) < MATCH_CHANGES_PAGE_SIZE:
+            return changed
+        last = (page[-1]["updated_at"], page[-1]["match_id"])
+
+async def _invalidate_changed_matches_forever() -> None:
+    while True:
+        try:
+            await asyncio.to_thread(invalidate_changed_matches)
+        except Exception as e:
+            # Changes may have been missed: start over rather than serve them stale.
+            reset_match_changes()
+            print(f"ERROR: Match change poll failed. Details: {e}")
+        await asyncio.sleep(MATCH_CHANGES_POLL_SECONDS)
 
 
 def _fetch_active_profiles(user_ids: Iterable[str], handle_filter: Optional[str] = None) -> List[Dict[str, Any]]:
@@ -168,7 +380,7 @@ def _fetch_active_profiles(user_ids: Iterable[str], handle_filter: Optional[str]
 
     q = (
         supabase.table("user_profiles")
-        .select("*")
+        .select(INBOX_PROFILE_COLUMNS)
         .in_("user_id", user_ids)
         .eq("account_status", "active")
     )
@@ -189,7 +401,7 @@ def _search_active_profiles_fts(user_ids: Iterable[str], qtext: Optional[str]) -
 
     base = (
         supabase.table("user_profiles")
-        .select("*")
+        .select(INBOX_PROFILE_COLUMNS)
         .in_("user_id", user_ids)
         .eq("account_status", "active")
     )
@@ -244,6 +456,173 @@ def _fetch_latest_visible_messages(convo_ids: Iterable[str], now_sa_iso: str, li
             latest_by_convo[cid] = m
     return latest_by_convo
 
+# ---------------------------
+# Thread summaries
+# ---------------------------
+# conversation_summaries holds one row per thread: the latest visible message,
+# the last activity and counts, so the inbox reads one row per conversation
+# instead of scanning messages. The trigger that assigns message_sequence (see
+# the data design doc) records every send: last_message_sequence, last_activity_at,
+# message_count and next_delivery_at (the earliest delivery time not yet
+# reflected in latest_*). The background pass stores the latest_* columns
+# of threads whose next_delivery_at has passed; until it has, the inbox
+# applies newly deliverable messages to what it shows without writing.
+# read_at and delivery_status change after a message is promoted, so the
+# inbox reads them live for the latest messages it shows.
+SUMMARY_COLUMNS = (
+    "conversation_thread_id,last_message_sequence,last_activity_at,message_count,next_delivery_at,"
+    "visible_count,latest_message_sequence,latest_message_id,latest_message_content,latest_sender_id,"
+    "latest_recipient_id,latest_scheduled_delivery_at"
+)
+# Columns of a message copied into a summary's latest_* columns.
+SUMMARY_MESSAGE_COLUMNS = (
+    "message_id,conversation_thread_id,message_sequence,message_content,"
+    "sender_id,recipient_id,scheduled_delivery_at"
+)
+# Threads promoted per messages query (each adds one condition to the URL).
+SUMMARY_PROMOTION_CHUNK = 50
+# How often the background pass stores promotions; 0 disables it (inbox reads
+# then apply every delivery since the last stored promotion on each read).
+SUMMARY_PROMOTION_INTERVAL_SECONDS = float(os.getenv("SUMMARY_PROMOTION_INTERVAL_SECONDS", "30"))
+SUMMARY_PROMOTION_BATCH = 500
+
+def _parse_ts(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")) if value else None
+
+def _promote_deliverable(summaries: List[Dict[str, Any]], now: datetime, store: bool = True) -> int:
+    """
+    Move the latest_* columns of `summaries` up to their newest message that
+    is deliverable at `now`, and recompute next_delivery_at. Updates the
+    dicts in place. With `store`, each row is also written if no message was
+    sent or promoted since it was read; otherwise the next pass promotes it
+    again. Returns the number of rows written.
+    """
+    written = 0
+    for start in range(0, len(summaries), SUMMARY_PROMOTION_CHUNK):
+        chunk = summaries[start:start + SUMMARY_PROMOTION_CHUNK]
+        # Only messages after each thread's current latest are read.
+        res = _safe_execute(
+            supabase.table("messages")
+            .select(SUMMARY_MESSAGE_COLUMNS)
+            .or_(",".join(
+                f"and(conversation_thread_id.eq.{s['conversation_thread_id']},"
+                f"message_sequence.gt.{s.get('latest_message_sequence') or 0})"
+                for s in chunk
+            ))
+            .order("message_sequence", desc=True)
+        )
+        newer: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for m in (res.data or []):
+            newer[m["conversation_thread_id"]].append(m)
+
+        for summary in chunk:
+            rows = newer[summary["conversation_thread_id"]]
+            visible = [m for m in rows if _parse_ts(m["scheduled_delivery_at"]) <= now]
+            pending = [m["scheduled_delivery_at"] for m in rows if _parse_ts(m["scheduled_delivery_at"]) > now]
+            changes: Dict[str, Any] = {"next_delivery_at": min(pending, key=_parse_ts) if pending else None}
+            if visible:
+                latest = visible[0]  # highest sequence first
+                changes.update(
+                    visible_count=(summary.get("visible_count") or 0) + len(visible),
+                    latest_message_sequence=latest["message_sequence"],
+                    latest_message_id=latest["message_id"],
+                    latest_message_content=latest["message_content"],
+                    latest_sender_id=latest["sender_id"],
+                    latest_recipient_id=latest["recipient_id"],
+                    latest_scheduled_delivery_at=latest["scheduled_delivery_at"],
+                )
+            if store:
+                upd = _safe_execute(
+                    supabase.table("conversation_summaries")
+                    .update(changes)
+                    .eq("conversation_thread_id", summary["conversation_thread_id"])
+                    .eq("latest_message_sequence", summary.get("latest_message_sequence") or 0)
+                    .eq("last_message_sequence", summary.get("last_message_sequence") or 0)
+                )
+                if upd.data:
+                    written += 1
+            # Either way, this caller sees the promoted state.
+            summary.update(changes)
+    return written
+
+def _attach_read_state(summaries: Iterable[Dict[str, Any]]) -> None:
+    """Set latest_read_at / latest_delivery_status of summaries from their latest message, in one query."""
+    summaries = list(summaries)
+    ids = [s["latest_message_id"] for s in summaries if s.get("latest_message_id")]
+    state: Dict[str, Dict[str, Any]] = {}
+    if ids:
+        res = _safe_execute(
+            supabase.table("messages")
+            .select("message_id,read_at,delivery_status")
+            .in_("message_id", ids)
+        )
+        state = {m["message_id"]: m for m in (res.data or [])}
+    for s in summaries:
+        m = state.get(s.get("latest_message_id"), {})
+        s["latest_read_at"] = m.get("read_at")
+        s["latest_delivery_status"] = m.get("delivery_status")
+
+def _fetch_thread_summaries(convo_ids: Iterable[str], now: datetime) -> Dict[str, Dict[str, Any]]:
+    """
+    Summary rows of the given threads, {conversation_thread_id: summary}, with
+    messages that became deliverable since they were last promoted applied
+    (not stored; that is left to the background pass) and the live read
+    state of each latest message. Threads without a summary row are left out.
+    """
+    convo_ids = list(convo_ids)
+    if not convo_ids:
+        return {}
+    res = _safe_execute(
+        supabase.table("conversation_summaries")
+        .select(SUMMARY_COLUMNS)
+        .in_("conversation_thread_id", convo_ids)
+    )
+    summaries = {s["conversation_thread_id"]: s for s in (res.data or [])}
+    due = [
+        s for s in summaries.values()
+        if s.get("next_delivery_at") and _parse_ts(s["next_delivery_at"]) <= now
+    ]
+    if due:
+        _promote_deliverable(due, now, store=False)
+    _attach_read_state(summaries.values())
+    return summaries
+
+def _summary_latest_message(summary: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The latest visible message of a summary, shaped like a messages row (None if nothing is visible yet)."""
+    if not summary.get("latest_message_id"):
+        return None
+    return {
+        "message_id": summary["latest_message_id"],
+        "conversation_thread_id": summary["conversation_thread_id"],
+        "message_content": summary["latest_message_content"],
+        "sender_id": summary["latest_sender_id"],
+        "recipient_id": summary["latest_recipient_id"],
+        "scheduled_delivery_at": summary["latest_scheduled_delivery_at"],
+        "read_at": summary.get("latest_read_at"),
+        "delivery_status": summary.get("latest_delivery_status"),
+    }
+
+def promote_due_summaries(now: Optional[datetime] = None) -> int:
+    """Promote up to SUMMARY_PROMOTION_BATCH threads whose next message is now deliverable."""
+    now = now or now_in_sa()
+    res = _safe_execute(
+        supabase.table("conversation_summaries")
+        .select(SUMMARY_COLUMNS)
+        .lte("next_delivery_at", now.isoformat())
+        .order("next_delivery_at")
+        .limit(SUMMARY_PROMOTION_BATCH)
+    )
+    rows = res.data or []
+    return _promote_deliverable(rows, now) if rows else 0
+
+async def _promote_summaries_forever() -> None:
+    while True:
+        try:
+            await asyncio.to_thread(promote_due_summaries)
+        except Exception as e:
+            print(f"ERROR: Summary promotion failed. Details: {e}")
+        await asyncio.sleep(SUMMARY_PROMOTION_INTERVAL_SECONDS)
+
 def _format_latest_message(m: Optional[Dict[str, Any]], my_user_id: str) -> Optional[Dict[str, Any]]:
     if not m:
         return None
@@ -290,35 +669,83 @@ def send_message(msg: MessageCreate):
     # 2) Schedule in SA time (example: +12 hours)
     scheduled_dt = now_in_sa() + timedelta(hours=12)
 
-    # 3) Next sequence within this thread
-    seq = _next_sequence(thread_id)
-
-    # 4) Insert message
+    # 3) Insert message; the DB assigns the next sequence within this thread
+    #    (assign_message_sequence trigger), so concurrent sends never collide.
     payload = {
         "match_id": match_id,
         "sender_id": msg.sender_id,
         "recipient_id": msg.recipient_id,
         "conversation_thread_id": thread_id,
-        "message_sequence": seq,
         "message_content": msg.message_content,
         "scheduled_delivery_at": scheduled_dt.isoformat(),
     }
     if msg.letter_styles is not None:
         payload["letter_styles"] = msg.letter_styles.model_dump()
 
-    ins = _safe_execute(supabase.table("messages").insert(payload))
+    try:
+        ins = _safe_execute(supabase.table("messages").insert(payload))
+    except HTTPException as e:
+        if e.detail == "Foreign key violation.":
+            # The cached match may be gone; look it up again next time.
+            invalidate_active_match(msg.sender_id, msg.recipient_id)
+        raise
     if not ins.data:
         raise HTTPException(status_code=500, detail="Failed to insert message")
     return ins.data[0]
 
 
+CURSOR_SIGNATURE_BYTES = 16
+
+def _cursor_secret() -> bytes:
+    """
+    Key for signing page cursors: MESSAGE_CURSOR_SECRET, or else a key derived
+    from SUPABASE_KEY. Either is the same on every instance and survives
+    restarts, so a cursor issued by one process is accepted by the others.
+    """
+    secret = os.getenv("MESSAGE_CURSOR_SECRET")
+    if secret:
+        return secret.encode()
+    key = os.getenv("SUPABASE_KEY")
+    if not key:
+        raise RuntimeError("Missing MESSAGE_CURSOR_SECRET or SUPABASE_KEY")
+    return hmac.new(key.encode(), b"messages page cursor", hashlib.sha256).digest()
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _cursor_signature(conversation_thread_id: str, raw: bytes) -> bytes:
+    mac = hmac.new(_cursor_secret(), conversation_thread_id.encode() + b"|" + raw, hashlib.sha256)
+    return mac.digest()[:CURSOR_SIGNATURE_BYTES]
+
+def encode_page_cursor(conversation_thread_id: str, row: Dict[str, Any]) -> str:
+    """Signed, opaque cursor for the position after `row` (newest first) in a thread."""
+    raw = f"{row['created_at']}|{row['message_id']}".encode()
+    return f"{_b64encode(raw)}.{_b64encode(_cursor_signature(conversation_thread_id, raw))}"
+
+def decode_page_cursor(conversation_thread_id: str, cursor: str) -> Tuple[str, str]:
+    """(created_at, message_id) of a cursor from encode_page_cursor for this thread, or raise 400."""
+    try:
+        payload, signature = cursor.split(".")
+        raw = _b64decode(payload)
+        if not hmac.compare_digest(_b64decode(signature), _cursor_signature(conversation_thread_id, raw)):
+            raise ValueError("bad signature")
+        created_at, message_id = raw.decode().split("|")
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, message_id
+
 @app.post("/messages/page")
 def page_messages_sa(body: MessagesPage):
     """
     Paginate messages for a conversation:
       - Only include rows where scheduled_delivery_at <= now (SA time)
-      - Return newest -> oldest (created_at DESC)
-      - Use 'next_cursor' (message_id) to fetch older pages
+      - Return newest -> oldest (created_at DESC, then message_id DESC for ties)
+      - Pass the returned 'cursor' to fetch the next (older) page; it is null
+        on the last page. 'next_cursor' (message_id) is kept for clients that
+        still send last_message_id.
     """
     now_sa_iso = now_in_sa().isoformat()
 
@@ -329,7 +756,10 @@ def page_messages_sa(body: MessagesPage):
         .lte("scheduled_delivery_at", now_sa_iso)
     )
 
-    if body.last_message_id:
+    position = None
+    if body.cursor:
+        position = decode_page_cursor(body.conversation_thread_id, body.cursor)
+    elif body.last_message_id:
         cur = _safe_execute(
             supabase.table("messages")
             .select("created_at")
@@ -338,19 +768,30 @@ def page_messages_sa(body: MessagesPage):
         )
         if not cur.data:
             raise HTTPException(status_code=404, detail="last_message_id not found")
-        last_created_at = cur.data["created_at"]
-        q = q.lt("created_at", last_created_at)
+        position = (cur.data["created_at"], body.last_message_id)
+
+    if position is not None:
+        # Keyset: strictly after (created_at, message_id) in newest-first order.
+        created_at, message_id = position
+        q = q.or_(
+            f'created_at.lt."{created_at}",'
+            f'and(created_at.eq."{created_at}",message_id.lt.{message_id})'
+        )
 
-    res = _safe_execute(q.order("created_at", desc=True).limit(body.page_size))
+    # One extra row tells whether there is another page.
+    res = _safe_execute(
+        q.order("created_at", desc=True).order("message_id", desc=True).limit(body.page_size + 1)
+    )
     rows = res.data or []
-
-    next_cursor = rows[-1]["message_id"] if rows else None
+    has_more = len(rows) > body.page_size
+    rows = rows[:body.page_size]
 
     return {
         "items": rows,
         "count": len(rows),
-        "next_cursor": next_cursor,
-        "has_more": len(rows) == body.page_size,
+        "next_cursor": rows[-1]["message_id"] if rows else None,
+        "cursor": encode_page_cursor(body.conversation_thread_id, rows[-1]) if has_more else None,
+        "has_more": has_more,
     }
 
 # ---- search implementation (FTS; "" acts like inbox) ----
@@ -380,20 +821,29 @@ def _search_users_impl(
     if not paged_profiles:
         return {"count": 0, "items": []}
 
-    # 4) Latest visible message per convo using SA cutoff
-    now_sa_iso = now_in_sa().isoformat()
+    # 4) Latest visible message per convo using SA cutoff, from the thread
+    #    summaries (one row per conversation, however many messages it has)
+    now_sa = now_in_sa()
     convo_ids = [conv_map[p["user_id"]] for p in paged_profiles]
-    latest_by_convo = _fetch_latest_visible_messages(convo_ids, now_sa_iso, limit_cap=1000)
+    summaries = _fetch_thread_summaries(convo_ids, now_sa)
+    latest_by_convo = {cid: _summary_latest_message(s) for cid, s in summaries.items()}
+    # Threads without a summary row yet (not backfilled) fall back to scanning messages.
+    missing = [cid for cid in convo_ids if cid not in summaries]
+    if missing:
+        latest_by_convo.update(_fetch_latest_visible_messages(missing, now_sa.isoformat(), limit_cap=1000))
 
     # 5) Build items
     items = []
     for p in paged_profiles:
         cid = conv_map[p["user_id"]]
         latest = _format_latest_message(latest_by_convo.get(cid), my_user_id)
+        summary = summaries.get(cid, {})
         items.append(
             {
                 "user_profile": p,                 # active-only
                 "latest_message": latest,          # may be None if all are future-scheduled
+                "last_activity_at": summary.get("last_activity_at"),
+                "message_count": summary.get("message_count"),
             }
         )
     return {"count": len(items), "items": items}
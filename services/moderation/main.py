@@ -2,8 +2,9 @@ from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from better_profanity import profanity
-from supabase import create_client, Client
 from dotenv import load_dotenv
+from threading import Lock
+from typing import Any, Dict, Optional
 import os
 from datetime import datetime
 import uuid
@@ -12,16 +13,44 @@ import uuid
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '..', '.env')
 load_dotenv(dotenv_path)
 
-# Retrieve Supabase credentials from environment variables.
-SUPABASE_URL: str | None = os.environ.get("SUPABASE_URL")
-SUPABASE_KEY: str | None = os.environ.get("SUPABASE_KEY")
+# Supabase credentials (SUPABASE_URL / SUPABASE_KEY) are read when the client is first used.
 
-if not SUPABASE_URL:
-    raise ValueError("SUPABASE_URL environment variable is not set.")
-if not SUPABASE_KEY:
-    raise ValueError("SUPABASE_KEY environment variable is not set.")
+class LazySupabase:
+    """
+    PostgREST client for Supabase that is only built on first use.
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    Importing this module does not construct a client or import the full
+    `supabase` package (auth, realtime, storage, functions): only the PostgREST
+    client is needed, and it is imported when the first query is made.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._lock = Lock()
+
+    def _connect(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    url = os.getenv("SUPABASE_URL")
+                    key = os.getenv("SUPABASE_KEY")
+                    if not url or not key:
+                        raise RuntimeError("Missing SUPABASE_URL or SUPABASE_KEY")
+                    from postgrest import SyncPostgrestClient
+                    self._client = SyncPostgrestClient(
+                        f"{url.rstrip('/')}/rest/v1",
+                        headers={"apiKey": key, "Authorization": f"Bearer {key}"},
+                    )
+        return self._client
+
+    def table(self, table_name: str):
+        return self._connect().from_(table_name)
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None):
+        return self._connect().rpc(fn, params or {})
+
+
+supabase = LazySupabase()
 
 # Load profanity words
 profanity.load_censor_words()
@@ -58,6 +87,10 @@ app.add_middleware(
     ],
 )
 
+# Columns read per lookup, instead of select("*").
+EXTERNAL_USER_COLUMNS = "id,usage_count,usage_limit"
+INTERNAL_USER_COLUMNS = "user_id,reported_count"
+
 # Request model
 class CheckRequest(BaseModel):
     text: str
@@ -82,7 +115,7 @@ def check_profanity(
 
     # External user flow
     if x_api_key:
-        user_res = supabase.table("external_users").select("*").eq("api_key", x_api_key).execute()
+        user_res = supabase.table("external_users").select(EXTERNAL_USER_COLUMNS).eq("api_key", x_api_key).execute()
         if not user_res.data:
             raise HTTPException(status_code=401, detail="Invalid API key")
         user = user_res.data[0]
@@ -98,7 +131,7 @@ def check_profanity(
     # Internal user flow - UPDATED
     elif x_user_id:
         # Query user_profiles table instead of internal_users
-        user_res = supabase.table("user_profiles").select("*").eq("user_id", x_user_id).execute()
+        user_res = supabase.table("user_profiles").select(INTERNAL_USER_COLUMNS).eq("user_id", x_user_id).execute()
         if not user_res.data:
             raise HTTPException(status_code=404, detail="User not found")
         user = user_res.data[0]
@@ -139,10 +172,10 @@ def check_profanity(
         # Insert moderation log
         supabase.table("moderation_logs").insert(moderation_log_entry).execute()
         
-        # Increment reported_count for the user
+        # Increment reported_count for the user (updated_at is left to the
+        # database, which only moves it when matching columns change)
         supabase.table("user_profiles").update({
             "reported_count": user["reported_count"] + 1,
-            "updated_at": datetime.utcnow().isoformat()
         }).eq("user_id", user_id).execute()
 
     return {
@@ -0,0 +1,143 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import services.core.main as core_main
+from services.core.cache import profile_cache
+from services.core.database import get_supabase
+
+
+class Resp:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    """Tiny stand-in for the async PostgREST request builder over an in-memory table."""
+
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+        self.op = "select"
+        self.payload = None
+        self.filters = []
+        self.columns = "*"
+        self.order_by = None
+        self.limit_to = None
+
+    def select(self, columns="*", **k):
+        self.columns = columns
+        return self
+
+    def eq(self, col, val):
+        self.filters.append(lambda r: r.get(col) == val)
+        return self
+
+    def gt(self, col, val):
+        self.filters.append(lambda r: r.get(col) > val)
+        return self
+
+    def order(self, col, **k):
+        self.order_by = col
+        return self
+
+    def limit(self, n):
+        self.limit_to = n
+        return self
+
+    def in_(self, col, vals):
+        vals = set(vals)
+        self.filters.append(lambda r: r.get(col) in vals)
+        return self
+
+    def insert(self, payload, **k):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict="", ignore_duplicates=False, **k):
+        self.op, self.payload = "upsert", payload
+        self.on_conflict, self.ignore_duplicates = on_conflict, ignore_duplicates
+        return self
+
+    def update(self, payload, **k):
+        self.op, self.payload = "update", payload
+        return self
+
+    async def execute(self):
+        self.db.calls.append((self.name, self.op))
+        rows = self.db.tables.setdefault(self.name, [])
+        if self.op in ("insert", "upsert"):
+            payloads = self.payload if isinstance(self.payload, list) else [self.payload]
+            inserted = []
+            for payload in payloads:
+                if self.op == "upsert" and any(r.get(self.on_conflict) == payload[self.on_conflict] for r in rows):
+                    assert self.ignore_duplicates, "fake only supports ignore-duplicates upserts"
+                    continue
+                new = dict(payload, created_at="2025-08-16T10:00:00Z", updated_at="2025-08-16T10:00:00Z",
+                           last_active=None)
+                rows.append(new)
+                inserted.append(dict(new))
+            return Resp(inserted, count=len(inserted))
+        matched = [r for r in rows if all(f(r) for f in self.filters)]
+        if self.order_by:
+            matched.sort(key=lambda r: r[self.order_by])
+        if self.limit_to is not None:
+            matched = matched[:self.limit_to]
+        if self.op == "update":
+            for r in matched:
+                # updated_at is stamped like the touch_updated_at trigger does.
+                r.update(self.payload, updated_at="2025-08-16T11:00:00Z")
+        if self.op == "select" and self.columns != "*":
+            return Resp([{c: r.get(c) for c in self.columns.split(",")} for r in matched])
+        return Resp([dict(r) for r in matched])
+
+
+class FakeAsyncSupabase:
+    def __init__(self):
+        self.tables = {}
+        self.calls = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+def make_profile(clerk_id="clerk_1", **overrides):
+    row = {
+        "clerk_id": clerk_id,
+        "anonymous_handle": f"handle_{clerk_id}",
+        "age_range": "26-35",
+        "primary_language": "en",
+        "secondary_languages": ["fr"],
+        "time_zone": "Africa/Johannesburg",
+        "country_code": "ZA",
+        "bio": "hello",
+        "interests": ["music"],
+        "created_at": "2025-08-16T10:00:00Z",
+        "updated_at": "2025-08-16T10:00:00Z",
+        "last_active": None,
+        # Columns Core never needs to read.
+        "password_hash": "secret",
+        "blocked_users": [],
+    }
+    row.update(overrides)
+    return row
+
+
+@pytest.fixture
+def anyio_backend():
+    # The services run on asyncio (uvicorn); don't also run async tests under trio.
+    return "asyncio"
+
+
+@pytest.fixture
+def fake_db():
+    db = FakeAsyncSupabase()
+    profile_cache.clear()
+    core_main.app.dependency_overrides[get_supabase] = lambda: db
+    yield db
+    core_main.app.dependency_overrides.pop(get_supabase, None)
+
+
+@pytest.fixture
+def client(fake_db):
+    return TestClient(core_main.app)
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+import services.core.bulk as bulk
+from tests.core.conftest import FakeAsyncSupabase, make_profile
+
+pytestmark = pytest.mark.unit
+
+
+async def stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def ndjson(*rows):
+    return "".join(json.dumps(r) + "\n" for r in rows).encode()
+
+
+@pytest.mark.anyio
+async def test_iter_ndjson_lines_handles_split_chunks():
+    lines = [line async for line in bulk.iter_ndjson_lines(stream(b'{"a"', b':1}\n{"b":2}\n{"c"', b":3}"))]
+    assert lines == [b'{"a":1}', b'{"b":2}', b'{"c":3}']
+
+
+@pytest.mark.anyio
+async def test_iter_ndjson_lines_rejects_oversized_line(monkeypatch):
+    monkeypatch.setattr(bulk, "MAX_NDJSON_LINE_BYTES", 8)
+    with pytest.raises(bulk.NDJSONLineTooLong):
+        [line async for line in bulk.iter_ndjson_lines(stream(b"x" * 20))]
+
+
+@pytest.mark.anyio
+async def test_iter_ndjson_lines_rejects_oversized_line_within_one_chunk(monkeypatch):
+    monkeypatch.setattr(bulk, "MAX_NDJSON_LINE_BYTES", 8)
+    lines = bulk.iter_ndjson_lines(stream(b'{"a":1}\n' + b"x" * 20 + b"\n{}"))
+    assert await lines.__anext__() == b'{"a":1}'
+    with pytest.raises(bulk.NDJSONLineTooLong):
+        await lines.__anext__()
+
+
+@pytest.mark.anyio
+async def test_import_profiles_batches_validates_and_skips_existing():
+    db = FakeAsyncSupabase()
+    db.tables["user_profiles"] = [make_profile("existing")]
+    body = ndjson(
+        {"clerk_id": "u1", "anonymous_handle": "one"},
+        {"clerk_id": "existing", "anonymous_handle": "dup"},
+        {"clerk_id": "u2"},  # missing anonymous_handle
+        {"clerk_id": "u3", "anonymous_handle": "three"},
+        {"clerk_id": "u1", "anonymous_handle": "again"},
+    ) + b"\nnot json\n"
+
+    result = await bulk.import_profiles(db, stream(body[:50], body[50:]), batch_size=2)
+
+    assert result["received"] == 6
+    assert result["inserted"] == 2
+    assert result["skipped"] == 2
+    assert result["invalid"] == 2
+    assert [e["line"] for e in result["errors"]] == [3, 7]
+    # Two batches of at most two valid rows each.
+    assert db.calls == [("user_profiles", "upsert")] * 2
+    assert {r["clerk_id"] for r in db.tables["user_profiles"]} == {"existing", "u1", "u3"}
+
+
+@pytest.mark.anyio
+async def test_export_profiles_pages_with_keyset_cursor():
+    db = FakeAsyncSupabase()
+    db.tables["user_profiles"] = [make_profile(f"c{i}") for i in (3, 1, 4, 2, 5)]
+
+    lines = [line async for line in bulk.export_profiles(db, ("anonymous_handle",), page_size=2)]
+
+    assert [json.loads(line) for line in lines] == [{"anonymous_handle": f"handle_c{i}"} for i in range(1, 6)]
+    assert len(db.calls) == 3
+
+
+@pytest.mark.integration
+def test_import_and_export_endpoints_round_trip(client, fake_db):
+    body = ndjson(*({"clerk_id": f"c{i}", "anonymous_handle": f"h{i}"} for i in range(3)))
+    r = client.post("/profiles/import", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert r.status_code == 200
+    assert r.json() == {"received": 3, "inserted": 3, "skipped": 0, "invalid": 0, "errors": []}
+
+    r = client.get("/profiles/export", params={"fields": "clerk_id,anonymous_handle"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    exported = [json.loads(line) for line in r.text.splitlines()]
+    assert exported == [{"clerk_id": f"c{i}", "anonymous_handle": f"h{i}"} for i in range(3)]
+
+
+@pytest.mark.integration
+def test_import_endpoint_rejects_oversized_line(client, fake_db, monkeypatch):
+    monkeypatch.setattr(bulk, "MAX_NDJSON_LINE_BYTES", 8)
+    r = client.post("/profiles/import", content=b"x" * 20)
+    assert r.status_code == 413
@@ -0,0 +1,107 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from services.core.heartbeats import HeartbeatBuffer, heartbeat_buffer
+from tests.core.conftest import FakeAsyncSupabase, make_profile
+
+pytestmark = pytest.mark.unit
+
+
+def at(second):
+    return datetime(2025, 8, 28, 10, 0, second, 123456, tzinfo=timezone.utc)
+
+
+@pytest.mark.anyio
+async def test_flush_coalesces_latest_timestamp_per_user():
+    db = FakeAsyncSupabase()
+    db.tables["user_profiles"] = [make_profile("a"), make_profile("b"), make_profile("c")]
+    buf = HeartbeatBuffer(flush_interval=60, max_pending=100)
+
+    buf.record("a", at(1))
+    buf.record("a", at(3))
+    buf.record("a", at(2))  # out of order, ignored
+    buf.record("b", at(3))
+    buf.record("c", at(5))
+    assert buf.pending() == 3
+
+    assert await buf.flush(db) == 3
+    # Users sharing a timestamp are written together: 2 updates for 5 heartbeats.
+    assert db.calls == [("user_profiles", "update")] * 2
+    rows = {r["clerk_id"]: r["last_active"] for r in db.tables["user_profiles"]}
+    assert rows == {"a": "2025-08-28T10:00:03+00:00", "b": "2025-08-28T10:00:03+00:00",
+                    "c": "2025-08-28T10:00:05+00:00"}
+    assert buf.pending() == 0
+    assert await buf.flush(db) == 0
+    assert buf.stats()["recorded"] == 5 and buf.stats()["flushed"] == 3
+
+
+@pytest.mark.anyio
+async def test_failed_flush_keeps_heartbeats_for_retry():
+    class BrokenDb:
+        def table(self, name): raise RuntimeError("db down")
+
+    buf = HeartbeatBuffer(flush_interval=60, max_pending=100)
+    buf.record("a", at(1))
+    with pytest.raises(RuntimeError):
+        await buf.flush(BrokenDb())
+    buf.record("a", at(0))  # older than the restored one
+    assert buf.pending() == 1
+    assert buf.stats()["failed_flushes"] == 1
+
+    db = FakeAsyncSupabase()
+    db.tables["user_profiles"] = [make_profile("a")]
+    await buf.flush(db)
+    assert db.tables["user_profiles"][0]["last_active"] == "2025-08-28T10:00:01+00:00"
+
+
+@pytest.mark.anyio
+async def test_run_flushes_early_when_buffer_is_full():
+    db = FakeAsyncSupabase()
+    buf = HeartbeatBuffer(flush_interval=60, max_pending=2)
+
+    async def get_db(): return db
+
+    task = asyncio.create_task(buf.run(get_db))
+    await asyncio.sleep(0)
+    buf.record("a")
+    buf.record("b")
+    for _ in range(10):
+        await asyncio.sleep(0)
+    task.cancel()
+    assert buf.pending() == 0
+    assert buf.stats()["flushed"] == 2
+
+
+@pytest.mark.integration
+def test_heartbeat_endpoint_queues_without_db(client, fake_db):
+    heartbeat_buffer._drain()
+    r = client.post("/profiles/clerk_1/heartbeat")
+    assert r.status_code == 202
+    assert fake_db.calls == []
+    assert heartbeat_buffer.pending() == 1
+    assert client.get("/cache/stats").json()["heartbeats"]["pending"] == 1
+    heartbeat_buffer._drain()
+
+
+@pytest.mark.integration
+def test_shutdown_flushes_pending_heartbeats(monkeypatch):
+    from fastapi.testclient import TestClient
+    import services.core.main as core_main
+
+    db = FakeAsyncSupabase()
+    db.tables["user_profiles"] = [make_profile("clerk_1")]
+
+    async def fake_init(): return db
+    async def fake_close(): pass
+
+    monkeypatch.setattr(core_main, "init_supabase", fake_init)
+    monkeypatch.setattr(core_main, "close_supabase", fake_close)
+    heartbeat_buffer._drain()
+
+    with TestClient(core_main.app) as client:
+        assert client.post("/profiles/clerk_1/heartbeat").status_code == 202
+
+    assert heartbeat_buffer.pending() == 0
+    assert db.tables["user_profiles"][0]["last_active"] is not None
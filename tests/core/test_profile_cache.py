@@ -0,0 +1,77 @@
+import pytest
+
+from services.core.cache import ProfileCache
+from tests.core.conftest import make_profile
+
+pytestmark = pytest.mark.unit
+
+
+class FakeClock:
+    def __init__(self): self.now = 0.0
+    def __call__(self): return self.now
+
+
+def test_get_miss_then_hit():
+    cache = ProfileCache(max_entries=10, ttl_seconds=60)
+    assert cache.get("a") is None
+    cache.set("a", {"clerk_id": "a"})
+    assert cache.get("a") == {"clerk_id": "a"}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = ProfileCache(max_entries=10, ttl_seconds=5, clock=clock)
+    cache.set("a", {"clerk_id": "a"})
+    clock.now = 4.9
+    assert cache.get("a") is not None
+    clock.now = 5.0
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = ProfileCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", {"v": 1})
+    cache.set("b", {"v": 2})
+    cache.get("a")  # "b" is now least recently used
+    cache.set("c", {"v": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.get("c") == {"v": 3}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_and_disabled_cache():
+    cache = ProfileCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", {"v": 1})
+    cache.set("b", {"v": 2})
+    cache.invalidate("a")
+    cache.invalidate_many(["b", "missing"])
+    assert cache.stats()["size"] == 0
+
+    disabled = ProfileCache(max_entries=0, ttl_seconds=60)
+    disabled.set("a", {"v": 1})
+    assert disabled.get("a") is None
+
+
+@pytest.mark.integration
+def test_repeat_reads_served_from_cache(client, fake_db):
+    fake_db.tables["user_profiles"] = [make_profile("clerk_1")]
+    assert client.get("/profiles/clerk_1").status_code == 200
+    assert client.get("/profiles/clerk_1").status_code == 200
+    assert fake_db.calls == [("user_profiles", "select")]
+
+    stats = client.get("/cache/stats").json()["profiles"]
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+@pytest.mark.integration
+def test_update_invalidates_cached_profile(client, fake_db):
+    fake_db.tables["user_profiles"] = [make_profile("clerk_1")]
+    client.get("/profiles/clerk_1")
+    client.put("/profiles/clerk_1", json={"bio": "updated"})
+    r = client.get("/profiles/clerk_1")
+    assert r.json()["bio"] == "updated"
@@ -0,0 +1,219 @@
+import pytest
+
+import services.core.database as database
+from tests.core.conftest import FakeQuery, make_profile
+
+pytestmark = pytest.mark.integration
+
+
+def test_create_profile_new_returns_201(client, fake_db):
+    body = {"clerk_id": "clerk_new", "anonymous_handle": "newbie", "interests": ["art"]}
+    r = client.post("/profiles/", json=body)
+    assert r.status_code == 201
+    assert r.json()["clerk_id"] == "clerk_new"
+    assert fake_db.tables["user_profiles"][0]["anonymous_handle"] == "newbie"
+    # A new sign-up costs exactly one round trip.
+    assert fake_db.calls == [("user_profiles", "upsert")]
+
+
+def test_create_profile_existing_returns_200(client, fake_db):
+    fake_db.tables["user_profiles"] = [make_profile("clerk_1")]
+    r = client.post("/profiles/", json={"clerk_id": "clerk_1", "anonymous_handle": "other"})
+    assert r.status_code == 200
+    assert r.json()["anonymous_handle"] == "handle_clerk_1"
+    assert len(fake_db.tables["user_profiles"]) == 1
+
+
+def test_create_profile_existing_served_from_cache(client, fake_db):
+    fake_db.tables["user_profiles"] = [make_profile("clerk_1")]
+    client.get("/profiles/clerk_1")
+    fake_db.calls.clear()
+
+    r = client.post("/profiles/", json={"clerk_id": "clerk_1", "anonymous_handle": "other"})
+    assert r.status_code == 200
+    assert fake_db.calls == [("user_profiles", "upsert")]
+
+
+def test_create_profile_repeated_signup_is_idempotent(client, fake_db):
+    body = {"clerk_id": "clerk_dup", "anonymous_handle": "dup"}
+    statuses = [client.post("/profiles/", json=body).status_code for _ in range(3)]
+    assert statuses == [201, 200, 200]
+    assert len(fake_db.tables["user_profiles"]) == 1
+
+
+def test_get_profile_found_and_missing(client, fake_db):
+    fake_db.tables["user_profiles"] = [make_profile("clerk_1")]
+    r = client.get("/profiles/clerk_1")
+    assert r.status_code == 200
+    assert r.json()["country_code"] == "ZA"
+
+    r = client.get("/profiles/nobody")
+    assert r.status_code == 404
+    assert r.json()["detail"] == "Profile not found."
+
+
+def test_update_profile_partial(client, fake_db):
+    fake_db.tables["user_profiles"] = [make_profile("clerk_1")]
+    r = client.put("/profiles/clerk_1", json={"country_code": "FR"})
+    assert r.status_code == 200
+    assert r.json()["country_code"] == "FR"
+    assert r.json()["bio"] == "hello"
+
+    r = client.put("/profiles/nobody", json={"country_code": "FR"})
+    assert r.status_code == 404
+
+
+def test_missing_credentials_surface_as_500(monkeypatch):
+    monkeypatch.setattr(database, "supabase", None)
+    monkeypatch.setattr(database, "SUPABASE_URL", None)
+    from fastapi.testclient import TestClient
+    import services.core.main as core_main
+
+    r = TestClient(core_main.app).get("/profiles/clerk_1")
+    assert r.status_code == 500
+    assert r.json()["detail"] == "Supabase client not initialized."
+
+
+@pytest.mark.anyio
+async def test_init_supabase_builds_pooled_client_once(monkeypatch):
+    monkeypatch.setattr(database, "supabase", None)
+    monkeypatch.setattr(database, "SUPABASE_URL", "http://dummy/")
+    monkeypatch.setattr(database, "SUPABASE_KEY", "dummy")
+
+    first = await database.init_supabase()
+    second = await database.get_supabase()
+    assert first is second
+    assert str(first.session.base_url) == "http://dummy/rest/v1/"
+    assert first.session.headers["apiKey"] == "dummy"
+    assert first.session.headers["Authorization"] == "Bearer dummy"
+
+    await database.close_supabase()
+    assert database.supabase is None
+    assert first.session.is_closed
+
+
+def test_batch_lookup_fetches_only_cache_misses(client, fake_db):
+    fake_db.tables["user_profiles"] = [make_profile(f"clerk_{i}") for i in range(4)]
+    client.get("/profiles/clerk_0")
+    fake_db.calls.clear()
+
+    r = client.post("/profiles/batch", json={"clerk_ids": ["clerk_0", "clerk_1", "clerk_2", "clerk_1", "ghost"]})
+    assert r.status_code == 200
+    data = r.json()
+    assert sorted(data["profiles"]) == ["clerk_0", "clerk_1", "clerk_2"]
+    assert data["profiles"]["clerk_2"]["anonymous_handle"] == "handle_clerk_2"
+    assert data["missing"] == ["ghost"]
+    # clerk_0 came from the cache; the misses were fetched with one query.
+    assert fake_db.calls == [("user_profiles", "select")]
+
+    fake_db.calls.clear()
+    client.post("/profiles/batch", json={"clerk_ids": ["clerk_1", "clerk_2"]})
+    assert fake_db.calls == []
+
+
+def test_batch_lookup_validates_size(client, fake_db):
+    assert client.post("/profiles/batch", json={"clerk_ids": []}).status_code == 422
+    too_many = [f"c{i}" for i in range(201)]
+    assert client.post("/profiles/batch", json={"clerk_ids": too_many}).status_code == 422
+
+
+def test_get_profile_returns_etag_and_304_when_unchanged(client, fake_db):
+    fake_db.tables["user_profiles"] = [make_profile("clerk_1")]
+    r = client.get("/profiles/clerk_1")
+    etag = r.headers["ETag"]
+    assert etag.startswith('W/"')
+    fake_db.calls.clear()
+
+    r = client.get("/profiles/clerk_1", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["ETag"] == etag
+    # The tag was checked against the cached row, so no query was made.
+    assert fake_db.calls == []
+
+    r = client.get("/profiles/clerk_1", headers={"If-None-Match": '"stale", ' + etag.removeprefix("W/")})
+    assert r.status_code == 304
+
+
+def test_get_profile_etag_changes_after_update(client, fake_db):
+    fake_db.tables["user_profiles"] = [make_profile("clerk_1")]
+    old_etag = client.get("/profiles/clerk_1").headers["ETag"]
+
+    put = client.put("/profiles/clerk_1", json={"bio": "changed"})
+    new_etag = put.headers["ETag"]
+    assert new_etag != old_etag
+
+    r = client.get("/profiles/clerk_1", headers={"If-None-Match": old_etag})
+    assert r.status_code == 200
+    assert r.json()["bio"] == "changed"
+    assert r.headers["ETag"] == new_etag
+
+
+def test_etag_matches_header_forms():
+    from services.core.main import etag_matches
+
+    assert etag_matches(None, 'W/"a"') is False
+    assert etag_matches("*", 'W/"a"') is True
+    assert etag_matches('"a"', 'W/"a"') is True
+    assert etag_matches('W/"b", W/"c"', 'W/"a"') is False
+
+
+def test_profile_reads_never_return_unselected_columns(client, fake_db):
+    fake_db.tables["user_profiles"] = [make_profile("clerk_1")]
+    body = client.get("/profiles/clerk_1").json()
+    assert "password_hash" not in body and "blocked_users" not in body
+
+    created = client.post("/profiles/", json={"clerk_id": "clerk_2", "anonymous_handle": "two"}).json()
+    assert "password_hash" not in created
+
+
+def test_get_profile_with_fields(client, fake_db):
+    fake_db.tables["user_profiles"] = [make_profile("clerk_1")]
+    r = client.get("/profiles/clerk_1", params={"fields": "anonymous_handle,country_code"})
+    assert r.status_code == 200
+    assert r.json() == {"anonymous_handle": "handle_clerk_1", "country_code": "ZA"}
+
+    summary = client.get("/profiles/clerk_1", params={"fields": "summary"})
+    assert set(summary.json()) == {"clerk_id", "anonymous_handle", "country_code", "age_range"}
+    # Different representations carry different ETags.
+    assert summary.headers["ETag"] != r.headers["ETag"]
+
+    r = client.get("/profiles/clerk_1", params={"fields": "password_hash"})
+    assert r.status_code == 400
+    assert client.get("/profiles/clerk_1", params={"fields": " , "}).status_code == 400
+
+
+def test_batch_lookup_with_fields(client, fake_db):
+    fake_db.tables["user_profiles"] = [make_profile("clerk_1"), make_profile("clerk_2")]
+    r = client.post("/profiles/batch", params={"fields": "anonymous_handle"},
+                    json={"clerk_ids": ["clerk_1", "clerk_2"]})
+    assert r.json()["profiles"] == {
+        "clerk_1": {"anonymous_handle": "handle_clerk_1"},
+        "clerk_2": {"anonymous_handle": "handle_clerk_2"},
+    }
+
+
+def test_import_does_not_load_full_supabase_package():
+    import pathlib
+    import subprocess
+    import sys
+
+    code = (
+        "import sys, services.core.main;"
+        "print(sorted(m for m in ('supabase', 'realtime', 'storage3', 'supabase_auth') if m in sys.modules))"
+    )
+    root = pathlib.Path(database.__file__).resolve().parents[2]
+    out = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_update_profile_leaves_updated_at_to_the_database(client, fake_db, monkeypatch):
+    fake_db.tables["user_profiles"] = [make_profile("clerk_1")]
+    sent = []
+    update = FakeQuery.update
+    monkeypatch.setattr(FakeQuery, "update", lambda self, payload, **k: sent.append(payload) or update(self, payload, **k))
+    r = client.put("/profiles/clerk_1", json={"interests": ["chess"]})
+    assert r.status_code == 200
+    # The app's clock never decides updated_at; the trigger's stamp is returned.
+    assert sent == [{"interests": ["chess"]}]
+    assert r.json()["updated_at"] > "2025-08-16T10:00:00Z"
@@ -0,0 +1,34 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import services.matchmaking.main as mm_main
+from services.matchmaking.candidate_index import candidate_index
+from services.matchmaking.exclusions import exclusion_cache
+from services.matchmaking.leases import match_leases
+from services.matchmaking.recommendations import recommendations
+from tests.matchmaking.fake_supabase import FakeSupabase
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = FakeSupabase()
+    candidate_index.clear()
+    exclusion_cache.clear()
+    match_leases.clear()
+    recommendations.clear()
+    monkeypatch.setattr(mm_main, "supabase", db)
+    yield db
+    candidate_index.clear()
+    exclusion_cache.clear()
+    match_leases.clear()
+    recommendations.clear()
+
+
+@pytest.fixture
+def client():
+    return TestClient(mm_main.app)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
@@ -0,0 +1,201 @@
+"""
+In-memory stand-in for the sync PostgREST client used by the matchmaking
+service. Shared by the matchmaking tests (via conftest) and by
+scripts/matchmaking_benchmark.py, which adds indexed row lookups on top.
+"""
+
+
+class Resp:
+    def __init__(self, data): self.data = data
+
+
+def _split_top_level(expr):
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(expr):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(expr[start:i])
+            start = i + 1
+    parts.append(expr[start:])
+    return parts
+
+
+_COMPARE = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "lt": lambda a, b: a < b,
+    "gt": lambda a, b: a > b,
+    "lte": lambda a, b: a <= b,
+    "gte": lambda a, b: a >= b,
+}
+
+
+def _clause(part):
+    """
+    (predicate, lookup) for one `col.op.value`, `col.in.(x,y)`, `and(...)` or
+    `or(...)` clause. `lookup` is (column, values) for `eq`/`in`, else None.
+    """
+    for logic, combine in (("and(", all), ("or(", any)):
+        if part.startswith(logic):
+            clauses = [_clause(p)[0] for p in _split_top_level(part[len(logic):-1])]
+            return (lambda r: combine(c(r) for c in clauses)), None
+    col, op, val = part.split(".", 2)
+    if op == "in":
+        values = set(val.strip("()").split(","))
+        return (lambda r: str(r.get(col)) in values), (col, values)
+    val = val.strip('"')
+    lookup = (col, {val}) if op == "eq" else None
+    return (lambda r: r.get(col) is not None and _COMPARE[op](str(r.get(col)), val)), lookup
+
+
+def _or_filter(expr):
+    """Supports the PostgREST `or` forms used by the service, including nested `and(...)`."""
+    clauses = [_clause(p)[0] for p in _split_top_level(expr)]
+    return lambda r: any(c(r) for c in clauses)
+
+
+class FakeQuery:
+    """
+    Minimal sync PostgREST query builder over in-memory rows.
+
+    Filters also record hints (`lookups` for equality and `in`, `after` for
+    `gt`) that a subclass can use in `_candidates` to avoid scanning every row.
+    """
+
+    def __init__(self, db, name):
+        self.db, self.name = db, name
+        self.op = "select"
+        self.columns = None
+        self.filters = []
+        self.lookups = []
+        self.after = None
+        self.payload = None
+        self.order_by = []
+        self.limit_to = None
+
+    def select(self, columns="*", **k):
+        self.op = "select"
+        self.columns = None if columns == "*" else columns.split(",")
+        return self
+
+    def _compare(self, col, op, val):
+        self.filters.append(lambda r: r.get(col) is not None and _COMPARE[op](r.get(col), val))
+        return self
+
+    def eq(self, col, val):
+        self.filters.append(lambda r: r.get(col) == val)
+        self.lookups.append((col, {val}))
+        return self
+
+    def neq(self, col, val):
+        self.filters.append(lambda r: r.get(col) != val)
+        return self
+
+    def gt(self, col, val):
+        self.after = (col, val)
+        return self._compare(col, "gt", val)
+
+    def gte(self, col, val):
+        return self._compare(col, "gte", val)
+
+    def lt(self, col, val):
+        return self._compare(col, "lt", val)
+
+    def lte(self, col, val):
+        return self._compare(col, "lte", val)
+
+    def in_(self, col, vals):
+        vals = set(vals)
+        self.filters.append(lambda r: r.get(col) in vals)
+        self.lookups.append((col, vals))
+        return self
+
+    def or_(self, expr):
+        clauses = [_clause(p) for p in _split_top_level(expr)]
+        self.filters.append(lambda r: any(c(r) for c, _ in clauses))
+        if all(lookup is not None for _, lookup in clauses):
+            self.lookups.append(("or", [lookup for _, lookup in clauses]))
+        return self
+
+    def order(self, col, desc=False, **k):
+        self.order_by.append((col, desc))
+        return self
+
+    def limit(self, n):
+        self.limit_to = n
+        return self
+
+    def insert(self, payload):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = "update", payload
+        return self
+
+    def _candidates(self, rows):
+        """(rows that may match, whether they are already in `order_by` order)."""
+        return rows, False
+
+    def execute(self):
+        self.db.calls.append((self.name, self.op))
+        rows = self.db.tables.setdefault(self.name, [])
+        if self.op == "insert":
+            payloads = self.payload if isinstance(self.payload, list) else [self.payload]
+            new = [dict(p, created_at=p.get("created_at", self.db.now())) for p in payloads]
+            rows.extend(new)
+            return Resp([dict(r) for r in new])
+        candidates, presorted = self._candidates(rows)
+        matched = []
+        for r in candidates:
+            if all(f(r) for f in self.filters):
+                matched.append(r)
+                if presorted and self.limit_to is not None and len(matched) >= self.limit_to:
+                    break
+        if self.op == "update":
+            for r in matched:
+                r.update(self.payload)
+            return Resp([dict(r) for r in matched])
+        if not presorted:
+            for col, desc in reversed(self.order_by):
+                matched.sort(key=lambda r: (r.get(col) is None, r.get(col)), reverse=desc)
+        if self.limit_to is not None:
+            matched = matched[:self.limit_to]
+        if self.columns:
+            return Resp([{c: r[c] for c in self.columns if c in r} for r in matched])
+        return Resp([dict(r) for r in matched])
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables = {}
+        self.calls = []
+
+    def now(self):
+        """created_at given to inserted rows."""
+        return "2025-08-16T10:00:00+00:00"
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+def make_profile(user_id, **overrides):
+    profile = {
+        "user_id": user_id,
+        "anonymous_handle": f"handle_{user_id}",
+        "account_status": "active",
+        "age_range": "26-35",
+        "primary_language": "en",
+        "secondary_languages": [],
+        "time_zone": "UTC",
+        "country_code": "ZA",
+        "bio": None,
+        "interests": [],
+        "blocked_users": [],
+        "updated_at": "2025-08-16T10:00:00+00:00",
+    }
+    profile.update(overrides)
+    return profile
@@ -0,0 +1,87 @@
+import pytest
+from fastapi import HTTPException
+
+import services.matchmaking.main as mm_main
+from tests.matchmaking.fake_supabase import make_profile
+
+pytestmark = pytest.mark.integration
+
+
+def request(user_id, **preferences):
+    return mm_main.MatchRequest(user_id=user_id, preferences={"match_type": "one-time", **preferences})
+
+
+def test_round_pairs_waiting_users_with_each_other(fake_db):
+    fake_db.tables["user_profiles"] = [
+        make_profile("a", interests=["chess", "jazz"]),
+        make_profile("b", interests=["chess", "jazz"]),
+        make_profile("c", interests=["surf"]),
+        make_profile("d", interests=["surf"]),
+        make_profile("idle", interests=["chess", "jazz"]),
+    ]
+    outcomes = mm_main.solve_match_round([request(u) for u in ("a", "b", "c", "d")])
+
+    partner = {u: o.penpal_profile["user_id"] for u, o in outcomes.items()}
+    assert partner == {"a": "b", "b": "a", "c": "d", "d": "c"}
+    assert outcomes["a"].match_id == outcomes["b"].match_id
+    assert len(fake_db.tables["match_records"]) == 2
+    assert fake_db.calls.count(("match_records", "insert")) == 1
+
+
+def test_round_falls_back_to_idle_candidates_and_reports_failures(fake_db):
+    fake_db.tables["user_profiles"] = [
+        make_profile("a", primary_language="en"),
+        make_profile("b", primary_language="fr", blocked_users=["idle_fr"]),
+        make_profile("idle_en", primary_language="en"),
+        make_profile("idle_fr", primary_language="fr"),
+    ]
+    outcomes = mm_main.solve_match_round([request("a"), request("b"), request("ghost")])
+
+    assert outcomes["a"].penpal_profile["user_id"] == "idle_en"
+    assert isinstance(outcomes["b"], HTTPException) and outcomes["b"].status_code == 404
+    assert outcomes["ghost"].detail == "User not found"
+
+
+def test_round_respects_match_type_and_previous_partners(fake_db):
+    fake_db.tables["user_profiles"] = [make_profile(u) for u in ("a", "b", "c")]
+    fake_db.tables["match_records"] = [{"user_1_id": "a", "user_2_id": "b", "status": "completed"}]
+
+    outcomes = mm_main.solve_match_round([
+        request("a"), request("b"), request("c", match_type="long-term"),
+    ])
+    # a and b met before and c wants a different match type; with nobody idle
+    # to fall back to, nobody is matched.
+    assert all(isinstance(o, HTTPException) for o in outcomes.values())
+
+
+def test_round_skips_users_without_room_for_another_match(fake_db):
+    fake_db.tables["user_profiles"] = [
+        make_profile("a", max_active_conversations=1),
+        make_profile("b"),
+        make_profile("full", max_active_conversations=1),
+        make_profile("idle"),
+    ]
+    fake_db.tables["match_records"] = [
+        {"match_id": "m1", "user_1_id": "a", "user_2_id": "x", "status": "active"},
+        {"match_id": "m2", "user_1_id": "full", "user_2_id": "y", "status": "active"},
+    ]
+    outcomes = mm_main.solve_match_round([request("a"), request("b")])
+
+    assert outcomes["a"].status_code == 409
+    assert outcomes["b"].penpal_profile["user_id"] == "idle"
+    assert mm_main.match_leases.stats()["leases"] == 0
+    assert mm_main.match_leases.active_count("idle") == 1
+
+
+def test_find_penpal_waits_for_round_in_batch_mode(fake_db, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    fake_db.tables["user_profiles"] = [make_profile("a"), make_profile("b")]
+    monkeypatch.setattr(mm_main.match_batcher, "window_seconds", 0.05)
+    with TestClient(mm_main.app) as client:
+        r = client.post("/matches/find", json={"user_id": "a", "preferences": {"match_type": "one-time"}})
+        assert r.status_code == 200
+        assert r.json()["penpal_profile"]["user_id"] == "b"
+        stats = client.get("/batch/stats").json()
+    assert stats["enabled"] and stats["rounds"] >= 1
+    assert stats["last_round"]["size"] == 1
@@ -0,0 +1,224 @@
+import pytest
+
+from services.matchmaking.candidate_index import candidate_index
+from tests.matchmaking.fake_supabase import make_profile
+
+pytestmark = pytest.mark.integration
+
+
+def find(client, user_id, **preferences):
+    return client.post("/matches/find", json={
+        "user_id": user_id,
+        "preferences": {"match_type": "one-time", **preferences},
+    })
+
+
+def test_find_penpal_matches_within_language_bucket(client, fake_db):
+    fake_db.tables["user_profiles"] = [
+        make_profile("me", primary_language="en"),
+        make_profile("fr_only", primary_language="fr"),
+        make_profile("en_speaker", primary_language="de", secondary_languages=["en"]),
+    ]
+    r = find(client, "me")
+    assert r.status_code == 200
+    assert r.json()["penpal_profile"]["user_id"] == "en_speaker"
+    assert fake_db.tables["match_records"][0]["user_2_id"] == "en_speaker"
+
+
+def test_find_penpal_honours_preferences_and_previous_matches(client, fake_db):
+    fake_db.tables["user_profiles"] = [
+        make_profile("me"),
+        make_profile("old", age_range="18-25"),
+        make_profile("young", age_range="18-25"),
+        make_profile("older", age_range="46+"),
+    ]
+    fake_db.tables["match_records"] = [{"user_1_id": "old", "user_2_id": "me", "status": "completed"}]
+
+    r = find(client, "me", age_ranges=["18-25"])
+    assert r.json()["penpal_profile"]["user_id"] == "young"
+
+    r = find(client, "me", languages=["ja"])
+    assert r.status_code == 404
+    assert r.json()["detail"] == "No penpals available"
+
+
+def test_find_penpal_loads_index_once(client, fake_db):
+    fake_db.tables["user_profiles"] = [make_profile("me"), make_profile("a"), make_profile("b")]
+    find(client, "me")
+    find(client, "a", exclude_previous=False)
+    assert candidate_index.full_loads == 1
+    assert client.get("/index/stats").json()["profiles"] == 3
+
+
+def test_find_penpal_picks_most_compatible_and_records_score(client, fake_db):
+    fake_db.tables["user_profiles"] = [
+        make_profile("me", interests=["music", "chess"]),
+        make_profile("meh", interests=["golf"]),
+        make_profile("best", interests=["music", "chess"]),
+    ]
+    r = find(client, "me")
+    assert r.json()["penpal_profile"]["user_id"] == "best"
+    assert r.json()["compatibility_score"] == 1.0
+    assert fake_db.tables["match_records"][0]["compatibility_score"] == 1.0
+
+    r = client.post("/matches/candidates", params={"k": 5}, json={
+        "user_id": "me", "preferences": {"match_type": "one-time", "exclude_previous": False},
+    })
+    assert [c["user_id"] for c in r.json()] == ["best", "meh"]
+    assert r.json()[1]["compatibility_score"] < 1
+
+
+def test_find_penpal_excludes_blocked_and_caches_previous_partners(client, fake_db):
+    fake_db.tables["user_profiles"] = [
+        make_profile("me", blocked_users=["blocked"]),
+        make_profile("blocked"),
+        make_profile("blocks_me", blocked_users=["me"]),
+        make_profile("a"),
+        make_profile("b"),
+    ]
+    first = find(client, "me", exclude_previous=True).json()["penpal_profile"]["user_id"]
+    second = find(client, "me", exclude_previous=True).json()["penpal_profile"]["user_id"]
+    assert {first, second} == {"a", "b"}
+    assert find(client, "me").status_code == 404
+
+    # One previous-partner query, plus one active-match count load each for
+    # me, a and b; all of them are cached afterwards.
+    match_queries = [c for c in fake_db.calls if c == ("match_records", "select")]
+    assert len(match_queries) == 4
+
+
+def test_find_penpal_unknown_user(client, fake_db):
+    assert find(client, "ghost").status_code == 404
+
+
+def test_find_penpal_honours_preferred_time_zone_distance(client, fake_db):
+    fake_db.tables["user_profiles"] = [
+        make_profile("me", time_zone="Europe/London", preferred_time_zone_distance=3, interests=["art"]),
+        make_profile("tokyo", time_zone="Asia/Tokyo", interests=["art"]),
+        make_profile("cairo", time_zone="Africa/Cairo"),
+    ]
+    r = find(client, "me")
+    assert r.json()["penpal_profile"]["user_id"] == "cairo"
+    record = fake_db.tables["match_records"][0]
+    assert record["time_zone_difference"] == 2
+
+    # Tokyo is the only one left, but it is too far away.
+    assert find(client, "me").status_code == 404
+
+
+def test_similar_interests_follows_profile_updates(client, fake_db, monkeypatch):
+    interests = ["music", "hiking", "chess", "cooking", "travel", "film"]
+    fake_db.tables["user_profiles"] = [
+        make_profile("me", interests=interests),
+        make_profile("twin", interests=interests),
+        make_profile("blocker", interests=interests, blocked_users=["me"]),
+        make_profile("other", interests=["golf"]),
+    ]
+    r = client.get("/matches/similar/me")
+    assert r.status_code == 200
+    assert r.json() == [{"user_id": "twin", "interest_similarity": 1.0}]
+
+    # An interest change is picked up by the next incremental refresh.
+    monkeypatch.setattr(candidate_index, "refresh_interval", 0)
+    fake_db.tables["user_profiles"][3].update(interests=interests, updated_at="2025-08-17T10:00:00+00:00")
+    users = [s["user_id"] for s in client.get("/matches/similar/me").json()]
+    assert sorted(users) == ["other", "twin"]
+    assert client.get("/matches/similar/nobody").status_code == 404
+
+
+def test_find_penpal_enforces_max_active_conversations(client, fake_db):
+    fake_db.tables["user_profiles"] = [
+        make_profile("me", max_active_conversations=1, interests=["art"]),
+        make_profile("full", max_active_conversations=1, interests=["art"]),
+        make_profile("free"),
+    ]
+    fake_db.tables["match_records"] = [
+        {"match_id": "m1", "user_1_id": "full", "user_2_id": "x", "status": "active"},
+    ]
+    # "full" shares an interest with me but has no room for another match.
+    r = find(client, "me")
+    assert r.json()["penpal_profile"]["user_id"] == "free"
+
+    r = find(client, "me")
+    assert r.status_code == 409
+    assert r.json()["detail"] == "Maximum active conversations reached"
+
+    match_id = fake_db.tables["match_records"][-1]["match_id"]
+    assert client.put(f"/matches/{match_id}/complete").status_code == 200
+    assert find(client, "me").status_code == 404  # room again, but nobody left
+
+
+def test_find_penpal_in_sharded_mode(client, fake_db, monkeypatch):
+    from services.matchmaking import main as mm_main
+    from services.matchmaking.sharding import ShardedIndex
+
+    sharded = ShardedIndex(shards=2)
+    monkeypatch.setattr(mm_main, "sharded_index", sharded)
+    fake_db.tables["user_profiles"] = [
+        make_profile("me", primary_language="en", secondary_languages=["es"]),
+        make_profile("fr_only", primary_language="fr"),
+        make_profile("es_speaker", primary_language="es"),
+        make_profile("en_speaker", primary_language="de", secondary_languages=["en"]),
+    ]
+    try:
+        first = find(client, "me", languages=["en", "es"]).json()["penpal_profile"]["user_id"]
+        second = find(client, "me", languages=["en", "es"]).json()["penpal_profile"]["user_id"]
+        assert {first, second} == {"es_speaker", "en_speaker"}
+        assert find(client, "me", languages=["en", "es"]).status_code == 404
+        assert client.get("/index/stats").json()["sharded"]["shards"] == 2
+    finally:
+        sharded.stop()
+
+
+def test_find_penpal_serves_precomputed_candidates(client, fake_db, monkeypatch):
+    from services.matchmaking import main as mm_main
+    from services.matchmaking.recommendations import recommendations
+
+    monkeypatch.setattr(recommendations, "refresh_interval", 60)
+    fake_db.tables["user_profiles"] = [
+        make_profile("me", interests=["music"], max_active_conversations=5),
+        make_profile("best", interests=["music"]),
+    ] + [make_profile(f"filler{i}", primary_language="de", secondary_languages=["en"]) for i in range(6)]
+    assert mm_main.refresh_recommendations() == 8
+    assert mm_main.refresh_recommendations() == 0  # nothing changed
+
+    assert find(client, "me").json()["penpal_profile"]["user_id"] == "best"
+    assert recommendations.hits == 1
+    # The new match marks both users; "best" is now a previous partner and is skipped.
+    assert mm_main.refresh_recommendations() == 2
+    assert find(client, "me").json()["penpal_profile"]["user_id"] != "best"
+    assert recommendations.hits == 2
+
+    # A heartbeat-style update leaves the list usable.
+    fake_db.tables["user_profiles"][0]["last_active"] = "2025-08-17T00:00:00+00:00"
+    assert find(client, "me").status_code == 200
+    assert recommendations.hits == 3
+
+    # Explicit preferences, or a matching column changed since, are scored live.
+    assert find(client, "me", languages=["en"]).status_code == 200
+    fake_db.tables["user_profiles"][0].update(interests=["knitting"], updated_at="2025-08-17T00:00:00+00:00")
+    assert find(client, "me").status_code == 200
+    assert recommendations.hits == 3
+
+
+@pytest.mark.anyio
+async def test_ranking_runs_off_the_event_loop(fake_db, monkeypatch):
+    import threading
+
+    import services.matchmaking.main as mm_main
+
+    loop_thread = threading.get_ident()
+    threads = []
+    rank_for_request = mm_main.rank_for_request
+
+    def recording(*args, **kwargs):
+        threads.append(threading.get_ident())
+        return rank_for_request(*args, **kwargs)
+
+    monkeypatch.setattr(mm_main, "rank_for_request", recording)
+    fake_db.tables["user_profiles"] = [make_profile("me"), make_profile("other")]
+    request = mm_main.MatchRequest(user_id="me", preferences={"match_type": "one-time"})
+
+    assert [c.user_id for c in await mm_main.preview_candidates(request, k=5)] == ["other"]
+    assert (await mm_main.find_penpal(request)).penpal_profile["user_id"] == "other"
+    assert len(threads) == 2 and loop_thread not in threads
@@ -0,0 +1,71 @@
+import base64
+
+import pytest
+
+pytestmark = pytest.mark.integration
+
+
+def match_id(i):
+    return f"00000000-0000-4000-8000-{i:012d}"
+
+
+def match(i, **overrides):
+    record = {
+        "match_id": match_id(i),
+        "user_1_id": "me" if i % 2 else f"p{i}",
+        "user_2_id": f"p{i}" if i % 2 else "me",
+        "match_type": "one-time",
+        "status": "completed",
+        "compatibility_score": 0.5,
+        "conversation_thread_id": f"t{i}",
+        "user_1_rating": 5,
+        # Pairs of matches share a timestamp, so the match_id tie-break matters.
+        "created_at": f"2025-08-{10 + i // 2:02d}T10:00:00+00:00",
+    }
+    record.update(overrides)
+    return record
+
+
+def test_get_matches_pages_newest_first_with_keyset_cursor(client, fake_db):
+    fake_db.tables["match_records"] = [match(i) for i in range(7)] + [match(99, user_1_id="x", user_2_id="y")]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/matches/me", params=params).json()
+        seen += [m["match_id"] for m in body["matches"]]
+        if not body["has_more"]:
+            assert body["next_cursor"] is None
+            break
+        cursor = body["next_cursor"]
+    assert seen == [match_id(i) for i in (6, 5, 4, 3, 2, 1, 0)]
+
+
+@pytest.mark.parametrize("raw", [
+    '2025-08-10T10:00:00+00:00|x),user_1_id.neq.me',
+    '2025-08-10T10:00:00+00:00",or(status.eq.active|00000000-0000-4000-8000-000000000001',
+    "|00000000-0000-4000-8000-000000000001",
+    "2025-08-10T10:00:00+00:00|",
+])
+def test_get_matches_rejects_crafted_cursors(client, fake_db, raw):
+    fake_db.tables["match_records"] = [match(1)]
+    cursor = base64.urlsafe_b64encode(raw.encode()).decode()
+    assert client.get("/matches/me", params={"cursor": cursor}).status_code == 400
+
+
+def test_get_matches_filters_and_projection(client, fake_db):
+    fake_db.tables["match_records"] = [
+        match(1, status="active"),
+        match(2, match_type="long-term"),
+        match(3),
+    ]
+    body = client.get("/matches/me", params={"status": "completed", "match_type": "one-time"}).json()
+    assert [m["match_id"] for m in body["matches"]] == [match_id(3)]
+    assert "user_1_rating" not in body["matches"][0]
+
+    r = client.get("/matches/me", params={"fields": "status,user_1_rating"})
+    # The keyset columns are always included.
+    assert set(r.json()["matches"][0]) == {"status", "user_1_rating", "created_at", "match_id"}
+    assert client.get("/matches/me", params={"fields": "password_hash"}).status_code == 400
+    assert client.get("/matches/me", params={"cursor": "!!!"}).status_code == 400
+    assert client.get("/matches/me", params={"status": "bogus"}).status_code == 422
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from services.matchmaking.batching import MatchBatcher, assign_pairs
+
+pytestmark = pytest.mark.unit
+
+
+def test_assign_pairs_matches_each_user_at_most_once():
+    edges = [(0.9, "a", "b"), (0.8, "a", "c"), (0.85, "c", "d"), (0.7, "b", "d"), (0.5, "e", "e")]
+    pairs = assign_pairs(edges)
+    assert pairs == [(0.9, "a", "b"), (0.85, "c", "d")]
+
+
+def test_assign_pairs_prefers_higher_total_over_first_come():
+    # A greedy per-request matcher serving "a" first would take "b" and leave "c" alone.
+    edges = [(0.6, "a", "b"), (0.9, "c", "b"), (0.5, "a", "d")]
+    assert sum(e[0] for e in assign_pairs(edges)) == pytest.approx(1.4)
+
+
+@pytest.mark.anyio
+async def test_batcher_round_resolves_each_request_and_records_metrics():
+    rounds = []
+
+    def solve(requests):
+        rounds.append(list(requests))
+        return {"a": "match-a", "b": HTTPException(404, "nobody"), "a2": "match-a2"}
+
+    batcher = MatchBatcher(solve, window_seconds=1)
+    results = [asyncio.create_task(batcher.submit(key, key)) for key in ("a", "b", "a2")]
+    await asyncio.sleep(0)
+    assert batcher.pending() == 3
+
+    assert await batcher.run_round() == 3
+    assert await results[0] == "match-a"
+    assert await results[2] == "match-a2"
+    with pytest.raises(HTTPException):
+        await results[1]
+    assert rounds == [["a", "b", "a2"]]
+
+    stats = batcher.stats()
+    assert stats["rounds"] == 1 and stats["matched"] == 2
+    assert stats["last_round"]["size"] == 3
+    assert await batcher.run_round() == 0
+
+
+@pytest.mark.anyio
+async def test_batcher_failed_round_fails_waiting_requests():
+    def solve(requests):
+        raise RuntimeError("db down")
+
+    batcher = MatchBatcher(solve, window_seconds=1)
+    task = asyncio.create_task(batcher.submit("a", "a"))
+    await asyncio.sleep(0)
+    await batcher.run_round()
+    with pytest.raises(RuntimeError):
+        await task
+    assert batcher.failed_rounds == 1
@@ -0,0 +1,103 @@
+import pytest
+
+from services.matchmaking.candidate_index import CandidateIndex
+from tests.matchmaking.fake_supabase import FakeSupabase, make_profile
+
+pytestmark = pytest.mark.unit
+
+
+def ids(profiles):
+    return {p["user_id"] for p in profiles}
+
+
+def test_candidates_use_language_and_age_buckets():
+    index = CandidateIndex()
+    index.upsert(make_profile("a", primary_language="en", age_range="18-25"))
+    index.upsert(make_profile("b", primary_language="es", secondary_languages=["en"], age_range="26-35"))
+    index.upsert(make_profile("c", primary_language="fr", age_range="18-25"))
+
+    assert ids(index.candidates(["en"])) == {"a", "b"}
+    assert ids(index.candidates(["en"], ["18-25"])) == {"a"}
+    assert ids(index.candidates(["en", "fr"], ["18-25"], exclude={"a"})) == {"c"}
+    assert ids(index.candidates(["en"], country_codes=["US"])) == set()
+    assert index.candidates(["de"]) == []
+
+
+def test_upsert_moves_profile_between_buckets_and_drops_inactive():
+    index = CandidateIndex()
+    index.upsert(make_profile("a", primary_language="en"))
+    index.upsert(make_profile("a", primary_language="es"))
+    assert ids(index.candidates(["en"])) == set()
+    assert ids(index.candidates(["es"])) == {"a"}
+
+    index.upsert(make_profile("a", primary_language="es", account_status="suspended"))
+    assert "a" not in index
+    assert index.stats()["languages"] == 0
+
+
+def test_load_pages_active_profiles_and_refresh_reads_only_changes():
+    db = FakeSupabase()
+    db.tables["user_profiles"] = [
+        make_profile(f"u{i}", updated_at=f"2025-08-16T10:00:0{i}+00:00") for i in range(5)
+    ] + [make_profile("banned", account_status="banned")]
+    now = [0.0]
+    index = CandidateIndex(refresh_interval=30, page_size=2, clock=lambda: now[0])
+
+    index.ensure_fresh(db)
+    assert len(index) == 5
+    assert len(db.calls) == 3  # pages of 2, 2, 1
+
+    db.tables["user_profiles"][0].update(primary_language="es", updated_at="2025-08-16T11:00:00+00:00")
+    db.tables["user_profiles"][1].update(account_status="deleted", updated_at="2025-08-16T11:00:01+00:00")
+
+    index.ensure_fresh(db)  # not due yet
+    assert len(db.calls) == 3
+
+    now[0] = 31
+    index.ensure_fresh(db)
+    assert index.refreshes == 1
+    assert ids(index.candidates(["es"])) == {"u0"}
+    assert "u1" not in index
+    assert index.refresh(db) == 0
+
+
+def test_refresh_pages_ties_and_late_rows_without_skipping():
+    db = FakeSupabase()
+    db.tables["user_profiles"] = [make_profile("u0", updated_at="2025-08-16T10:00:00+00:00")]
+    now = [0.0]
+    index = CandidateIndex(refresh_interval=0, page_size=2, clock=lambda: now[0])
+    index.load(db)
+
+    # Three rows share the watermark's timestamp, so they span pages.
+    db.tables["user_profiles"] += [
+        make_profile(f"t{i}", updated_at="2025-08-16T10:00:00+00:00") for i in range(3)
+    ]
+    assert index.refresh(db) == 3
+    assert {"t0", "t1", "t2"} <= set(index.user_ids())
+
+    # A later stamp, then a row committed late with an earlier stamp (within the overlap).
+    db.tables["user_profiles"].append(make_profile("new", updated_at="2025-08-16T10:00:10+00:00"))
+    assert index.refresh(db) == 1
+    db.tables["user_profiles"].append(make_profile("late", updated_at="2025-08-16T10:00:08+00:00"))
+    assert index.refresh(db) == 1
+    assert "late" in index
+    # Rows already applied are re-read in the overlap but not applied again.
+    assert index.refresh(db) == 0
+
+
+def test_rank_skips_only_checked_candidates_and_ranks_more_when_crowded():
+    index = CandidateIndex()
+    for i in range(20):
+        index.upsert(make_profile(f"u{i:02d}", interests=["music"] if i < 6 else ["golf"]))
+    user = make_profile("me", interests=["music"])
+    checked = []
+
+    def busy(uid):
+        checked.append(uid)
+        return uid in {"u00", "u01", "u02", "u03", "u04"}
+
+    ranked, available = index.rank(user, ["en"], [], [], None, [], 2, skip=busy)
+    assert [c.profile["user_id"] for c in ranked][:1] == ["u05"]
+    assert len(ranked) == 2 and available == 20
+    # Only the top of the ranking was checked, not the whole pool.
+    assert len(checked) < 20
@@ -0,0 +1,59 @@
+import pytest
+
+from services.matchmaking.exclusions import BloomFilter, ExclusionCache, PartnerSet, is_excluded
+
+pytestmark = pytest.mark.unit
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(capacity=1000)
+    for i in range(1000):
+        bloom.add(f"user-{i}")
+    assert all(f"user-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300  # target is 1%
+
+
+def test_partner_set_switches_to_bloom_past_threshold():
+    partners = PartnerSet((f"p{i}" for i in range(3)), bloom_threshold=3)
+    assert not partners.is_bloom
+    partners.add("p3")
+    assert partners.is_bloom
+    assert all(f"p{i}" in partners for i in range(4))
+    assert len(partners) == 4
+
+
+def test_cache_loads_once_and_applies_new_matches():
+    now = [0.0]
+    cache = ExclusionCache(ttl_seconds=60, clock=lambda: now[0])
+    loads = []
+
+    def load():
+        loads.append(1)
+        return ["a"]
+
+    assert "a" in cache.partners("me", load)
+    cache.record_match("me", "b")
+    assert "b" in cache.partners("me", load)
+    assert len(loads) == 1
+    assert cache.stats()["hits"] == 1
+
+    now[0] = 61
+    assert "b" not in cache.partners("me", load)  # reloaded from the database
+    assert len(loads) == 2
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ExclusionCache(max_entries=1)
+    cache.partners("a", list)
+    cache.partners("b", list)
+    assert cache.stats()["size"] == 1
+
+
+def test_is_excluded_checks_partners_and_blocks_both_ways():
+    partners = PartnerSet(["old"])
+    assert is_excluded({"user_id": "old"}, "me", partners, set())
+    assert not is_excluded({"user_id": "old"}, "me", None, set())
+    assert is_excluded({"user_id": "x"}, "me", None, {"x"})
+    assert is_excluded({"user_id": "x", "blocked_users": ["me"]}, "me", None, set())
+    assert not is_excluded({"user_id": "x", "blocked_users": None}, "me", partners, set())
@@ -0,0 +1,46 @@
+import pytest
+
+from services.matchmaking.interest_index import InterestIndex
+
+pytestmark = pytest.mark.unit
+
+
+def test_signature_estimates_jaccard_similarity():
+    index = InterestIndex(num_perm=256, bands=32)
+    a = [f"topic{i}" for i in range(10)]
+    b = [f"topic{i}" for i in range(5, 15)]  # 5 shared of 15: 0.33
+    agreement = (index.signature(a) == index.signature(b)).mean()
+    assert abs(agreement - 1 / 3) < 0.12
+    assert (index.signature(["Music ", "art"]) == index.signature(["art", "music"])).all()
+    assert index.signature([]) is None
+
+
+def test_query_finds_similar_interest_sets_only():
+    index = InterestIndex()
+    shared = ["music", "hiking", "chess", "cooking", "travel", "film", "poetry", "jazz"]
+    index.upsert("twin", shared)
+    index.upsert("close", shared[:7] + ["surfing"])
+    index.upsert("other", ["golf", "cars", "fishing"])
+    index.upsert("blank", [])
+
+    results = index.query(shared, k=5)
+    assert [uid for uid, _ in results][:1] == ["twin"]
+    assert results[0][1] == 1.0
+    assert "other" not in dict(results)
+    assert "blank" not in index
+    assert index.similar("twin", exclude=["close"]) == []
+
+
+def test_upsert_is_incremental():
+    index = InterestIndex()
+    assert index.upsert("u1", ["music", "art"]) is True
+    assert index.upsert("u1", ["Art", "music"]) is False
+    assert index.updates == 1
+
+    index.upsert("u2", ["music", "art"])
+    assert index.similar("u2") == [("u1", 1.0)]
+    index.upsert("u1", ["golf"])
+    assert index.similar("u2") == []
+    index.remove("u1")
+    assert len(index) == 1
+    assert index.stats()["buckets"] == index.bands
@@ -0,0 +1,116 @@
+import threading
+
+import pytest
+
+from services.matchmaking.leases import CandidateLeases, max_active
+
+pytestmark = pytest.mark.unit
+
+
+def counts(**known):
+    return lambda user_ids: {u: known.get(u, 0) for u in user_ids}
+
+
+def test_reserve_is_exclusive_until_commit_or_release():
+    leases = CandidateLeases()
+    first = leases.reserve({"a": 3, "b": 3}, counts())
+    assert first is not None
+    assert leases.reserve({"b": 3}, counts()) is None
+    assert leases.reserve({"c": 3, "a": 3}, counts()) is None
+    # All or nothing: c was not leased by the failed attempt.
+    assert leases.reserve({"c": 3}, counts()) is not None
+    assert not any(leases.is_available(u) for u in "abc")
+    assert leases.is_available("d")
+
+    leases.release(first)
+    assert leases.active_count("a") == 0
+    second = leases.reserve({"a": 3}, counts())
+    leases.commit(second)
+    assert leases.active_count("a") == 1
+    # Ending a lease twice changes nothing.
+    leases.commit(second)
+    assert leases.active_count("a") == 1
+
+
+def test_active_count_limit_and_completion():
+    leases = CandidateLeases()
+    assert leases.reserve({"a": 2}, counts(a=2)) is None
+    assert not leases.is_available("a")
+    leases.match_completed(["a", "z"])
+    assert leases.active_count("a") == 1
+    assert leases.is_available("a")
+
+    lease = leases.reserve({"a": 2}, counts())
+    leases.commit(lease)
+    assert leases.active_count("a") == 2
+    assert not leases.is_available("a")
+    assert max_active({}) == 3 and max_active({"max_active_conversations": 5}) == 5
+
+
+def test_leases_and_counts_expire():
+    now = [0.0]
+    leases = CandidateLeases(ttl_seconds=10, count_ttl_seconds=60, clock=lambda: now[0])
+    loads = []
+
+    def load(user_ids):
+        loads.append(list(user_ids))
+        return {u: 0 for u in user_ids}
+
+    assert leases.reserve({"a": 1}, load) is not None
+    now[0] = 11
+    assert leases.reserve({"a": 1}, load) is not None
+    assert loads == [["a"]]
+    now[0] = 100
+    # Expired entries are pruned on a schedule, not only when the cache is large.
+    assert leases.reserve({"b": 1}, load) is not None
+    assert leases.stats()["cached_counts"] == 1
+
+
+def test_concurrent_reservations_never_double_book():
+    leases = CandidateLeases()
+    wins = []
+    barrier = threading.Barrier(8)
+
+    def worker(i):
+        barrier.wait()
+        lease = leases.reserve({f"requester{i}": 3, "popular": 3}, counts())
+        if lease is not None:
+            wins.append(i)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(wins) == 1
+
+
+def test_prune_keeps_a_lease_written_while_it_waits_for_the_lock():
+    now = [0.0]
+    leases = CandidateLeases(ttl_seconds=10, stripes=1, clock=lambda: now[0])
+    leases.commit(leases.reserve({"a": 3}, counts()))
+    leases.reserve({"b": 3}, counts())
+    now[0] = 100  # both expired
+
+    stripe = leases._locks[0]
+    waiting = threading.Event()
+
+    class SignallingLock:
+        def __enter__(self):
+            waiting.set()
+            return stripe.__enter__()
+
+        def __exit__(self, *exc):
+            return stripe.__exit__(*exc)
+
+    leases._locks = [SignallingLock()]
+    with stripe:
+        pruner = threading.Thread(target=leases.prune)
+        pruner.start()
+        assert waiting.wait(5)
+        # A reservation lands after prune saw "b" as expired.
+        leases._leases["b"] = ("fresh", now[0] + 10)
+    pruner.join()
+    leases._locks = [stripe]
+    assert leases._leases == {"b": ("fresh", 110.0)}
+    assert leases.stats()["cached_counts"] == 0
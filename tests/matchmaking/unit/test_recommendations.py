@@ -0,0 +1,76 @@
+import pytest
+
+from services.matchmaking.candidate_index import profile_version
+from services.matchmaking.recommendations import RecommendationCache
+from services.matchmaking.scoring import ScoredCandidate
+from tests.matchmaking.fake_supabase import make_profile
+
+pytestmark = pytest.mark.unit
+
+
+def profile(user_id, tag="v1", **overrides):
+    """A profile whose matching columns differ per `tag`."""
+    return make_profile(user_id, interests=[tag], max_active_conversations=2, **overrides)
+
+
+def version(tag):
+    return profile_version(profile("any", tag))
+
+
+def scored(user_id, score, tag="v1"):
+    return ScoredCandidate(profile(user_id, tag), score, 0)
+
+
+def ids(ranked):
+    return [c.profile["user_id"] for c in ranked]
+
+
+def test_get_skips_changed_and_excluded_candidates():
+    cache = RecommendationCache(refresh_interval=60)
+    me = profile("me")
+    cache.store(me, [scored("a", 0.9), scored("b", 0.8), scored("c", 0.7), scored("d", 0.6)])
+    versions = {"a": version("v1"), "b": version("v2"), "c": version("v1"), "d": version("v1")}
+
+    ranked = cache.get(me, 2, versions.get, lambda uid: uid == "c")
+    assert ids(ranked) == ["a", "d"]
+    assert ranked[0].score == 0.9
+    assert ranked[0].profile == {"user_id": "a", "max_active_conversations": 2}
+
+    # Not enough unchanged candidates left, or the requester changed: score live.
+    assert cache.get(me, 3, versions.get, lambda uid: uid == "c") is None
+    assert cache.get(profile("me", "v2"), 1, versions.get, lambda uid: False) is None
+    assert cache.get(make_profile("other"), 1, versions.get, lambda uid: False) is None
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_due_orders_changed_then_missing_then_expired_and_drops_gone_users():
+    now = [0.0]
+    cache = RecommendationCache(refresh_interval=60, max_age_seconds=100, max_users_per_run=10, clock=lambda: now[0])
+    versions = {uid: version("v1") for uid in ("fresh", "old", "edited", "matched", "gone")}
+    for uid in versions:
+        cache.store(profile(uid), [])
+        now[0] += 10
+    versions.pop("gone")
+    versions["edited"] = version("v2")
+    versions["new"] = version("v1")
+    cache.mark_changed(["matched"])
+
+    assert cache.due(list(versions), versions.get) == ["edited", "matched", "new"]
+    assert len(cache) == 4
+
+    now[0] = 110  # "fresh" was computed at 0, "old" at 10
+    assert cache.due(list(versions), versions.get)[3:] == ["fresh", "old"]
+    cache.max_users_per_run = 2
+    assert cache.due(list(versions), versions.get) == ["edited", "matched"]
+
+    cache.store(profile("matched"), [])
+    assert "matched" not in cache.due(list(versions), versions.get)
+
+
+def test_heartbeats_do_not_make_a_list_stale():
+    cache = RecommendationCache(refresh_interval=60)
+    cache.store(profile("me"), [scored("a", 0.9)])
+    versions = {"a": version("v1")}
+    active = profile("me", updated_at="2025-08-17T00:00:00+00:00", last_active="2025-08-17T00:00:00+00:00")
+    assert ids(cache.get(active, 1, versions.get, lambda uid: False)) == ["a"]
+    assert version("v1") == profile_version(profile("a", reported_count=4))
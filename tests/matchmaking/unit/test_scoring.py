@@ -0,0 +1,85 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from services.matchmaking import scoring
+from tests.matchmaking.fake_supabase import make_profile
+
+pytestmark = pytest.mark.unit
+
+# A date without DST in either hemisphere's edge cases used below.
+AT = datetime(2025, 1, 15, 12, 0, tzinfo=timezone.utc)
+
+
+def rank(user, candidates, **kw):
+    profiles = {c["user_id"]: c for c in candidates}
+    pool = scoring.CandidatePool.from_profiles(candidates)
+    return [
+        scoring.ScoredCandidate(profiles[uid], score, hours)
+        for uid, score, hours in scoring.rank_pool(user, pool, at=AT, **kw)
+    ]
+
+
+def test_identical_profile_scores_one():
+    user = make_profile("me", secondary_languages=["fr"], interests=["music", "hiking"], time_zone="Europe/Paris")
+    twin = dict(user, user_id="twin")
+    [best] = rank(user, [twin], k=1)
+    assert best.score == 1.0
+    assert best.time_zone_difference == 0
+
+
+def test_ranking_orders_by_weighted_components():
+    user = make_profile("me", interests=["music", "art"], age_range="26-35", time_zone="Africa/Johannesburg")
+    candidates = [
+        make_profile("far", interests=["music", "art"], time_zone="Pacific/Auckland", age_range="46+"),
+        make_profile("close", interests=["music", "art"], time_zone="Europe/Berlin"),
+        make_profile("no_overlap", interests=["golf"], time_zone="Europe/Berlin"),
+    ]
+    ranked = rank(user, candidates, k=3)
+    # Shared interests outweigh a distant time zone and age range.
+    assert [c.profile["user_id"] for c in ranked] == ["close", "far", "no_overlap"]
+    assert ranked[0].time_zone_difference == 1
+    assert ranked[1].time_zone_difference == 11
+    assert all(0 <= c.score <= 1 for c in ranked)
+
+
+def test_preferred_languages_count_as_shared():
+    user = make_profile("me", primary_language="en", secondary_languages=["de"])
+    candidate = make_profile("c", primary_language="en", secondary_languages=["ja"])
+    without = rank(user, [candidate], k=1)[0].score
+    with_pref = rank(user, [candidate], preferred_languages=["ja"], k=1)[0].score
+    assert with_pref > without
+
+
+def test_top_k_and_unknown_values():
+    user = make_profile("me", age_range=None, time_zone="Not/AZone")
+    candidates = [make_profile(f"c{i}", interests=[f"i{i}"]) for i in range(20)]
+    ranked = rank(user, candidates, k=5)
+    assert len(ranked) == 5
+    assert rank(user, [], k=5) == []
+
+
+def test_bit_vocabulary_gives_each_value_its_own_bit_until_full():
+    vocab = scoring.BitVocabulary(words=2)
+    masks = [vocab.mask([f"v{i}"]) for i in range(128)]
+    assert masks[0].tolist() == [1, 0] and masks[127].tolist() == [0, 1 << 63]
+    assert len({tuple(m) for m in masks}) == 128
+    assert (vocab.mask(["V1", " v1 "]) == masks[1]).all()
+
+    # Past capacity, values get a stable hashed bit and are not remembered.
+    extra = vocab.mask(["v128"])
+    assert int(sum(bin(int(w)).count("1") for w in extra)) == 1
+    assert (vocab.mask(["v128"]) == extra).all()
+    assert len(vocab) == 128
+
+
+def test_interests_beyond_64_distinct_values_do_not_overlap():
+    # At least 64 other interests are encoded before "knitting".
+    filler = [make_profile(f"f{i}", interests=[f"interest{i}"]) for i in range(63)]
+    user = make_profile("me", interests=["music"], time_zone="Europe/Paris")
+    knitter = make_profile("knitter", interests=["knitting"], time_zone="Europe/Paris")
+    fan = make_profile("fan", interests=["music"], time_zone="Europe/Paris")
+    scored = {c.profile["user_id"]: c.score for c in rank(user, [fan, *filler, knitter], k=100)}
+    assert scored["fan"] == 1.0
+    # Only the language, age and time zone components: no shared interest.
+    assert scored["knitter"] == pytest.approx(1 - scoring.INTEREST_WEIGHT)
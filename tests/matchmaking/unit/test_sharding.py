@@ -0,0 +1,80 @@
+import pytest
+
+from services.matchmaking.candidate_index import CandidateIndex
+from services.matchmaking.exclusions import PartnerSet
+from services.matchmaking.sharding import ShardedIndex, shard_for
+from tests.matchmaking.fake_supabase import FakeSupabase, make_profile
+
+pytestmark = pytest.mark.unit
+
+LANGUAGES = ["en", "es", "fr", "de", "pt", "zh"]
+
+
+def population():
+    profiles = []
+    for i in range(60):
+        primary = LANGUAGES[i % len(LANGUAGES)]
+        secondary = [LANGUAGES[(i * 7) % len(LANGUAGES)]] if i % 3 == 0 else []
+        profiles.append(make_profile(
+            f"u{i:02d}",
+            primary_language=primary,
+            secondary_languages=secondary,
+            age_range="18-25" if i % 2 else "26-35",
+            interests=["music", "art", "chess", "hiking"][: 1 + i % 4],
+            updated_at=f"2025-08-16T10:00:{i:02d}+00:00",
+        ))
+    return profiles
+
+
+def ranked_ids(ranked):
+    return [(c.profile["user_id"], c.score) for c in ranked]
+
+
+def test_shard_for_is_stable_and_case_insensitive():
+    assert shard_for("en", 4) == shard_for(" EN ", 4)
+    assert all(0 <= shard_for(language, 3) < 3 for language in LANGUAGES)
+
+
+def test_sharded_rank_matches_single_index():
+    db = FakeSupabase()
+    db.tables["user_profiles"] = population()
+    single = CandidateIndex(page_size=16)
+    single.ensure_fresh(db)
+    sharded = ShardedIndex(shards=2, page_size=16)
+    try:
+        sharded.ensure_fresh(db)
+        user = make_profile("me", primary_language="en", secondary_languages=["fr"], interests=["music", "art"])
+        for languages, age_ranges in ((["en"], []), (["en", "fr", "zh"], ["18-25"]), (LANGUAGES, [])):
+            args = (user, languages, age_ranges, ["en"], PartnerSet(["u00"]), ["u06"], 5)
+            expected, _ = single.rank(*args)
+            merged, available = sharded.rank(*args)
+            # Equal scores may come back in a different order, so compare scores.
+            assert [c.score for c in merged] == [c.score for c in expected]
+            everyone = dict(ranked_ids(single.rank(*args[:-1], 100)[0]))
+            assert all(everyone[uid] == score for uid, score in ranked_ids(merged))
+            assert available > 0
+
+        assert sharded.rank(user, ["xx"], [], [], None, [], 5) == ([], 0)
+        assert sharded.stats()["users"] == 60
+    finally:
+        sharded.stop()
+
+
+def test_upsert_moves_user_between_shards():
+    english, spanish = "en", next(lang for lang in LANGUAGES if shard_for(lang, 2) != shard_for("en", 2))
+    sharded = ShardedIndex(shards=2)
+    try:
+        sharded.load(FakeSupabase())
+        user = make_profile("me")
+        sharded.upsert(make_profile("a", primary_language=english))
+        assert ranked_ids(sharded.rank(user, [english], [], [], None, [], 5)[0])[0][0] == "a"
+
+        sharded.upsert(make_profile("a", primary_language=spanish))
+        assert sharded.rank(user, [english], [], [], None, [], 5)[0] == []
+        assert [c.profile["user_id"] for c in sharded.rank(user, [spanish], [], [], None, [], 5)[0]] == ["a"]
+
+        sharded.upsert(make_profile("a", primary_language=spanish, account_status="suspended"))
+        assert sharded.rank(user, [spanish], [], [], None, [], 5)[0] == []
+        assert sum(s["profiles"] for s in sharded.stats()["per_shard"]) == 0
+    finally:
+        sharded.stop()
@@ -0,0 +1,50 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from services.matchmaking.timezones import TimeZoneTable, minutes_to_hours, utc_offset_minutes
+
+pytestmark = pytest.mark.unit
+
+
+def test_table_covers_every_iana_zone():
+    table = TimeZoneTable()
+    assert len(table) > 400
+    assert table.code(None) == 0
+    assert table.code("Not/AZone") == 0
+    offsets = table.offsets(datetime(2025, 1, 15, tzinfo=timezone.utc))
+    assert offsets.dtype.name == "int16"
+    assert len(offsets) == len(table) + 1
+    for zone in ("Asia/Kolkata", "America/New_York", "Pacific/Chatham", "UTC"):
+        at = datetime(2025, 1, 15, tzinfo=timezone.utc)
+        assert offsets[table.code(zone)] == utc_offset_minutes(zone, at)
+
+
+def test_prepared_schedule_switches_windows_at_each_transition():
+    table = TimeZoneTable(["Europe/London", "America/New_York"])
+    london, new_york = table.code("Europe/London"), table.code("America/New_York")
+    table.prepare(datetime(2025, 3, 1, tzinfo=timezone.utc))
+    start, until, before = table.window(datetime(2025, 3, 5, tzinfo=timezone.utc))
+    # US DST starts on 9 March 2025 at 02:00 EST (07:00 UTC).
+    assert until == datetime(2025, 3, 9, 7, tzinfo=timezone.utc)
+    assert table.offsets(datetime(2025, 3, 9, 6, 59, tzinfo=timezone.utc)) is before
+
+    # Then the UK on 30 March at 01:00 UTC; lookups never rebuild.
+    start, until, offsets = table.window(datetime(2025, 3, 9, 7, tzinfo=timezone.utc))
+    assert (start, until) == (datetime(2025, 3, 9, 7, tzinfo=timezone.utc), datetime(2025, 3, 30, 1, tzinfo=timezone.utc))
+    assert offsets[new_york] == -240 and offsets[london] == 0
+    assert table.offsets(datetime(2025, 7, 1, tzinfo=timezone.utc))[london] == 60
+    assert table.rebuilds == 1
+
+    # Outside the schedule the table is prepared on the spot.
+    table.offsets(datetime(2027, 1, 1, tzinfo=timezone.utc))
+    assert table.rebuilds == 2
+
+
+def test_minutes_apart_and_rounding():
+    table = TimeZoneTable()
+    at = datetime(2025, 1, 15, tzinfo=timezone.utc)
+    assert table.minutes_apart("Asia/Kolkata", "UTC", at) == 330
+    assert table.minutes_apart("Europe/Paris", "Unknown/Zone", at) == 60
+    assert minutes_to_hours(330) == 6
+    assert minutes_to_hours(329) == 5
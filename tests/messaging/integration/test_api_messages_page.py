@@ -79,13 +79,14 @@ def test_page_messages_cursor_lines(monkeypatch):
 
     # --- minimal fake supabase with the query-builder surface used by the route
     class QB:
-        # supports: select, eq, lte, order, limit, lt, single
+        # supports: select, eq, lte, order, limit, lt, or_, single
         def select(self, *a, **k): return self
         def eq(self, *a, **k): return self
         def lte(self, *a, **k): return self
         def order(self, *a, **k): return self
         def limit(self, *a, **k): return self
         def lt(self, *a, **k): return self
+        def or_(self, *a, **k): return self
         def single(self): return self
 
     class FakeSupabase:
@@ -103,7 +104,8 @@ def test_page_messages_cursor_lines(monkeypatch):
         module_local.page_messages_sa(module_local.MessagesPage(conversation_thread_id="c", page_size=2, last_message_id="bad"))
     assert ei.value.status_code == 404
 
-    # 2) happy path to hit has_more/next_cursor when a page is full
+    # 2) happy path to hit has_more/next_cursor when there is another page
+    #    (page_size + 1 rows are read; the extra one is not returned)
     calls = {"i": 0}
     def safe_ok(_q):
         calls["i"] += 1
@@ -113,6 +115,7 @@ def test_page_messages_cursor_lines(monkeypatch):
             return Resp([
                 {"message_id": "m1", "created_at": "2025-08-28T07:59:00+02:00"},
                 {"message_id": "m2", "created_at": "2025-08-28T07:58:00+02:00"},
+                {"message_id": "m3", "created_at": "2025-08-28T07:57:00+02:00"},
             ])
         else:
             pytest.fail("unexpected order")
@@ -122,3 +125,81 @@ def test_page_messages_cursor_lines(monkeypatch):
     assert out["count"] == 2
     assert out["has_more"] is True
     assert out["next_cursor"] == "m2"
+    assert module_local.decode_page_cursor("c", out["cursor"]) == ("2025-08-28T07:58:00+02:00", "m2")
+
+
+def test_messages_page_signed_cursor_is_one_query_per_page(monkeypatch, client):
+    """
+    Pages through a thread with equal created_at values using `cursor`:
+    one keyset query per page, no lookup, exact has_more, no duplicates.
+    """
+    fixed_now = datetime(2025, 8, 28, 10, 0, 0, tzinfo=module.ZoneInfo("Africa/Johannesburg"))
+    monkeypatch.setattr(module, "now_in_sa", lambda: fixed_now)
+    ts = ["2025-08-28T08:00:00+02:00"] * 3 + ["2025-08-28T07:00:00+02:00"] * 2
+    rows = sorted(
+        ({"message_id": f"m{i}", "created_at": t} for i, t in enumerate(ts)),
+        key=lambda r: (r["created_at"], r["message_id"]),
+        reverse=True,
+    )
+    queries = []
+
+    class QB:
+        def __init__(self): self.after, self.limit_n = None, None
+        def select(self, *a, **k): return self
+        def eq(self, *a, **k): return self
+        def lte(self, *a, **k): return self
+        def order(self, *a, **k): return self
+        def single(self): pytest.fail("cursor pages must not look up the previous message")
+        def or_(self, expr):
+            created_at = expr.split('"')[1]
+            message_id = expr.rsplit("message_id.lt.", 1)[1].rstrip(")")
+            self.after = (created_at, message_id)
+            return self
+        def limit(self, n):
+            self.limit_n = n
+            return self
+        def execute(self):
+            queries.append(self.after)
+            found = [r for r in rows if self.after is None or (r["created_at"], r["message_id"]) < self.after]
+            return type("Resp", (), {"data": found[:self.limit_n]})()
+
+    monkeypatch.setattr(module, "supabase", type("S", (), {"table": lambda self, _: QB()})())
+
+    seen, cursor = [], None
+    while True:
+        r = client.post("/messages/page", json={"conversation_thread_id": "c", "page_size": 2, "cursor": cursor})
+        data = r.json()
+        seen += [m["message_id"] for m in data["items"]]
+        cursor = data["cursor"]
+        assert data["has_more"] is (cursor is not None)
+        if cursor is None:
+            break
+    assert seen == [r["message_id"] for r in rows]
+    assert len(queries) == 3
+
+    # Tampered cursors, or cursors of another thread, are rejected.
+    first = client.post("/messages/page", json={"conversation_thread_id": "c", "page_size": 2}).json()["cursor"]
+    for body in ({"conversation_thread_id": "other", "cursor": first},
+                 {"conversation_thread_id": "c", "cursor": first[:-2] + "AA"},
+                 {"conversation_thread_id": "c", "cursor": "garbage"}):
+        assert client.post("/messages/page", json=body).status_code == 400
+
+
+def test_cursor_key_is_stable_config_not_per_process(monkeypatch):
+    row = {"created_at": "2025-08-28T08:00:00+02:00", "message_id": "m1"}
+    monkeypatch.delenv("MESSAGE_CURSOR_SECRET", raising=False)
+    monkeypatch.setenv("SUPABASE_KEY", "service-key")
+    derived = module.encode_page_cursor("c", row)
+    # Another instance (or a restart) with the same config accepts the cursor.
+    assert module.encode_page_cursor("c", row) == derived
+    assert module.decode_page_cursor("c", derived) == (row["created_at"], row["message_id"])
+
+    monkeypatch.setenv("MESSAGE_CURSOR_SECRET", "shared-secret")
+    explicit = module.encode_page_cursor("c", row)
+    assert explicit != derived
+    assert module.decode_page_cursor("c", explicit) == (row["created_at"], row["message_id"])
+
+    monkeypatch.delenv("MESSAGE_CURSOR_SECRET")
+    monkeypatch.delenv("SUPABASE_KEY")
+    with pytest.raises(RuntimeError):
+        module.encode_page_cursor("c", row)
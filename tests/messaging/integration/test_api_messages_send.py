@@ -27,8 +27,8 @@ def test_send_message_insert_failure(monkeypatch, client):
     """
     New flow:
       1) _get_active_match_and_thread() -> returns ids (we stub it)
-      2) _next_sequence() -> _safe_execute(...) returns []
-      3) insert(...) -> _safe_execute(...) returns None  => 500
+      2) insert(...) -> _safe_execute(...) returns None  => 500
+         (message_sequence is assigned by the DB trigger)
     """
     fixed_now = datetime(2025, 8, 28, 10, 0, 0, tzinfo=module.ZoneInfo("Africa/Johannesburg"))
     monkeypatch.setattr(module, "now_in_sa", lambda: fixed_now)
@@ -47,9 +47,6 @@ def test_send_message_insert_failure(monkeypatch, client):
     def fake_safe_execute(_q):
         calls["i"] += 1
         if calls["i"] == 1:
-            # next_sequence -> no prior rows
-            return Resp([])
-        elif calls["i"] == 2:
             # insert -> DB returned no data (simulate failure)
             return Resp(None)
         else:
@@ -118,9 +115,6 @@ def test_send_message_omits_letter_styles_when_none(monkeypatch, client):
     def fake_safe_execute(_q):
         calls["i"] += 1
         if calls["i"] == 1:
-            # next_sequence -> no existing sequence
-            return Resp([])
-        elif calls["i"] == 2:
             # insert echo handled by FakeInsertQuery.execute()
             return Resp([{"ok": True}])  # value not used; just keep call count aligned
         else:
@@ -138,4 +132,38 @@ def test_send_message_omits_letter_styles_when_none(monkeypatch, client):
     assert r.status_code == 200
 
     assert captured["payload"] is not None
-    assert "letter_styles" not in captured["payload"]
\ No newline at end of file
+    assert "letter_styles" not in captured["payload"]
+
+def test_send_message_is_a_single_insert_numbered_by_the_db(monkeypatch, client):
+    """
+    The server sends no message_sequence: the assign_message_sequence trigger
+    numbers the row, and the inserted row (with its sequence) is returned.
+    """
+    monkeypatch.setattr(
+        module,
+        "_get_active_match_and_thread",
+        lambda x, y: {"match_id": "m", "conversation_thread_id": "c-seq"},
+    )
+    stored = [3]  # sequences already in the thread
+    calls = []
+
+    class Query:
+        def __init__(self, op, payload=None):
+            self.op, self.payload = op, payload
+        def select(self, *a, **k): return Query("select")
+        def insert(self, payload): return Query("insert", dict(payload))
+        def execute(self):
+            calls.append(self.op)
+            assert "message_sequence" not in self.payload
+            stored.append(max(stored) + 1)  # what the trigger does
+            return type("Resp", (), {"data": [dict(self.payload, message_sequence=stored[-1])]})()
+
+    class FakeSupabase:
+        def table(self, name): return Query(None)
+
+    monkeypatch.setattr(module, "supabase", FakeSupabase())
+    body = {"sender_id": "s", "recipient_id": "r", "message_content": "ok"}
+
+    assert client.post("/messages", json=body).json()["message_sequence"] == 4
+    assert client.post("/messages", json=body).json()["message_sequence"] == 5
+    assert calls == ["insert", "insert"]
@@ -14,6 +14,8 @@ def test_search_route_wrapper_executes(monkeypatch):
     monkeypatch.setattr(module, "_search_active_profiles_fts", lambda ids, **kw: [
         {"user_id": "u", "anonymous_handle": "alpha", "account_status": "active"},
     ])
+    # No summary row yet: the latest message comes from the fallback scan.
+    monkeypatch.setattr(module, "_fetch_thread_summaries", lambda conv_ids, now: {})
     monkeypatch.setattr(
         module, "_fetch_latest_visible_messages",
         lambda conv_ids, now_iso, limit_cap=1000: {"c": {
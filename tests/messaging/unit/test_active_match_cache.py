@@ -0,0 +1,197 @@
+import pytest
+from fastapi import HTTPException
+import services.messaging.main as module
+
+pytestmark = pytest.mark.unit
+
+
+class Resp:
+    def __init__(self, data): self.data = data
+
+
+def test_ttl_cache_expires_evicts_and_caches_none():
+    now = [0.0]
+    cache = module.TTLCache(ttl_seconds=10, max_entries=2, clock=lambda: now[0])
+    cache.set("a", None, ttl_seconds=2)
+    cache.set("b", 1)
+    assert cache.get("a") == (True, None)
+    now[0] = 3
+    assert cache.get("a") == (False, None)
+
+    cache.set("c", 2)
+    cache.get("b")
+    cache.set("d", 3)  # drops "c", the least recently used
+    assert cache.get("c") == (False, None)
+    assert cache.get("b") == (True, 1)
+    now[0] = 20
+    assert cache.get("b") == (False, None)
+
+    cache.set("e", 4, ttl_seconds=0)  # TTL 0 disables caching
+    assert cache.get("e") == (False, None)
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """Counts match_records reads; returns a mutable {pair: row or None}."""
+    monkeypatch.setattr(module, "active_match_cache", module.TTLCache(60, 100))
+    rows = {}
+    calls = []
+
+    def fake_load(a, b):
+        calls.append((a, b))
+        return rows.get((a, b))
+
+    monkeypatch.setattr(module, "_load_active_match_and_thread", fake_load)
+    return rows, calls
+
+
+def test_active_match_is_cached_per_pair_in_either_order(lookups):
+    rows, calls = lookups
+    rows[("a", "b")] = {"match_id": "m", "conversation_thread_id": "c"}
+
+    assert module._get_active_match_and_thread("a", "b")["conversation_thread_id"] == "c"
+    assert module._get_active_match_and_thread("b", "a")["match_id"] == "m"
+    assert calls == [("a", "b")]
+
+
+def test_no_active_match_is_cached_briefly(lookups, monkeypatch):
+    rows, calls = lookups
+    now = [0.0]
+    monkeypatch.setattr(module, "active_match_cache", module.TTLCache(60, 100, clock=lambda: now[0]))
+    monkeypatch.setattr(module, "NO_ACTIVE_MATCH_CACHE_TTL_SECONDS", 30)
+    for _ in range(2):
+        with pytest.raises(HTTPException) as ei:
+            module._get_active_match_and_thread("b", "a")
+        assert ei.value.status_code == 404
+    assert len(calls) == 1
+
+    rows[("a", "b")] = {"match_id": "m", "conversation_thread_id": "c"}
+    now[0] = 31
+    assert module._get_active_match_and_thread("a", "b")["match_id"] == "m"
+    assert len(calls) == 2
+
+
+def test_completed_match_is_dropped_when_its_entry_expires(lookups, monkeypatch):
+    # Without the change poll, the TTL is what bounds staleness.
+    rows, calls = lookups
+    now = [0.0]
+    monkeypatch.setattr(module, "active_match_cache", module.TTLCache(5, 100, clock=lambda: now[0]))
+    rows[("a", "b")] = {"match_id": "m", "conversation_thread_id": "c"}
+    module._get_active_match_and_thread("a", "b")
+
+    del rows[("a", "b")]  # completed by matchmaking
+    now[0] = 4
+    assert module._get_active_match_and_thread("a", "b")["match_id"] == "m"
+    now[0] = 6
+    with pytest.raises(HTTPException) as ei:
+        module._get_active_match_and_thread("a", "b")
+    assert ei.value.status_code == 404
+    assert len(calls) == 2
+
+
+class ChangedMatches:
+    """match_records as seen by the change poll: rows with updated_at, and the queries made."""
+
+    def __init__(self):
+        self.rows = []
+        self.queries = []
+
+    def table(self, name):
+        assert name == "match_records"
+        rows, queries = self.rows, self.queries
+
+        class Query:
+            def __init__(self):
+                self.calls = []
+                self.not_ = self
+
+            def __getattr__(self, op):
+                def call(*args, **kwargs):
+                    self.calls.append((op, args))
+                    return self
+                return call
+
+            def execute(self):
+                queries.append(self.calls)
+                ops = dict(self.calls)
+                if "gte" in ops:
+                    data = sorted((r for r in rows if r["updated_at"] >= ops["gte"][1]), key=lambda r: r["updated_at"])
+                else:
+                    data = sorted(rows, key=lambda r: r["updated_at"], reverse=True)[:1]
+                return Resp(data)
+
+        return Query()
+
+
+def changed(match_id, a, b, updated_at):
+    return {"match_id": match_id, "user_1_id": a, "user_2_id": b, "updated_at": updated_at}
+
+
+@pytest.fixture
+def match_changes(lookups, monkeypatch):
+    db = ChangedMatches()
+    monkeypatch.setattr(module, "supabase", db)
+    monkeypatch.setattr(module, "_safe_execute", lambda q: q.execute())
+    monkeypatch.setattr(module, "_match_changes_watermark", None)
+    return db
+
+
+def test_created_and_completed_matches_are_dropped_by_the_change_poll(lookups, match_changes):
+    rows, calls = lookups
+    match_changes.rows.append(changed("m0", "x", "y", "2025-08-17T10:00:00+00:00"))
+    assert module.invalidate_changed_matches() == 0  # records where to start
+
+    with pytest.raises(HTTPException):
+        module._get_active_match_and_thread("a", "b")  # cached as "no active match"
+    rows[("c", "d")] = {"match_id": "m2", "conversation_thread_id": "t2"}
+    module._get_active_match_and_thread("c", "d")
+
+    # Matchmaking creates a-b and completes c-d.
+    rows[("a", "b")] = {"match_id": "m1", "conversation_thread_id": "t1"}
+    del rows[("c", "d")]
+    match_changes.rows += [
+        changed("m1", "b", "a", "2025-08-17T10:00:05+00:00"),
+        changed("m2", "c", "d", "2025-08-17T10:00:06+00:00"),
+    ]
+    assert module.invalidate_changed_matches() == 3  # m0 is within the overlap
+    assert module._get_active_match_and_thread("a", "b")["match_id"] == "m1"
+    with pytest.raises(HTTPException) as ei:
+        module._get_active_match_and_thread("c", "d")
+    assert ei.value.status_code == 404
+    assert len(calls) == 4
+
+    # Later passes start a little before the newest change seen.
+    module.invalidate_changed_matches()
+    assert ("gte", ("updated_at", "2025-08-17T09:59:56+00:00")) in match_changes.queries[-1]
+
+
+def test_a_failed_poll_clears_the_cache_and_starts_over(lookups, match_changes):
+    rows, calls = lookups
+    assert module.invalidate_changed_matches() == 0
+    rows[("a", "b")] = {"match_id": "m", "conversation_thread_id": "c"}
+    module._get_active_match_and_thread("a", "b")
+
+    module.reset_match_changes()
+    assert module._match_changes_watermark is None
+    module._get_active_match_and_thread("a", "b")
+    assert len(calls) == 2
+
+
+def test_null_thread_is_not_cached(monkeypatch):
+    monkeypatch.setattr(module, "active_match_cache", module.TTLCache(60, 100))
+    calls = []
+
+    def fake_safe_execute(_q):
+        calls.append(1)
+        return Resp([{"match_id": "m", "conversation_thread_id": None, "status": "active"}])
+
+    class Query:
+        def __getattr__(self, name): return lambda *a, **k: self
+
+    monkeypatch.setattr(module, "supabase", type("S", (), {"table": lambda self, n: Query()})())
+    monkeypatch.setattr(module, "_safe_execute", fake_safe_execute)
+    for _ in range(2):
+        with pytest.raises(HTTPException) as ei:
+            module._get_active_match_and_thread("a", "b")
+        assert ei.value.status_code == 409
+    assert len(calls) == 2
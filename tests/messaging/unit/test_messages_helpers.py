@@ -40,16 +40,15 @@ def test_get_conv_map_for_user_both_roles(monkeypatch):
     class Resp:
         def __init__(self, data): self.data = data
 
+    monkeypatch.setattr(module, "conversation_map_cache", module.TTLCache(60, 100))
     calls = {"i": 0}
     def fake_safe_execute(_q):
         calls["i"] += 1
         if calls["i"] == 1:
+            # One query covers both roles
             return Resp([
-                {"user_1_id": "me", "user_2_id": "u2", "conversation_thread_id": "c2", "status": "active"}
-            ])
-        elif calls["i"] == 2:
-            return Resp([
-                {"user_1_id": "u1", "user_2_id": "me", "conversation_thread_id": "c1", "status": "active"}
+                {"user_1_id": "me", "user_2_id": "u2", "conversation_thread_id": "c2", "status": "active"},
+                {"user_1_id": "u1", "user_2_id": "me", "conversation_thread_id": "c1", "status": "active"},
             ])
         else:
             pytest.fail("unexpected call order")
@@ -57,3 +56,41 @@ def test_get_conv_map_for_user_both_roles(monkeypatch):
     monkeypatch.setattr(module, "_safe_execute", fake_safe_execute)
     out = module._get_conv_map_for_user("me")
     assert out == {"u2": "c2", "u1": "c1"}
+
+    # Cached: repeat loads skip the query, and callers get their own copy.
+    out["u3"] = "c3"
+    assert module._get_conv_map_for_user("me") == {"u2": "c2", "u1": "c1"}
+    assert calls["i"] == 1
+
+
+
+def test_conv_map_is_dropped_when_a_match_of_the_user_changes(monkeypatch):
+    class Resp:
+        def __init__(self, data): self.data = data
+
+    monkeypatch.setattr(module, "conversation_map_cache", module.TTLCache(60, 100))
+    matches = [{"user_1_id": "me", "user_2_id": "u1", "conversation_thread_id": "c1", "status": "active"}]
+    calls = []
+
+    def fake_safe_execute(_q):
+        calls.append(1)
+        return Resp(list(matches))
+
+    monkeypatch.setattr(module, "_safe_execute", fake_safe_execute)
+    assert module._get_conv_map_for_user("me") == {"u1": "c1"}
+
+    # Matchmaking creates u2-me; the change poll drops both users' maps.
+    matches.append({"user_1_id": "u2", "user_2_id": "me", "conversation_thread_id": "c2", "status": "active"})
+    module._drop_cached_match({"match_id": "m2", "user_1_id": "u2", "user_2_id": "me"})
+    assert module._get_conv_map_for_user("me") == {"u1": "c1", "u2": "c2"}
+
+    # ... and completes me-u1.
+    del matches[0]
+    module._drop_cached_match({"match_id": "m1", "user_1_id": "me", "user_2_id": "u1"})
+    assert module._get_conv_map_for_user("me") == {"u2": "c2"}
+    assert len(calls) == 3
+
+    # A failed poll clears every map.
+    module.reset_match_changes()
+    module._get_conv_map_for_user("me")
+    assert len(calls) == 4
@@ -26,6 +26,7 @@ def test_search_users_impl_pagination(monkeypatch):
         {"user_id": "u3", "anonymous_handle": "carl", "account_status": "active"},
     ]
     monkeypatch.setattr(module, "_search_active_profiles_fts", lambda ids, **kw: profiles)
+    monkeypatch.setattr(module, "_fetch_thread_summaries", lambda conv_ids, now: {})
     monkeypatch.setattr(module, "_fetch_latest_visible_messages", lambda conv_ids, now_iso, limit_cap=1000: {})
     fixed_now = datetime(2025, 8, 28, 10, 0, 0, tzinfo=module.ZoneInfo("Africa/Johannesburg"))
     monkeypatch.setattr(module, "now_in_sa", lambda: fixed_now)
@@ -117,3 +118,21 @@ def test_fetch_active_profiles_empty_ids():
 
 def test_search_active_profiles_fts_empty_ids():
     assert module._search_active_profiles_fts([], qtext="anything") == []
+
+
+def test_profile_queries_select_inbox_columns_only(monkeypatch):
+    selected = []
+
+    class RecordingQuery(FakeQuery):
+        def select(self, *a, **k):
+            selected.append(a[0])
+            return self
+
+    class FakeSupabase:
+        def table(self, name): return RecordingQuery([])
+
+    monkeypatch.setattr(module, "supabase", FakeSupabase())
+    module._search_active_profiles_fts(["u1"], qtext="")
+    module._fetch_active_profiles(["u1"])
+    assert selected == [module.INBOX_PROFILE_COLUMNS] * 2
+    assert "*" not in module.INBOX_PROFILE_COLUMNS
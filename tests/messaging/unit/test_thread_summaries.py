@@ -0,0 +1,159 @@
+import pytest
+from datetime import datetime, timedelta
+import services.messaging.main as module
+
+pytestmark = pytest.mark.unit
+
+NOW = datetime(2025, 8, 28, 10, 0, 0, tzinfo=module.ZoneInfo("Africa/Johannesburg"))
+
+
+def message(thread, seq, hours_from_now, content=None):
+    return {
+        "message_id": f"{thread}-m{seq}", "conversation_thread_id": thread, "message_sequence": seq,
+        "message_content": content or f"msg {seq}", "sender_id": "a", "recipient_id": "b",
+        "scheduled_delivery_at": (NOW + timedelta(hours=hours_from_now)).isoformat(),
+        "read_at": None, "delivery_status": "scheduled",
+    }
+
+
+def summary(thread, latest_seq, last_seq, next_delivery_hours=None, **extra):
+    return {
+        "conversation_thread_id": thread, "latest_message_sequence": latest_seq, "last_message_sequence": last_seq,
+        "message_count": last_seq, "visible_count": latest_seq, "last_activity_at": NOW.isoformat(),
+        "next_delivery_at": None if next_delivery_hours is None else (NOW + timedelta(hours=next_delivery_hours)).isoformat(),
+        "latest_message_id": f"{thread}-m{latest_seq}" if latest_seq else None,
+        "latest_message_content": f"msg {latest_seq}", "latest_sender_id": "a", "latest_recipient_id": "b",
+        "latest_scheduled_delivery_at": NOW.isoformat(), **extra,
+    }
+
+
+class FakeDB:
+    """conversation_summaries and messages tables with the filters the summary code uses."""
+
+    def __init__(self, summaries, messages):
+        self.tables = {"conversation_summaries": summaries, "messages": messages}
+        self.queries = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+class FakeQuery:
+    def __init__(self, db, name):
+        self.db, self.name, self.filters, self.changes, self.desc = db, name, [], None, False
+    def select(self, *a, **k): return self
+    def limit(self, *a, **k): return self
+    def in_(self, col, values):
+        self.filters.append(lambda r: r[col] in values)
+        return self
+    def eq(self, col, value):
+        self.filters.append(lambda r: r[col] == value)
+        return self
+    def lte(self, col, value):
+        self.filters.append(lambda r: r[col] is not None and module._parse_ts(r[col]) <= module._parse_ts(value))
+        return self
+    def or_(self, expr):
+        # and(conversation_thread_id.eq.X,message_sequence.gt.N),...
+        bounds = {}
+        for part in expr.split("),"):
+            thread = part.split("conversation_thread_id.eq.")[1].split(",")[0]
+            bounds[thread] = int(part.split("message_sequence.gt.")[1].rstrip(")"))
+        self.filters.append(lambda r: r["conversation_thread_id"] in bounds and r["message_sequence"] > bounds[r["conversation_thread_id"]])
+        return self
+    def order(self, col, desc=False):
+        self.order_by, self.desc = col, desc
+        return self
+    def update(self, changes):
+        self.changes = changes
+        return self
+    def execute(self):
+        self.db.queries.append((self.name, "update" if self.changes is not None else "select"))
+        rows = [r for r in self.db.tables[self.name] if all(f(r) for f in self.filters)]
+        if self.changes is not None:
+            for r in rows:
+                r.update(self.changes)
+        elif self.desc:
+            rows.sort(key=lambda r: r[self.order_by], reverse=True)
+        return type("Resp", (), {"data": [dict(r) for r in rows]})()
+
+
+def test_summaries_promote_messages_that_became_deliverable(monkeypatch):
+    db = FakeDB(
+        [summary("c1", 2, 4, next_delivery_hours=-1), summary("c2", 5, 5), summary("c3", 0, 1, next_delivery_hours=3)],
+        [message("c1", 1, -30), message("c1", 2, -20), message("c1", 3, -1, "now visible"), message("c1", 4, 2),
+         message("c3", 1, 3)],
+    )
+    monkeypatch.setattr(module, "supabase", db)
+
+    out = module._fetch_thread_summaries(["c1", "c2", "c3", "c4"], NOW)
+    assert set(out) == {"c1", "c2", "c3"}
+    assert module._summary_latest_message(out["c1"])["message_content"] == "now visible"
+    assert out["c1"]["visible_count"] == 3
+    assert module._parse_ts(out["c1"]["next_delivery_at"]) == NOW + timedelta(hours=2)
+    assert module._summary_latest_message(out["c3"]) is None  # nothing delivered yet
+    # Only c1 was due: one messages query for it, then one for the read state.
+    # Reads never write; storing the promotion is left to the background pass.
+    assert db.queries == [("conversation_summaries", "select"), ("messages", "select"), ("messages", "select")]
+    assert db.tables["conversation_summaries"][0]["latest_message_id"] == "c1-m2"
+
+    # Once message 4 is due, the next read shows it and clears next_delivery_at.
+    out = module._fetch_thread_summaries(["c1"], NOW + timedelta(hours=3))
+    assert out["c1"]["latest_message_id"] == "c1-m4"
+    assert out["c1"]["next_delivery_at"] is None
+
+    # The background pass stores it (and c3's first delivery).
+    assert module.promote_due_summaries(NOW + timedelta(hours=3)) == 2
+    assert db.tables["conversation_summaries"][0]["latest_message_id"] == "c1-m4"
+    assert db.tables["conversation_summaries"][2]["latest_message_id"] == "c3-m1"
+
+
+def test_read_state_of_the_latest_message_is_read_live(monkeypatch):
+    latest = message("c1", 2, -1)
+    db = FakeDB([summary("c1", 2, 2), summary("c2", 0, 1, next_delivery_hours=3)], [message("c1", 1, -5), latest])
+    monkeypatch.setattr(module, "supabase", db)
+
+    shown = module._summary_latest_message(module._fetch_thread_summaries(["c1", "c2"], NOW)["c1"])
+    assert module._format_latest_message(shown, "b")["is_read"] is False
+
+    # The recipient reads it after it was promoted.
+    latest.update(read_at=NOW.isoformat(), delivery_status="read")
+    shown = module._summary_latest_message(module._fetch_thread_summaries(["c1", "c2"], NOW)["c1"])
+    assert module._format_latest_message(shown, "b")["is_read"] is True
+    assert shown["delivery_status"] == "read"
+    assert db.queries.count(("messages", "select")) == 2  # one per read, for every thread shown
+
+
+def test_promotion_is_not_stored_if_a_message_was_sent_meanwhile(monkeypatch):
+    stored = summary("c1", 1, 2, next_delivery_hours=-1)
+    db = FakeDB([stored], [message("c1", 1, -5), message("c1", 2, -1)])
+    monkeypatch.setattr(module, "supabase", db)
+
+    read = dict(stored)
+    stored["last_message_sequence"] = 3  # the trigger recorded a new send
+    assert module._promote_deliverable([read], NOW) == 0
+    assert read["latest_message_id"] == "c1-m2"  # still shown in this response
+    assert stored["latest_message_id"] == "c1-m1"  # promoted again on the next read
+
+
+def test_search_reads_summaries_and_scans_only_threads_without_one(monkeypatch):
+    monkeypatch.setattr(module, "now_in_sa", lambda: NOW)
+    monkeypatch.setattr(module, "_get_conv_map_for_user", lambda uid: {"u1": "c1", "u2": "c2"})
+    monkeypatch.setattr(module, "_search_active_profiles_fts", lambda ids, **kw: [
+        {"user_id": "u1", "anonymous_handle": "alpha"}, {"user_id": "u2", "anonymous_handle": "beta"},
+    ])
+    monkeypatch.setattr(module, "supabase", FakeDB([summary("c1", 3, 3)], []))
+    scanned = []
+
+    def fake_scan(conv_ids, now_iso, limit_cap=1000):
+        scanned.append(list(conv_ids))
+        return {"c2": message("c2", 1, -1, "legacy")}
+
+    monkeypatch.setattr(module, "_fetch_latest_visible_messages", fake_scan)
+    out = module._search_users_impl(anonymous_handle="", my_user_id="b", limit=10, offset=0)
+    first, second = out["items"]
+    assert first["latest_message"]["message_id"] == "c1-m3"
+    assert first["latest_message"]["from_me"] is False
+    assert first["message_count"] == 3
+    assert second["latest_message"]["message_content"] == "legacy"
+    assert second["message_count"] is None
+    assert scanned == [["c2"]]